@@ -4,12 +4,17 @@
 import os
 from cement.utils import fs
 from cement.ext.ext_mustache import MustacheOutputHandler
+from ee.core.profile import EEProfile
 
 
 class EEOutputHandler(MustacheOutputHandler):
     class Meta:
         label = 'ee_output_handler'
 
+    @EEProfile.timed('render', lambda self, data, template: template)
+    def render(self, data_dict, template):
+        return super(EEOutputHandler, self).render(data_dict, template)
+
     def _load_template_from_file(self, path):
         for templ_dir in self.app._meta.template_dirs:
             full_path = fs.abspath(os.path.join(templ_dir, path))
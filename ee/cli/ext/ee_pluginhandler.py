@@ -0,0 +1,139 @@
+"""EasyEngine deferred plugin loading."""
+# Cement imports every enabled plugin while the application is set up, which
+# pulls in python-apt, sh, SQLAlchemy and friends even for `ee clean`.
+# EEPluginHandler registers a lightweight stand-in controller for every
+# plugin listed in EE_PLUGIN_REGISTRY instead, and imports the real plugin
+# only when its namespace is dispatched.
+from cement.core import backend, handler
+from cement.core.controller import CementBaseController
+from cement.ext.ext_plugin import CementPluginHandler
+from cement.utils.misc import is_true
+
+# Top level controllers provided by each internal plugin, recorded ahead of
+# time so `ee --help` can list them without importing the plugin.
+# Plugins which are not listed here (e.g. third party plugins from
+# /var/lib/ee/plugins) are loaded eagerly as before.
+# tests/cli/test_plugin_registry.py keeps this in sync with the plugins.
+EE_PLUGIN_REGISTRY = {
+    'clean': [dict(label='clean',
+                   description='Clean NGINX FastCGI cache, Opcacache, '
+                               'Memcache',
+                   usage='ee clean [options]')],
+    'debug': [dict(label='debug',
+                   description='Used for server level debugging',
+                   usage='ee debug [<site_name>] [options] ')],
+    'import_slow_log': [dict(label='import_slow_log',
+                             description='Import MySQL slow log to '
+                                         'Anemometer database',
+                             usage='ee import-slow-log')],
+    'info': [dict(label='info',
+                  description='Display configuration information related to'
+                              ' Nginx, PHP and MySQL',
+                  usage='ee info [options]')],
+    'log': [dict(label='log',
+                 description='Perform operations on Nginx, PHP, MySQL log '
+                             'file',
+                 usage='ee log [<site_name>] [options]')],
+    'metrics': [dict(label='metrics',
+                     description='Write Nginx, PHP5-fpm, MySQL and site '
+                                 'metrics for Prometheus',
+                     usage='ee metrics [options]')],
+    'secure': [dict(label='secure',
+                    description='Secure command secure auth, ip and port',
+                    usage='ee secure [options]')],
+    'site': [dict(label='site',
+                  description='Performs website specific operations',
+                  usage='ee site (command) <site_name> [options]')],
+    'stats': [dict(label='ee_stats',
+                   description='Show how long ee commands took over time',
+                   usage='ee stats (command) [options]',
+                   aliases=['stats'], aliases_only=True)],
+    'stack': [dict(label='stack',
+                   description='Stack command manages stack operations',
+                   usage='ee stack (command) [options]')],
+    'sync': [dict(label='sync',
+                  description='synchronize EasyEngine database')],
+    'update': [dict(label='ee_update',
+                    description='update EasyEngine to latest version',
+                    usage='ee update',
+                    aliases=['update'], aliases_only=True)],
+}
+
+
+class EEPluginStubController(CementBaseController):
+    """
+        Stands in for a controller of a plugin which is not imported yet,
+        loads the plugin and hands over to the real controller on dispatch
+    """
+    class Meta:
+        label = None
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        plugin = None
+
+    def _dispatch(self):
+        self.app.plugin.load_plugin(self._meta.plugin)
+        contr = handler.get('controller', self._meta.label)()
+        contr._setup(self.app)
+        return contr._dispatch()
+
+
+def stub_controller(plugin_name, meta):
+    """Builds stand-in controller class from registry metadata"""
+    attrs = dict(plugin=plugin_name, stacked_on='base',
+                 stacked_type='nested', hide=False, usage=None,
+                 aliases=[], aliases_only=False)
+    attrs.update(meta)
+    # Cement mutates aliases while rendering help, never share the list
+    attrs['aliases'] = list(attrs['aliases'])
+    Meta = type('Meta', (object,), attrs)
+    return type('EEPluginStub_{0}'.format(meta['label']),
+                (EEPluginStubController,), dict(Meta=Meta))
+
+
+class EEPluginHandler(CementPluginHandler):
+    class Meta:
+        label = 'ee_plugin_handler'
+
+    def __init__(self):
+        super(EEPluginHandler, self).__init__()
+        self._deferred_plugins = []
+
+    def _lazy(self):
+        if 'lazy_plugins' not in self.app.config.keys('ee'):
+            return True
+        return is_true(self.app.config.get('ee', 'lazy_plugins'))
+
+    def load_plugins(self, plugin_list):
+        """
+        Defer import of plugins known to EE_PLUGIN_REGISTRY, load the
+        rest right away.
+        """
+        for plugin_name in plugin_list:
+            if (self._lazy() and plugin_name in EE_PLUGIN_REGISTRY and
+               plugin_name not in self._loaded_plugins):
+                self.defer_plugin(plugin_name)
+            else:
+                self.load_plugin(plugin_name)
+
+    def defer_plugin(self, plugin_name):
+        """Register stand-in controllers for the plugin"""
+        for meta in EE_PLUGIN_REGISTRY[plugin_name]:
+            handler.register(stub_controller(plugin_name, meta))
+        if plugin_name not in self._deferred_plugins:
+            self._deferred_plugins.append(plugin_name)
+
+    def load_plugin(self, plugin_name):
+        """Replace stand-in controllers of plugin and import it"""
+        if plugin_name in self._loaded_plugins:
+            return
+        if plugin_name in self._deferred_plugins:
+            controllers = backend.__handlers__['controller']
+            for meta in EE_PLUGIN_REGISTRY[plugin_name]:
+                controllers.pop(meta['label'], None)
+            self._deferred_plugins.remove(plugin_name)
+        super(EEPluginHandler, self).load_plugin(plugin_name)
+
+    def get_deferred_plugins(self):
+        """List of enabled plugins that are not imported yet"""
+        return self._deferred_plugins
@@ -1,6 +1,10 @@
 """EasyEngine main application entry point."""
 import sys
 import os
+import time
+
+# ee stats history records how long every command took from here
+STARTED = time.time()
 
 # this has to happen after you import sys, but before you import anything
 # from Cement "source: https://github.com/datafolklabs/cement/issues/290"
@@ -10,12 +14,17 @@ if '--debug' in sys.argv:
 else:
     TOGGLE_DEBUG = False
 
-from cement.core import foundation
+# --profile, --profile-trace=<file> and --profile-stats=<file>
+from ee.core.profile import EEProfile
+EEProfile.from_argv(sys.argv)
+
+from cement.core import foundation, handler
 from cement.utils.misc import init_defaults
 from cement.core.exc import FrameworkError, CaughtSignal
 from cement.ext.ext_argparse import ArgParseArgumentHandler
 from ee.core import exc
 from ee.cli.ext.ee_outputhandler import EEOutputHandler
+from ee.cli.ext.ee_pluginhandler import EEPluginHandler
 
 # Application default.  Should update config/ee.conf to reflect any
 # changes, or additions here.
@@ -30,6 +39,12 @@ defaults['ee']['plugin_dir'] = '/var/lib/ee/plugins'
 # External templates (generally, do not ship with application code)
 defaults['ee']['template_dir'] = '/var/lib/ee/templates'
 
+# Import plugins only when their command is dispatched
+defaults['ee']['lazy_plugins'] = True
+
+# Downloaded WordPress core, plugins and stack packages
+defaults['cache'] = dict(dir='/var/lib/ee/cache', ttl=86400, offline=False)
+
 
 class EEArgHandler(ArgParseArgumentHandler):
     class Meta:
@@ -64,6 +79,9 @@ class EEApp(foundation.CementApp):
 
         arg_handler = EEArgHandler
 
+        # defers plugin imports until dispatch
+        plugin_handler = EEPluginHandler
+
         debug = TOGGLE_DEBUG
 
 
@@ -123,10 +141,38 @@ def main():
             if exc_traceback is not None:
                 traceback.print_exc()
 
+        # Print where time went when --profile was passed
+        EEProfile.report()
+
+        exc_type, exc_value, exc_traceback = sys.exc_info()
+        if isinstance(exc_value, SystemExit):
+            # Log.error() exits through app.close(1)
+            code = exc_value.code
+        record_history(code)
+
         # # Close the application
     app.close(code)
 
 
+def record_history(code):
+    """Adds the command which ran to the history of ee stats history"""
+    from ee.core import history
+    try:
+        command = history.command_of(
+            sys.argv[1:], history.command_names(handler.list('controller')))
+        if not command:
+            return
+        history.record([dict(command=command,
+                             argv=history.redact(sys.argv[1:]),
+                             started=STARTED, duration=time.time() - STARTED,
+                             exit_code=code if isinstance(code, int) else 1,
+                             phases=EEProfile.phases)])
+    except Exception as e:
+        # never fail a command because its history could not be written
+        if app.debug:
+            print("Unable to record command history: {0}".format(e))
+
+
 def get_test_app(**kw):
     app = EEApp(**kw)
     return app
@@ -10,6 +10,12 @@ import os
 import urllib.request
 
 
+# Caches kept in directories: name shown, name in errors, directory
+CACHE_DIRS = dict(fastcgi=("NGINX FastCGI", "FastCGI", "/var/run/nginx-cache"),
+                  pagespeed=("PageSpeed", "Pagespeed",
+                             "/var/ngx_pagespeed_cache"))
+
+
 def ee_clean_hook(app):
     # do something with the ``app`` object here.
     pass
@@ -43,9 +49,9 @@ class EECleanController(CementBaseController):
             self.clean_fastcgi()
         if self.app.pargs.all:
             self.clean_memcache()
-            self.clean_fastcgi()
             self.clean_opcache()
-            self.clean_pagespeed()
+            # cache directories are wiped at the same time
+            self.clean_directories(['fastcgi', 'pagespeed'])
         if self.app.pargs.fastcgi:
             self.clean_fastcgi()
         if self.app.pargs.memcache:
@@ -71,11 +77,22 @@ class EECleanController(CementBaseController):
     @expose(hide=True)
     def clean_fastcgi(self):
         """This function clears Fastcgi cache"""
-        if(os.path.isdir("/var/run/nginx-cache")):
-            Log.info(self, "Cleaning NGINX FastCGI cache")
-            EEShellExec.cmd_exec(self, "rm -rf /var/run/nginx-cache/*")
-        else:
-            Log.error(self, "Unable to clean FastCGI cache")
+        self.clean_directories(['fastcgi'])
+
+    def clean_directories(self, caches):
+        """Empties directories of caches, names in CACHE_DIRS, together"""
+        commands = []
+        missing = []
+        for cache in caches:
+            name, error_name, path = CACHE_DIRS[cache]
+            if os.path.isdir(path):
+                Log.info(self, "Cleaning {0} cache".format(name))
+                commands.append("rm -rf {0}/*".format(path))
+            else:
+                missing.append(error_name)
+        EEShellExec.cmd_exec_many(self, commands)
+        for error_name in missing:
+            Log.error(self, "Unable to clean {0} cache".format(error_name))
 
     @expose(hide=True)
     def clean_opcache(self):
@@ -91,11 +108,7 @@ class EECleanController(CementBaseController):
     @expose(hide=True)
     def clean_pagespeed(self):
         """This function clears Pagespeed cache"""
-        if(os.path.isdir("/var/ngx_pagespeed_cache")):
-            Log.info(self, "Cleaning PageSpeed cache")
-            EEShellExec.cmd_exec(self, "rm -rf /var/ngx_pagespeed_cache/*")
-        else:
-            Log.error(self, "Unable to clean Pagespeed cache")
+        self.clean_directories(['pagespeed'])
 
 
 def load(app):
@@ -4,6 +4,7 @@ from cement.core.controller import CementBaseController, expose
 from cement.core import handler, hook
 from ee.core.shellexec import *
 from ee.core.mysql import EEMysql
+from ee.core.slowlog import EESlowLog, anemometer_config
 from ee.core.services import EEService
 from ee.core.logging import Log
 from ee.cli.plugins.site_functions import logwatch
@@ -14,6 +15,7 @@ import configparser
 import glob
 import signal
 import subprocess
+import pymysql
 
 
 def ee_debug_hook(app):
@@ -643,39 +645,17 @@ class EEDebugController(CementBaseController):
             if os.path.isfile("/var/log/mysql/mysql-slow.log"):
                 # Get Anemometer user name and password
                 Log.info(self, "Importing MySQL slow log to Anemometer")
-                host = os.popen("grep -e \"\'host\'\" {0}22222/htdocs/"
-                                .format(EEVariables.ee_webroot)
-                                + "db/anemometer/conf/config.inc.php  "
-                                "| head -1 | cut -d\\\' -f4 | "
-                                "tr -d '\n'").read()
-                user = os.popen("grep -e \"\'user\'\" {0}22222/htdocs/"
-                                .format(EEVariables.ee_webroot)
-                                + "db/anemometer/conf/config.inc.php  "
-                                "| head -1 | cut -d\\\' -f4 | "
-                                "tr -d '\n'").read()
-                password = os.popen("grep -e \"\'password\'\" {0}22222/"
-                                    .format(EEVariables.ee_webroot)
-                                    + "htdocs/db/anemometer/conf"
-                                    "/config.inc.php "
-                                    "| head -1 | cut -d\\\' -f4 | "
-                                    "tr -d '\n'").read()
-
-                # Import slow log Anemometer using pt-query-digest
+                config = anemometer_config("{0}22222/htdocs/db/anemometer/"
+                                           "conf/config.inc.php"
+                                           .format(EEVariables.ee_webroot))
+
+                # Import entries logged since previous import
                 try:
-                    EEShellExec.cmd_exec(self, "pt-query-digest --user={0} "
-                                         "--password={1} "
-                                         "--review D=slow_query_log,"
-                                         "t=global_query_review "
-                                         "--history D=slow_query_log,t="
-                                         "global_query_review_history "
-                                         "--no-report --limit=0% "
-                                         "--filter=\" \\$event->{{Bytes}} = "
-                                         "length(\\$event->{{arg}}) "
-                                         "and \\$event->{{hostname}}=\\\""
-                                         "{2}\\\"\" "
-                                         "/var/log/mysql/mysql-slow.log"
-                                         .format(user, password, host))
-                except CommandExecutionError as e:
+                    count = EESlowLog.import_log(self, "/var/log/mysql/"
+                                                 "mysql-slow.log", config)
+                    Log.debug(self, "Imported {0} query classes"
+                              .format(count))
+                except (IOError, OSError, pymysql.Error) as e:
                     Log.debug(self, str(e))
                     Log.error(self, "MySQL slow log import failed.")
             else:
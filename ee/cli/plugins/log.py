@@ -7,11 +7,18 @@ from ee.cli.plugins.site_functions import logwatch
 from ee.core.variables import EEVariables
 from ee.core.fileutils import EEFileUtils
 from ee.core.shellexec import EEShellExec
-from ee.core.sendmail import EESendMail
+from ee.core.sendmail import EESendMail, log_attachments
 from ee.core.mysql import EEMysql
+from ee.core.accesslog import analyze, parse_since, site_of
+from ee.core.logarchive import gzip_logs
+from ee.core.logcursor import LogCursor
+from ee.core import blockgzip, errorlog, fpmslowlog, logstore
+from ee.core.logfollow import LineFilter, LogFollower
 import os
 import glob
-import gzip
+import json
+import re
+import time
 
 
 def ee_log_hook(app):
@@ -19,6 +26,35 @@ def ee_log_hook(app):
     pass
 
 
+def time_range(self):
+    """Epochs of --since and --until options, None when not given"""
+    stamps = []
+    for option in ('since', 'until'):
+        value = getattr(self.app.pargs, option)
+        if not value:
+            stamps.append(None)
+            continue
+        try:
+            stamps.append(parse_since(value))
+        except ValueError as e:
+            Log.error(self, "Invalid value for --{0}, use e.g. 30m, 6h, 2d "
+                      "or \"YYYY-MM-DD HH:MM\"".format(option))
+    return tuple(stamps)
+
+
+def log_files(pattern):
+    """
+        Logs and their archives matching pattern, without archive indexes.
+        log.gz written by ee log gzip next to log is a copy of it and left
+        out, so are other compressed copies of logs which are still there.
+    """
+    paths = [path for path in glob.glob(pattern)
+             if not path.endswith((blockgzip.INDEX_SUFFIX, '.tmp'))]
+    found = set(paths)
+    return [path for path in paths
+            if not (path.endswith('.gz') and path[:-3] in found)]
+
+
 class EELogController(CementBaseController):
     class Meta:
         label = 'log'
@@ -56,6 +92,28 @@ class EELogShowController(CementBaseController):
             (['--access'],
                 dict(help='Show Nginx access log file',
                      action='store_true')),
+            (['--all-sites'],
+                dict(help='Follow logs of all sites, prefixed with site name',
+                     action='store_true')),
+            (['--grep'],
+                dict(help='Only show lines matching regular expression',
+                     action='store', default=None)),
+            (['--status'],
+                dict(help='Only show access log lines with given status, '
+                     'e.g. 5xx or 404,499', action='store', default=None)),
+            (['--min-upstream'],
+                dict(help='Only show access log lines where upstream took '
+                     'at least given seconds', action='store', type=float,
+                     default=None)),
+            (['--sample'],
+                dict(help='Show 1 in N lines of every log', action='store',
+                     type=int, default=1)),
+            (['--rate'],
+                dict(help='Show at most N lines per second', action='store',
+                     type=float, default=None)),
+            (['--site-rate'],
+                dict(help='Show at most N lines per second of every log',
+                     action='store', type=float, default=None)),
             (['site_name'],
                 dict(help='Website Name', nargs='?', default=None))
             ]
@@ -66,6 +124,10 @@ class EELogShowController(CementBaseController):
         """Default function of log show"""
         self.msg = []
 
+        if self.app.pargs.all_sites:
+            return self.follow(glob.glob("{0}*/logs/*.log"
+                                         .format(EEVariables.ee_webroot)))
+
         if self.app.pargs.php:
             self.app.pargs.nginx = True
 
@@ -154,8 +216,51 @@ class EELogShowController(CementBaseController):
         for w_list in self.msg:
             watch_list = watch_list + glob.glob(w_list)
 
+        if (self.app.pargs.grep or self.app.pargs.status or
+           self.app.pargs.min_upstream is not None or
+           self.app.pargs.sample > 1 or self.app.pargs.rate or
+           self.app.pargs.site_rate):
+            return self.follow(watch_list)
         logwatch(self, watch_list)
 
+    def follow(self, watch_list):
+        """Follow logs through LogFollower, with filters and rate limits"""
+        files = {}
+        for w_list in watch_list:
+            if not os.path.isfile(w_list):
+                continue
+            parts = w_list.split('/')
+            if w_list.startswith(EEVariables.ee_webroot):
+                # /var/www/<site>/logs/access.log
+                files[w_list] = parts[-3]
+            elif '.access.log' in parts[-1] or '.error.log' in parts[-1]:
+                # /var/log/nginx/<site>.access.log
+                files[w_list] = parts[-1].rsplit('.', 2)[0]
+            else:
+                files[w_list] = parts[-2]
+        if not files:
+            Log.error(self, "No log file found, quitting")
+
+        try:
+            line_filter = LineFilter(
+                pattern=self.app.pargs.grep,
+                status=(self.app.pargs.status.split(',')
+                        if self.app.pargs.status else None),
+                min_upstream=self.app.pargs.min_upstream)
+        except re.error as e:
+            Log.error(self, "Invalid --grep expression: {0}".format(e))
+
+        Log.info(self, "Following {0} log files, press Ctrl+C to stop"
+                 .format(len(files)))
+        follower = LogFollower(files, line_filter,
+                               sample=self.app.pargs.sample,
+                               site_rate=self.app.pargs.site_rate,
+                               rate=self.app.pargs.rate)
+        try:
+            follower.follow()
+        except KeyboardInterrupt:
+            pass
+
 
 class EELogResetController(CementBaseController):
     class Meta:
@@ -219,10 +324,10 @@ class EELogResetController(CementBaseController):
         if self.app.pargs.slow_log_db:
             if os.path.isdir("/var/www/22222/htdocs/db/anemometer"):
                 Log.info(self, "Resetting MySQL slow_query_log database table")
-                EEMysql.execute(self, "TRUNCATE TABLE  "
-                                "slow_query_log.global_query_review_history")
-                EEMysql.execute(self, "TRUNCATE TABLE "
-                                "slow_query_log.global_query_review")
+                EEMysql.execute_many(self, ["TRUNCATE TABLE slow_query_log."
+                                            "global_query_review_history",
+                                            "TRUNCATE TABLE slow_query_log."
+                                            "global_query_review"])
 
         if self.app.pargs.nginx and (not self.app.pargs.site_name):
             self.msg = self.msg + ["/var/log/nginx/*error.log"]
@@ -323,6 +428,16 @@ class EELogGzipController(CementBaseController):
             (['--access'],
                 dict(help='GZip Nginx access log file',
                      action='store_true')),
+            (['--rotate'],
+                dict(help='Move log content to dated archive and empty the '
+                     'log file', action='store_true')),
+            (['--keep'],
+                dict(help='Number of rotated archives to keep per log file',
+                     action='store', type=int, default=None)),
+            (['--level'],
+                dict(help='Compression level, 1 (fastest) to 9 (smallest)',
+                     action='store', type=int, default=6,
+                     choices=range(1, 10))),
             (['site_name'],
                 dict(help='Website Name', nargs='?', default=None))
             ]
@@ -422,15 +537,39 @@ class EELogGzipController(CementBaseController):
         for g_list in self.msg:
             gzip_list = gzip_list + glob.glob(g_list)
 
-        # Gzip content of file
+        # Site logs are symlinks to /var/log/nginx, archive next to the
+        # real file and never compress the same log twice
+        gzip_list = sorted(set(os.path.realpath(g_list)
+                               for g_list in gzip_list))
+        if not gzip_list:
+            Log.info(self, "No log file found")
+            return
+
         for g_list in gzip_list:
             Log.info(self, "Gzipping file {file}".format(file=g_list))
-            in_file = g_list
-            in_data = open(in_file, "rb").read()
-            out_gz = g_list + ".gz"
-            gzf = gzip.open(out_gz, "wb")
-            gzf.write(in_data)
-            gzf.close()
+        results = gzip_logs(gzip_list, level=self.app.pargs.level,
+                            rotate=self.app.pargs.rotate,
+                            keep=self.app.pargs.keep)
+
+        failed = False
+        for result in results:
+            if 'error' in result:
+                failed = True
+                Log.warn(self, "Unable to gzip {0}: {1}"
+                         .format(result['path'], result['error']))
+                continue
+            Log.info(self, "{0}: {1:.1f} MB -> {2:.1f} MB in {3:.1f}s "
+                     "({4:.1f} MB/s)"
+                     .format(result['archive'],
+                             result['bytes_in'] / (1024 * 1024),
+                             result['bytes_out'] / (1024 * 1024),
+                             result['seconds'],
+                             result['bytes_in'] / (1024 * 1024) /
+                             max(result['seconds'], 0.001)))
+            for archive in result['pruned']:
+                Log.debug(self, "Removed old archive {0}".format(archive))
+        if failed:
+            Log.error(self, "Unable to gzip all log files")
 
 
 class EELogMailController(CementBaseController):
@@ -462,6 +601,10 @@ class EELogMailController(CementBaseController):
             (['--to'],
              dict(help='EMail addresses to send log files', action='append',
                   dest='to', nargs=1, required=True)),
+            (['--max-size'],
+             dict(help='Maximum size of gzipped attachments in MB, only the '
+                  'end of larger logs is sent', action='store', type=int,
+                  default=20)),
             ]
         usage = "ee log mail [<site_name>] [options]"
 
@@ -558,13 +701,467 @@ class EELogMailController(CementBaseController):
         for m_list in self.msg:
             mail_list = mail_list + glob.glob(m_list)
 
-        for tomail in self.app.pargs.to:
-            Log.info(self, "Sending mail to {0}".format(tomail[0]))
-            EESendMail("easyengine", tomail[0], "{0} Log Files"
-                       .format(EEVariables.ee_fqdn),
-                       "Hey Hi,\n  Please find attached server log files"
-                       "\n\n\nYour's faithfully,\nEasyEngine",
-                       files=mail_list, port=25, isTls=False)
+        mail_list = sorted(set(os.path.realpath(m_list)
+                               for m_list in mail_list))
+        if not mail_list:
+            Log.error(self, "No log file found, quitting")
+
+        attachments = log_attachments(mail_list,
+                                      self.app.pargs.max_size * 1024 * 1024)
+        for m_list, attachment in zip(mail_list, attachments):
+            Log.info(self, "Attaching {0}: {1:.1f} MB -> {2:.1f} MB{3}"
+                     .format(m_list, attachment['size'] / (1024 * 1024),
+                             len(attachment['data']) / (1024 * 1024),
+                             " (last lines only)"
+                             if attachment['excerpt'] else ""))
+        Log.info(self, "Total attachment size {0:.1f} MB"
+                 .format(sum(len(attachment['data'])
+                             for attachment in attachments) / (1024 * 1024)))
+
+        to_list = [tomail[0] for tomail in self.app.pargs.to]
+        Log.info(self, "Sending mail to {0}".format(", ".join(to_list)))
+        EESendMail("easyengine", to_list, "{0} Log Files"
+                   .format(EEVariables.ee_fqdn),
+                   "Hey Hi,\n  Please find attached server log files"
+                   "\n\n\nYour's faithfully,\nEasyEngine",
+                   attachments=attachments, port=25, isTls=False)
+
+
+class EELogStatsController(CementBaseController):
+    class Meta:
+        label = 'stats'
+        description = 'Show Nginx access log statistics of sites'
+        stacked_on = 'log'
+        stacked_type = 'nested'
+        arguments = [
+            (['--since'],
+                dict(help='Only count requests newer than given time, e.g. '
+                     '30m, 6h, 2d or "2015-08-01 10:00"', action='store',
+                     default=None)),
+            (['--until'],
+                dict(help='Only count requests up to given time',
+                     action='store', default=None)),
+            (['--top'],
+                dict(help='Number of top URLs and clients to show',
+                     action='store', type=int, default=10)),
+            (['site_name'],
+                dict(help='Website Name', nargs='?', default=None))
+            ]
+        usage = "ee log stats [<site_name>] [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of log stats"""
+        since, until = time_range(self)
+
+        if self.app.pargs.site_name:
+            webroot = "{0}{1}".format(EEVariables.ee_webroot,
+                                      self.app.pargs.site_name)
+            if not os.path.isdir(webroot):
+                Log.error(self, "Site not present, quitting")
+            pattern = ("/var/log/nginx/{0}.access.log*"
+                       .format(self.app.pargs.site_name))
+        else:
+            pattern = "/var/log/nginx/*.access.log*"
+
+        # rotated logs (site.access.log.1, site.access.log.2.gz) included
+        stats_list = log_files(pattern)
+        if not stats_list:
+            Log.error(self, "No access log found, quitting")
+
+        Log.debug(self, "Analysing {0}".format(", ".join(stats_list)))
+        sites = analyze(stats_list, since=since, until=until)
+        if not sum(stats.requests for stats in sites.values()):
+            Log.info(self, "No requests found")
+            return
+
+        for site in sorted(sites, key=lambda s: -sites[s].requests):
+            self.report(site, sites[site])
+
+    def report(self, site, stats):
+        """Print statistics of single site"""
+        if not stats.requests:
+            return
+        top = self.app.pargs.top
+        Log.info(self, "\n{0}".format(site), log=False)
+        Log.info(self, "{0:18}{1} ({2:.2f} req/s)"
+                 .format("Requests", stats.requests, stats.rate()), log=False)
+        Log.info(self, "{0:18}{1:.2f} MB"
+                 .format("Bandwidth", stats.bytes / (1024 * 1024)), log=False)
+        Log.info(self, "{0:18}{1}".format("Status", "  ".join(
+                 "{0} {1:.1f}%".format(name, share)
+                 for name, share in stats.status_mix())), log=False)
+        Log.info(self, "{0:18}{1}".format("Cache", "  ".join(
+                 "{0} {1:.1f}%".format(name, share)
+                 for name, share in stats.cache_mix())), log=False)
+        if stats.upstream.count:
+            Log.info(self, "{0:18}{1}".format("Upstream time", "  ".join(
+                     "p{0} {1:.3f}s".format(pct,
+                                             stats.upstream.percentile(pct))
+                     for pct in (50, 95, 99))), log=False)
+        Log.info(self, "Top URLs", log=False)
+        for url, count in stats.urls.most_common(top):
+            Log.info(self, "{0:>10}  {1}".format(count, url), log=False)
+        Log.info(self, "Top clients", log=False)
+        for ip, count in stats.clients.most_common(top):
+            Log.info(self, "{0:>10}  {1}".format(count, ip), log=False)
+
+
+class EELogAnalyzeController(CementBaseController):
+    class Meta:
+        label = 'analyze'
+        description = 'Report hotspots of Nginx error and PHP5-fpm slow logs'
+        stacked_on = 'log'
+        stacked_type = 'nested'
+        arguments = [
+            (['--nginx'],
+                dict(help='Analyze Nginx error logs', action='store_true')),
+            (['--fpm'],
+                dict(help='Analyze PHP5-fpm slow log written since '
+                     'previous analysis', action='store_true')),
+            (['--bucket'],
+                dict(help='Minutes per period when counting Nginx errors '
+                     'over time', action='store', type=int, default=60)),
+            (['--json'],
+                dict(help='Print Nginx error report as JSON',
+                     action='store_true')),
+            (['--rewind'],
+                dict(help='Analyze whole log again instead of new entries '
+                     'only', action='store_true')),
+            (['--top'],
+                dict(help='Number of entries to show per section',
+                     action='store', type=int, default=10)),
+            (['site_name'],
+                dict(help='Website Name', nargs='?', default=None))
+            ]
+        usage = "ee log analyze [<site_name>] [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of log analyze"""
+        if (not self.app.pargs.nginx) and (not self.app.pargs.fpm):
+            self.app.pargs.nginx = True
+            if not (self.app.pargs.site_name or self.app.pargs.json):
+                self.app.pargs.fpm = os.path.isfile(
+                    fpmslowlog.EE_FPM_SLOW_LOG)
+
+        if self.app.pargs.nginx:
+            self.analyze_nginx()
+        if self.app.pargs.fpm:
+            self.analyze_fpm()
+
+    @staticmethod
+    def window(hotspot):
+        return "{0} - {1}".format(
+            time.strftime('%d-%b %H:%M', time.localtime(hotspot.first)),
+            time.strftime('%d-%b %H:%M', time.localtime(hotspot.last)))
+
+    def show(self, title, hotspots):
+        """Print one section of the report"""
+        if not hotspots:
+            return
+        Log.info(self, "\n{0}".format(title), log=False)
+        for name, hotspot in hotspots:
+            Log.info(self, "{0:>8}  {1}  {2} ({3})"
+                     .format(hotspot.count, self.window(hotspot), name,
+                             ", ".join(sorted(hotspot.sites)) or "-"),
+                     log=False)
+
+    def analyze_nginx(self):
+        """Report most frequent Nginx errors"""
+        if self.app.pargs.bucket < 1:
+            Log.error(self, "--bucket must be at least one minute")
+        if self.app.pargs.site_name:
+            webroot = "{0}{1}".format(EEVariables.ee_webroot,
+                                      self.app.pargs.site_name)
+            if not os.path.isdir(webroot):
+                Log.error(self, "Site not present, quitting")
+            pattern = ("/var/log/nginx/{0}.error.log*"
+                       .format(self.app.pargs.site_name))
+        else:
+            pattern = "/var/log/nginx/*error.log*"
+
+        # rotated logs (site.error.log.1, site.error.log.2.gz) included
+        error_list = log_files(pattern)
+        if not error_list:
+            Log.error(self, "No error log found, quitting")
+        Log.debug(self, "Analysing {0}".format(", ".join(error_list)))
+        classes = errorlog.analyze(error_list, bucket=self.app.pargs.bucket)
+        top = classes[:self.app.pargs.top]
+
+        if self.app.pargs.json:
+            print(json.dumps([cls.as_dict() for cls in top], indent=2))
+            return
+        if not classes:
+            Log.info(self, "No errors found")
+            return
+
+        Log.info(self, "{0} errors of {1} kinds in {2} files"
+                 .format(sum(cls.count for cls in classes), len(classes),
+                         len(error_list)))
+        for cls in top:
+            Log.info(self, "\n{0:>8}  [{1}] {2}"
+                     .format(cls.count, cls.level, cls.fingerprint),
+                     log=False)
+            Log.info(self, "{0:10}{1} - {2}, busiest {3} ({4})"
+                     .format("", cls.first, cls.last,
+                             *cls.buckets.most_common(1)[0]), log=False)
+            Log.info(self, "{0:10}sites: {1}".format("", ", ".join(
+                     "{0} ({1})".format(site, count)
+                     for site, count in cls.sites.most_common(5))),
+                     log=False)
+            if cls.upstreams:
+                Log.info(self, "{0:10}upstreams: {1}".format("", ", ".join(
+                         "{0} ({1})".format(name, count)
+                         for name, count in cls.upstreams.most_common(3))),
+                         log=False)
+            if cls.kind:
+                Log.warn(self, "{0:10}{1}, check {2}"
+                         .format("", cls.kind, cls.directive))
+
+    def analyze_fpm(self):
+        """Report hotspots of PHP5-fpm slow log"""
+        if not os.path.isfile(fpmslowlog.EE_FPM_SLOW_LOG):
+            Log.error(self, "PHP5-fpm slow log not found, quitting")
+        cursor = LogCursor(fpmslowlog.EE_FPM_SLOW_LOG,
+                           fpmslowlog.EE_FPM_SLOW_CURSOR)
+        if self.app.pargs.rewind:
+            cursor.rewind()
+        elif not cursor.load():
+            # first run, the history is only read with --rewind
+            cursor.seek_end()
+            Log.info(self, "Slow requests are reported from now on, use "
+                     "--rewind to analyze the whole log")
+            return
+        report = fpmslowlog.analyze(cursor)
+        if not report.entries:
+            Log.info(self, "No new slow requests in {0}"
+                     .format(fpmslowlog.EE_FPM_SLOW_LOG))
+            return
+
+        top = self.app.pargs.top
+        Log.info(self, "{0} slow requests in {1}"
+                 .format(report.entries, fpmslowlog.EE_FPM_SLOW_LOG))
+        self.show("Plugins", report.top(report.plugins, top))
+        self.show("Scripts", report.top(report.scripts, top))
+        self.show("Hottest frames", report.top(report.frames, top))
+        self.show("Calls on stack", report.top(report.callers, top))
+        stacks = report.top(report.stacks, top)
+        if stacks:
+            Log.info(self, "\nCall stacks", log=False)
+        for frames, hotspot in stacks:
+            Log.info(self, "{0:>8}  {1}  ({2})"
+                     .format(hotspot.count, self.window(hotspot),
+                             ", ".join(sorted(hotspot.sites)) or "-"),
+                     log=False)
+            for func, path in frames:
+                Log.info(self, "{0:10}{1}() {2}".format("", func, path),
+                         log=False)
+
+
+class EELogSearchController(CementBaseController):
+    class Meta:
+        label = 'search'
+        description = 'Show log lines of a time range, archives included'
+        stacked_on = 'log'
+        stacked_type = 'nested'
+        arguments = [
+            (['--since'],
+                dict(help='Start of time range, e.g. 30m, 6h, 2d or '
+                     '"2015-08-01 14:05"', action='store', default=None)),
+            (['--until'],
+                dict(help='End of time range, e.g. "2015-08-01 14:10"',
+                     action='store', default=None)),
+            (['--grep'],
+                dict(help='Only show lines matching regular expression',
+                     action='store', default=None)),
+            (['--nginx'],
+                dict(help='Search Nginx error logs', action='store_true')),
+            (['--access'],
+                dict(help='Search Nginx access logs', action='store_true')),
+            (['--fpm'],
+                dict(help='Search PHP5-fpm logs', action='store_true')),
+            (['--mysql'],
+                dict(help='Search MySQL slow log', action='store_true')),
+            (['site_name'],
+                dict(help='Website Name', nargs='?', default=None))
+            ]
+        usage = "ee log search [<site_name>] [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of log search"""
+        since, until = time_range(self)
+        pattern = None
+        if self.app.pargs.grep:
+            try:
+                pattern = re.compile(self.app.pargs.grep.encode('utf-8'))
+            except re.error as e:
+                Log.error(self, "Invalid regular expression for --grep: {0}"
+                          .format(e))
+
+        if ((not self.app.pargs.nginx) and (not self.app.pargs.access)
+           and (not self.app.pargs.fpm) and (not self.app.pargs.mysql)):
+            self.app.pargs.nginx = True
+            self.app.pargs.access = True
+
+        self.msg = []
+        if self.app.pargs.site_name:
+            webroot = "{0}{1}".format(EEVariables.ee_webroot,
+                                      self.app.pargs.site_name)
+            if not os.path.isdir(webroot):
+                Log.error(self, "Site not present, quitting")
+            site = self.app.pargs.site_name
+        else:
+            site = '*'
+        # current logs, logrotate's and `ee log gzip` archives
+        if self.app.pargs.nginx:
+            self.msg = self.msg + ["/var/log/nginx/{0}.error.log*"
+                                   .format(site)]
+        if self.app.pargs.access:
+            self.msg = self.msg + ["/var/log/nginx/{0}.access.log*"
+                                   .format(site)]
+        if self.app.pargs.fpm:
+            self.msg = self.msg + ['/var/log/php5/slow.log*',
+                                   '/var/log/php5/fpm.log*']
+        if self.app.pargs.mysql:
+            self.msg = self.msg + ['/var/log/mysql/mysql-slow.log*']
+
+        search_list = []
+        for s_list in self.msg:
+            search_list = search_list + log_files(s_list)
+        if since:
+            search_list = [path for path in search_list
+                           if os.path.getmtime(path) >= since]
+        if not search_list:
+            Log.info(self, "No log file found")
+            return
+
+        # oldest first, so lines come out roughly in time order
+        search_list.sort(key=os.path.getmtime)
+        for path in search_list:
+            Log.debug(self, "Searching {0}".format(path))
+            prefix = ("{0}: ".format(os.path.basename(path))
+                      if len(search_list) > 1 else "")
+            for line in blockgzip.search(path, since, until, pattern):
+                print(prefix + line.decode('utf-8', 'replace'))
+
+
+class EELogIndexController(CementBaseController):
+    class Meta:
+        label = 'index'
+        description = 'Add new Nginx access log lines to the query store'
+        stacked_on = 'log'
+        stacked_type = 'nested'
+        arguments = [
+            (['--rebuild'],
+                dict(help='Drop the store of sites and index their logs '
+                     'again from the start', action='store_true')),
+            (['site_name'],
+                dict(help='Website Name', nargs='?', default=None))
+            ]
+        usage = "ee log index [<site_name>] [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of log index"""
+        if self.app.pargs.site_name:
+            webroot = "{0}{1}".format(EEVariables.ee_webroot,
+                                      self.app.pargs.site_name)
+            if not os.path.isdir(webroot):
+                Log.error(self, "Site not present, quitting")
+            pattern = ("/var/log/nginx/{0}.access.log"
+                       .format(self.app.pargs.site_name))
+        else:
+            pattern = "/var/log/nginx/*.access.log"
+
+        index_list = sorted(glob.glob(pattern))
+        if not index_list:
+            Log.error(self, "No access log found, quitting")
+
+        for path in index_list:
+            site = site_of(path)
+            if self.app.pargs.rebuild:
+                logstore.remove_store(logstore.EE_LOG_STORE, site)
+            start = time.time()
+            try:
+                rows = logstore.index_log(logstore.EE_LOG_STORE, site, path)
+            except (IOError, OSError) as e:
+                Log.debug(self, "{0}".format(e))
+                Log.error(self, "Unable to index {0}".format(path))
+            Log.info(self, "{0}: {1} new requests indexed in {2:.1f}s"
+                     .format(site, rows, time.time() - start))
+
+
+class EELogQueryController(CementBaseController):
+    class Meta:
+        label = 'query'
+        description = 'Count requests of indexed Nginx access logs'
+        stacked_on = 'log'
+        stacked_type = 'nested'
+        arguments = [
+            (['--where'],
+                dict(help='Condition on ts, status, bytes, upstream, cache, '
+                     'url, ua or ip, e.g. status>=500, upstream>1.5 or '
+                     'url~^/wp-admin/, may be repeated',
+                     action='append', default=[])),
+            (['--group-by'],
+                dict(help='Count requests by url, ua, ip, cache, status, '
+                     'hour, day or site', action='store', default=None,
+                     choices=logstore.GROUPS, dest='group_by')),
+            (['--since'],
+                dict(help='Only count requests newer than given time, e.g. '
+                     '30m, 6h, 2d or "2015-08-01 10:00"', action='store',
+                     default=None)),
+            (['--until'],
+                dict(help='Only count requests up to given time',
+                     action='store', default=None)),
+            (['--top'],
+                dict(help='Number of groups to show',
+                     action='store', type=int, default=20)),
+            (['site_name'],
+                dict(help='Website Name', nargs='?', default=None))
+            ]
+        usage = "ee log query [<site_name>] [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of log query"""
+        since, until = time_range(self)
+        try:
+            conditions = [logstore.Condition(where)
+                          for where in self.app.pargs.where]
+        except (ValueError, re.error) as e:
+            Log.error(self, "Invalid value for --where: {0}".format(e))
+
+        site_list = logstore.sites(logstore.EE_LOG_STORE)
+        if self.app.pargs.site_name:
+            if self.app.pargs.site_name not in site_list:
+                Log.error(self, "No index of {0} found, run `ee log index "
+                          "{0}` first".format(self.app.pargs.site_name))
+            site_list = [self.app.pargs.site_name]
+        elif not site_list:
+            Log.error(self, "No index found, run `ee log index` first")
+
+        start = time.time()
+        result = logstore.query(logstore.EE_LOG_STORE, site_list,
+                                conditions, self.app.pargs.group_by,
+                                since, until)
+        Log.debug(self, "Query took {0:.3f}s".format(time.time() - start))
+        Log.info(self, "{0:18}{1}".format("Requests", result.rows),
+                 log=False)
+        Log.info(self, "{0:18}{1:.2f} MB"
+                 .format("Bandwidth", result.bytes / (1024 * 1024)),
+                 log=False)
+        if not (self.app.pargs.group_by and result.rows):
+            return
+        groups = result.groups.most_common(self.app.pargs.top)
+        if self.app.pargs.group_by in ('hour', 'day'):
+            groups.sort()
+        for value, count in groups:
+            Log.info(self, "{0:>10} {1:5.1f}%  {2}"
+                     .format(count, 100.0 * count / result.rows, value),
+                     log=False)
 
 
 def load(app):
@@ -574,5 +1171,10 @@ def load(app):
     handler.register(EELogResetController)
     handler.register(EELogGzipController)
     handler.register(EELogMailController)
+    handler.register(EELogStatsController)
+    handler.register(EELogAnalyzeController)
+    handler.register(EELogSearchController)
+    handler.register(EELogIndexController)
+    handler.register(EELogQueryController)
     # register a hook (function) to run after arguments are parsed.
     hook.register('post_argument_parsing', ee_log_hook)
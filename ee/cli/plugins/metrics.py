@@ -0,0 +1,84 @@
+"""Metrics Plugin for EasyEngine."""
+
+from cement.core.controller import CementBaseController, expose
+from cement.core import handler, hook
+from ee.core.logging import Log
+from ee.core.services import EEService
+from ee.core import metrics
+import time
+
+
+def ee_metrics_hook(app):
+    # do something with the ``app`` object here.
+    pass
+
+
+class EEMetricsController(CementBaseController):
+    class Meta:
+        label = 'metrics'
+        stacked_on = 'base'
+        stacked_type = 'nested'
+        description = ('Write Nginx, PHP5-fpm, MySQL and site metrics for '
+                       'Prometheus')
+        arguments = [
+            (['--output'],
+                dict(help='Prometheus textfile to write, default {0}'
+                     .format(metrics.EE_METRICS_FILE), action='store',
+                     default=metrics.EE_METRICS_FILE)),
+            (['--interval'],
+                dict(help='Keep running, collecting every given seconds',
+                     action='store', type=int, default=None)),
+            ]
+        usage = "ee metrics [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Collect metrics once or every --interval seconds"""
+        interval = self.app.pargs.interval
+        if interval is not None and interval < 1:
+            Log.error(self, "--interval must be at least one second")
+
+        if metrics.ensure_stub_status():
+            Log.info(self, "Added stub_status to {0}"
+                     .format(metrics.NGINX_VHOST))
+            EEService.reload_service(self, 'nginx')
+
+        state = metrics.load_state()
+        first = True
+        while True:
+            start = time.time()
+            result, errors = metrics.collect(state)
+            try:
+                metrics.write_textfile(self.app.pargs.output,
+                                       result.render())
+                metrics.save_state(state)
+            except (IOError, OSError) as e:
+                Log.debug(self, "{0}".format(e))
+                Log.error(self, "Unable to write {0}"
+                          .format(self.app.pargs.output))
+            elapsed = time.time() - start
+            for name, error in sorted(errors.items()):
+                Log.debug(self, "Collector {0} failed: {1}"
+                          .format(name, error))
+            message = ("Wrote {0} samples to {1} in {2:.0f} ms"
+                       .format(result.samples(), self.app.pargs.output,
+                               elapsed * 1000))
+            if first:
+                Log.info(self, message)
+                if errors:
+                    Log.warn(self, "Unable to collect {0}, see `ee --debug "
+                             "metrics`".format(", ".join(sorted(errors))))
+            else:
+                Log.debug(self, message)
+            first = False
+            if interval is None:
+                break
+            time.sleep(max(interval - elapsed, 0))
+
+
+def load(app):
+    # register the plugin class.. this only happens if the plugin is enabled
+    handler.register(EEMetricsController)
+
+    # register a hook (function) to run after arguments are parsed.
+    hook.register('post_argument_parsing', ee_metrics_hook)
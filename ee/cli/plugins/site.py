@@ -10,6 +10,7 @@ from ee.cli.plugins.sitedb import *
 from ee.core.git import EEGit
 from subprocess import Popen
 from ee.core.nginxhashbucket import hashbucket
+from ee.core.taskgraph import TaskError
 import sys
 import os
 import glob
@@ -488,30 +489,29 @@ class EESiteCreateController(CementBaseController):
             Log.error(self, "NGINX configuration check failed.")
 
         try:
-            try:
-                # setup NGINX configuration, and webroot
-                setupdomain(self, data)
+            if 'proxy' in data.keys() and data['proxy']:
+                try:
+                    # setup NGINX configuration
+                    setupdomain(self, data)
 
-                # Fix Nginx Hashbucket size error
-                hashbucket(self)
-            except SiteError as e:
-                # call cleanup actions on failure
-                Log.info(self, Log.FAIL + "Oops Something went wrong !!")
-                Log.info(self, Log.FAIL + "Calling cleanup actions ...")
-                doCleanupAction(self, domain=ee_domain,
-                                webroot=data['webroot'])
-                Log.debug(self, str(e))
-                Log.error(self, "Check logs for reason "
-                          "`tail /var/log/ee/ee.log` & Try Again!!!")
+                    # Fix Nginx Hashbucket size error
+                    hashbucket(self)
+                except SiteError as e:
+                    # call cleanup actions on failure
+                    Log.info(self, Log.FAIL + "Oops Something went wrong !!")
+                    Log.info(self, Log.FAIL + "Calling cleanup actions ...")
+                    doCleanupAction(self, domain=ee_domain,
+                                    webroot=data['webroot'])
+                    Log.debug(self, str(e))
+                    Log.error(self, "Check logs for reason "
+                              "`tail /var/log/ee/ee.log` & Try Again!!!")
 
-            if 'proxy' in data.keys() and data['proxy']:
                 addNewSite(self, ee_domain, stype, cache, ee_site_webroot)
                 # Service Nginx Reload
                 if not EEService.reload_service(self, 'nginx'):
                     Log.info(self, Log.FAIL + "Oops Something went wrong !!")
                     Log.info(self, Log.FAIL + "Calling cleanup actions ...")
                     doCleanupAction(self, domain=ee_domain)
-                    Log.debug(self, str(e))
                     Log.error(self, "service nginx reload failed. "
                               "check issues with `nginx -t` command")
                     Log.error(self, "Check logs for reason "
@@ -522,87 +522,42 @@ class EESiteCreateController(CementBaseController):
                 Log.info(self, "Successfully created site"
                          " http://{0}".format(ee_domain))
                 return
-            # Update pagespeed config
-            if self.app.pargs.pagespeed:
-                operateOnPagespeed(self, data)
-
-            addNewSite(self, ee_domain, stype, cache, ee_site_webroot,
-                       hhvm=hhvm, pagespeed=pagespeed)
-
-            # Setup database for MySQL site
-            if 'ee_db_name' in data.keys() and not data['wp']:
-                try:
-                    data = setupdatabase(self, data)
-                    # Add database information for site into database
-                    updateSiteInfo(self, ee_domain, db_name=data['ee_db_name'],
-                                   db_user=data['ee_db_user'],
-                                   db_password=data['ee_db_pass'],
-                                   db_host=data['ee_db_host'])
-                except SiteError as e:
-                    # call cleanup actions on failure
-                    Log.debug(self, str(e))
-                    Log.info(self, Log.FAIL + "Oops Something went wrong !!")
-                    Log.info(self, Log.FAIL + "Calling cleanup actions ...")
-                    doCleanupAction(self, domain=ee_domain,
-                                    webroot=data['webroot'],
-                                    dbname=data['ee_db_name'],
-                                    dbuser=data['ee_db_user'],
-                                    dbhost=data['ee_db_host'])
-                    deleteSiteInfo(self, ee_domain)
-                    Log.error(self, "Check logs for reason "
-                              "`tail /var/log/ee/ee.log` & Try Again!!!")
 
-                try:
-                    eedbconfig = open("{0}/ee-config.php"
-                                      .format(ee_site_webroot),
-                                      encoding='utf-8', mode='w')
-                    eedbconfig.write("<?php \ndefine('DB_NAME', '{0}');"
-                                     "\ndefine('DB_USER', '{1}'); "
-                                     "\ndefine('DB_PASSWORD', '{2}');"
-                                     "\ndefine('DB_HOST', '{3}');\n?>"
-                                     .format(data['ee_db_name'],
-                                             data['ee_db_user'],
-                                             data['ee_db_pass'],
-                                             data['ee_db_host']))
-                    eedbconfig.close()
-                    stype = 'mysql'
-                except IOError as e:
-                    Log.debug(self, str(e))
-                    Log.debug(self, "Error occured while generating "
-                              "ee-config.php")
-                    Log.info(self, Log.FAIL + "Oops Something went wrong !!")
-                    Log.info(self, Log.FAIL + "Calling cleanup actions ...")
+            # Setup NGINX configuration and webroot, database, WordPress
+            # and permissions, steps which do not need each other run
+            # at the same time
+            ee_wp_creds = dict()
+            graph = setup_tasks(self, data, ee_wp_creds)
+            try:
+                # prompts for database name and user are asked one by one
+                graph.run(self, workers=1 if setup_prompts(self) else 4)
+            except TaskError as e:
+                # call cleanup actions on failure
+                Log.debug(self, str(e))
+                Log.info(self, Log.FAIL + "Oops Something went wrong !!")
+                Log.info(self, Log.FAIL + "Calling cleanup actions ...")
+                doCleanupAction(self, domain=ee_domain,
+                                webroot=data['webroot'])
+                if data.get('ee_db_name'):
                     doCleanupAction(self, domain=ee_domain,
-                                    webroot=data['webroot'],
                                     dbname=data['ee_db_name'],
                                     dbuser=data['ee_db_user'],
                                     dbhost=data['ee_db_host'])
-                    deleteSiteInfo(self, ee_domain)
-                    Log.error(self, "Check logs for reason "
-                              "`tail /var/log/ee/ee.log` & Try Again!!!")
+                Log.error(self, "Check logs for reason "
+                          "`tail /var/log/ee/ee.log` & Try Again!!!")
+            Log.debug(self, "Site setup steps took {0}"
+                      .format(", ".join("{0} {1:.2f}s".format(name, took)
+                                        for name, took
+                                        in graph.timings.items())))
 
-            # Setup WordPress if Wordpress site
-            if data['wp']:
-                try:
-                    ee_wp_creds = setupwordpress(self, data)
-                    # Add database information for site into database
-                    updateSiteInfo(self, ee_domain, db_name=data['ee_db_name'],
-                                   db_user=data['ee_db_user'],
-                                   db_password=data['ee_db_pass'],
-                                   db_host=data['ee_db_host'])
-                except SiteError as e:
-                    # call cleanup actions on failure
-                    Log.debug(self, str(e))
-                    Log.info(self, Log.FAIL + "Oops Something went wrong !!")
-                    Log.info(self, Log.FAIL + "Calling cleanup actions ...")
-                    doCleanupAction(self, domain=ee_domain,
-                                    webroot=data['webroot'],
-                                    dbname=data['ee_db_name'],
-                                    dbuser=data['ee_db_user'],
-                                    dbhost=data['ee_db_host'])
-                    deleteSiteInfo(self, ee_domain)
-                    Log.error(self, "Check logs for reason "
-                              "`tail /var/log/ee/ee.log` & Try Again!!!")
+            addNewSite(self, ee_domain, stype, cache, ee_site_webroot,
+                       hhvm=hhvm, pagespeed=pagespeed)
+            # Add database information for site into database
+            if 'ee_db_name' in data.keys():
+                updateSiteInfo(self, ee_domain, db_name=data['ee_db_name'],
+                               db_user=data['ee_db_user'],
+                               db_password=data['ee_db_pass'],
+                               db_host=data['ee_db_host'])
 
             # Service Nginx Reload call cleanup if failed to reload nginx
             if not EEService.reload_service(self, 'nginx'):
@@ -624,24 +579,6 @@ class EESiteCreateController(CementBaseController):
             EEGit.add(self, ["/etc/nginx"],
                       msg="{0} created with {1} {2}"
                       .format(ee_www_domain, stype, cache))
-            # Setup Permissions for webroot
-            try:
-                setwebrootpermissions(self, data['webroot'])
-            except SiteError as e:
-                Log.debug(self, str(e))
-                Log.info(self, Log.FAIL + "Oops Something went wrong !!")
-                Log.info(self, Log.FAIL + "Calling cleanup actions ...")
-                doCleanupAction(self, domain=ee_domain,
-                                webroot=data['webroot'])
-                if 'ee_db_name' in data.keys():
-                    print("Inside db cleanup")
-                    doCleanupAction(self, domain=ee_domain,
-                                    dbname=data['ee_db_name'],
-                                    dbuser=data['ee_db_user'],
-                                    dbhost=data['ee_db_host'])
-                deleteSiteInfo(self, ee_domain)
-                Log.error(self, "Check logs for reason "
-                          "`tail /var/log/ee/ee.log` & Try Again!!!")
 
             if ee_auth and len(ee_auth):
                 for msg in ee_auth:
@@ -1285,6 +1222,53 @@ class EESiteDeleteController(CementBaseController):
         #     Log.error(self, " site {0} does not exists".format(ee_domain))
 
 
+class EESiteRestoreController(CementBaseController):
+    class Meta:
+        label = 'restore'
+        stacked_on = 'site'
+        stacked_type = 'nested'
+        description = 'Restore a backup taken by ee site update'
+        arguments = [
+            (['site_name'],
+                dict(help='Website name', nargs='?')),
+            (['--backup'],
+                dict(help='Backup to restore, latest by default',
+                     action='store', default=None)),
+            (['--list'],
+                dict(help='List backups of site', action='store_true')),
+            ]
+
+    @expose(help="Restore backup of site to <webroot>/backup/<backup>")
+    def default(self):
+        if not self.app.pargs.site_name:
+            try:
+                while not self.app.pargs.site_name:
+                    self.app.pargs.site_name = (input('Enter site name : ')
+                                                .strip())
+            except IOError as e:
+                Log.error(self, 'could not input site name')
+        self.app.pargs.site_name = self.app.pargs.site_name.strip()
+        (ee_domain, ee_www_domain) = ValidateDomain(self.app.pargs.site_name)
+        if not check_domain_exists(self, ee_domain):
+            Log.error(self, "site {0} does not exist".format(ee_domain))
+        ee_site_webroot = getSiteInfo(self, ee_domain).site_path
+
+        if self.app.pargs.list:
+            store = BackupStore(ee_site_webroot + '/backup/store')
+            for name in store.names():
+                Log.info(self, name)
+            return
+
+        try:
+            path = siterestore(self, ee_site_webroot, self.app.pargs.backup)
+        except SiteError as e:
+            Log.debug(self, str(e))
+            Log.error(self, "Unable to restore backup of {0}: {1}"
+                      .format(ee_domain, e))
+        Log.info(self, "Backup of {0} restored to {1}"
+                 .format(ee_domain, path))
+
+
 class EESiteListController(CementBaseController):
     class Meta:
         label = 'list'
@@ -1324,6 +1308,7 @@ def load(app):
     handler.register(EESiteUpdateController)
     handler.register(EESiteDeleteController)
     handler.register(EESiteListController)
+    handler.register(EESiteRestoreController)
     handler.register(EESiteEditController)
     # register a hook (function) to run after arguments are parsed.
     hook.register('post_argument_parsing', ee_site_hook)
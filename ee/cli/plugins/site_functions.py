@@ -1,6 +1,7 @@
 from ee.cli.plugins.stack import EEStackController
 from ee.core.fileutils import EEFileUtils
 from ee.core.mysql import *
+from ee.core.mysql import dump_command, low_priority
 from ee.core.shellexec import *
 from ee.core.variables import EEVariables
 from ee.cli.plugins.sitedb import *
@@ -8,8 +9,16 @@ from ee.core.aptget import EEAptGet
 from ee.core.git import EEGit
 from ee.core.logging import Log
 from ee.core.services import EEService
+from ee.core.nginxhashbucket import hashbucket
+from ee.core.taskgraph import EETaskGraph
+from ee.core.artifacts import (DownloadError, WP_CORE_URL, WP_PLUGIN_URL,
+                               artifact_cache)
+from ee.core.extract import EEExtract
+from ee.core.profile import EEProfile
+from ee.core.backupstore import BackupStore, BackupStoreError
 import subprocess
 from subprocess import CalledProcessError
+import tempfile
 import os
 import random
 import string
@@ -29,6 +38,15 @@ class SiteError(Exception):
         return repr(self.message)
 
 
+def log_step(self, message, done=True):
+    """
+        Prints message of a site setup step along with its outcome, at
+        once as steps of ee site create run concurrently
+    """
+    Log.info(self, message + "[" + Log.ENDC + ("Done" if done else Log.FAIL +
+                                               "Fail") + Log.OKBLUE + "]")
+
+
 def pre_run_checks(self):
 
     # Check nginx configuration
@@ -60,7 +78,6 @@ def setupdomain(self, data):
     #                   .format(ee_domain_name)):
     #     raise SiteError("nginx configuration already exists for site")
 
-    Log.info(self, "Setting up NGINX configuration \t", end='')
     # write nginx config for file
     try:
         ee_site_nginx_conf = open('/etc/nginx/sites-available/{0}'
@@ -83,11 +100,10 @@ def setupdomain(self, data):
             FNULL = open('/dev/null', 'w')
             ret = subprocess.check_call(["nginx", "-t"], stdout=FNULL,
                                         stderr=subprocess.STDOUT)
-            Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
+            log_step(self, "Setting up NGINX configuration \t")
         except CalledProcessError as e:
             Log.debug(self, "{0}".format(str(e)))
-            Log.info(self, "[" + Log.ENDC + Log.FAIL + "Fail"
-                     + Log.OKBLUE + "]")
+            log_step(self, "Setting up NGINX configuration \t", done=False)
             raise SiteError("created nginx configuration failed for site."
                             " check with `nginx -t`")
 
@@ -101,10 +117,9 @@ def setupdomain(self, data):
                                       .format(ee_domain_name)])
 
     # Creating htdocs & logs directory
-    Log.info(self, "Setting up webroot \t\t", end='')
     try:
-        if not os.path.exists('{0}/htdocs'.format(ee_site_webroot)):
-            os.makedirs('{0}/htdocs'.format(ee_site_webroot))
+        # WordPress download may have created it already
+        os.makedirs('{0}/htdocs'.format(ee_site_webroot), exist_ok=True)
         if not os.path.exists('{0}/logs'.format(ee_site_webroot)):
             os.makedirs('{0}/logs'.format(ee_site_webroot))
         if not os.path.exists('{0}/conf/nginx'.format(ee_site_webroot)):
@@ -125,9 +140,9 @@ def setupdomain(self, data):
         # TODO Check if directories are setup
         if (os.path.exists('{0}/htdocs'.format(ee_site_webroot)) and
            os.path.exists('{0}/logs'.format(ee_site_webroot))):
-            Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
+            log_step(self, "Setting up webroot \t\t")
         else:
-            Log.info(self, "[" + Log.ENDC + "Fail" + Log.OKBLUE + "]")
+            log_step(self, "Setting up webroot \t\t", done=False)
             raise SiteError("setup webroot failed for site")
 
 
@@ -176,47 +191,38 @@ def setupdatabase(self, data):
         ee_db_username = (ee_db_name[0:6] + generate_random())
 
     # create MySQL database
-    Log.info(self, "Setting up database\t\t", end='')
     Log.debug(self, "Creating database {0}".format(ee_db_name))
     try:
-        if EEMysql.check_db_exists(self, ee_db_name):
+        if EEMysql.check_db_exists(self, ee_db_name) or \
+           EEMysql.check_user_exists(self, ee_db_username,
+                                     ee_mysql_grant_host):
             Log.debug(self, "Database already exists, Updating DB_NAME .. ")
             ee_db_name = (ee_db_name[0:6] + generate_random())
             ee_db_username = (ee_db_name[0:6] + generate_random())
     except MySQLConnectionError as e:
         raise SiteError("MySQL Connectivity problem occured")
 
-    try:
-        EEMysql.execute(self, "create database `{0}`"
-                        .format(ee_db_name))
-    except StatementExcecutionError as e:
-        Log.info(self, "[" + Log.ENDC + Log.FAIL + "Failed" + Log.OKBLUE + "]")
-        raise SiteError("create database execution failed")
-    # Create MySQL User
+    # Create database and user, grant permission, all on one connection
     Log.debug(self, "Creating user {0}".format(ee_db_username))
     Log.debug(self, "create user `{0}`@`{1}` identified by ''"
               .format(ee_db_username, ee_mysql_grant_host))
-    try:
-        EEMysql.execute(self,
-                        "create user `{0}`@`{1}` identified by '{2}'"
-                        .format(ee_db_username, ee_mysql_grant_host,
-                                ee_db_password), log=False)
-    except StatementExcecutionError as e:
-        Log.info(self, "[" + Log.ENDC + Log.FAIL + "Failed" + Log.OKBLUE + "]")
-        raise SiteError("creating user failed for database")
-
-    # Grant permission
     Log.debug(self, "Setting up user privileges")
     try:
-        EEMysql.execute(self,
-                        "grant all privileges on `{0}`.* to `{1}`@`{2}`"
-                        .format(ee_db_name,
-                                ee_db_username, ee_mysql_grant_host))
-    except StatementExcecutionError as e:
-        Log.info(self, "[" + Log.ENDC + Log.FAIL + "Failed" + Log.OKBLUE + "]")
-        SiteError("grant privileges to user failed for database ")
-
-    Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
+        EEMysql.execute_many(self, ["create database `{0}`"
+                                    .format(ee_db_name),
+                                    "create user `{0}`@`{1}` identified by "
+                                    "'{2}'".format(ee_db_username,
+                                                   ee_mysql_grant_host,
+                                                   ee_db_password),
+                                    "grant all privileges on `{0}`.* to "
+                                    "`{1}`@`{2}`"
+                                    .format(ee_db_name, ee_db_username,
+                                            ee_mysql_grant_host)], log=False)
+    except (StatementExcecutionError, MySQLConnectionError) as e:
+        log_step(self, "Setting up database\t\t", done=False)
+        raise SiteError("setting up database failed: {0}".format(e))
+
+    log_step(self, "Setting up database\t\t")
 
     data['ee_db_name'] = ee_db_name
     data['ee_db_user'] = ee_db_username
@@ -225,7 +231,44 @@ def setupdatabase(self, data):
     return(data)
 
 
-def setupwordpress(self, data):
+def unpack_artifact(self, url, path, strip=''):
+    """
+        Extracts archive downloaded from url to path through the artifact
+        cache, returns False when it could not be fetched or extracted
+    """
+    try:
+        with EEProfile.span('download', url):
+            archive, transferred = artifact_cache(self).get(url)
+    except (DownloadError, OSError) as e:
+        Log.debug(self, "{0}".format(e))
+        return False
+    Log.debug(self, "Extracting {0} from {1}".format(url, archive))
+    return EEExtract.unpack(self, archive, path, strip=strip)
+
+
+def downloadwordpress(self, data):
+    """Downloads WordPress core to htdocs of site"""
+    ee_site_htdocs = '{0}/htdocs/'.format(data['webroot'])
+    os.makedirs(ee_site_htdocs, exist_ok=True)
+    downloaded = unpack_artifact(self, WP_CORE_URL, ee_site_htdocs,
+                                 strip='wordpress')
+    if not downloaded and not artifact_cache(self).offline:
+        try:
+            # --path instead of changing directory, setupdomain and
+            # setupdatabase may be running at the same time
+            downloaded = EEShellExec.cmd_exec(self, ["wp", "--allow-root",
+                                                     "core", "download",
+                                                     "--path={0}"
+                                                     .format(ee_site_htdocs)])
+        except (OSError, CommandExecutionError) as e:
+            Log.debug(self, "{0}".format(e))
+    if not downloaded:
+        log_step(self, "Downloading Wordpress \t\t", done=False)
+        raise SiteError("download wordpress core failed")
+    log_step(self, "Downloading Wordpress \t\t")
+
+
+def setupwordpress(self, data, download=True):
     ee_domain_name = data['site_name']
     ee_site_webroot = data['webroot']
     prompt_wpprefix = self.app.config.get('wordpress', 'prefix')
@@ -246,16 +289,8 @@ def setupwordpress(self, data):
     if 'wp-pass' in data.keys() and data['wp-pass']:
         ee_wp_pass = data['wp-pass']
 
-    Log.info(self, "Downloading Wordpress \t\t", end='')
-    EEFileUtils.chdir(self, '{0}/htdocs/'.format(ee_site_webroot))
-    try:
-        EEShellExec.cmd_exec(self, "wp --allow-root core"
-                             " download")
-    except CommandExecutionError as e:
-        Log.info(self, "[" + Log.ENDC + Log.FAIL + "Fail" + Log.OKBLUE + "]")
-        raise SiteError(self, "download wordpress core failed")
-
-    Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
+    if download:
+        downloadwordpress(self, data)
 
     if not (data['ee_db_name'] and data['ee_db_user'] and data['ee_db_pass']):
         data = setupdatabase(self, data)
@@ -275,8 +310,9 @@ def setupwordpress(self, data):
         ee_wp_prefix = 'wp_'
 
     # Modify wp-config.php & move outside the webroot
-
-    EEFileUtils.chdir(self, '{0}/htdocs/'.format(ee_site_webroot))
+    # wp runs in htdocs through cwd, this may run in a thread next to
+    # other tasks so the working directory of ee is left alone
+    ee_site_htdocs = '{0}/htdocs/'.format(ee_site_webroot)
     Log.debug(self, "Setting up wp-config file")
     if not data['multisite']:
         Log.debug(self, "Generating wp-config for WordPress Single site")
@@ -302,7 +338,7 @@ def setupwordpress(self, data):
                                    "--extra-php<<PHP \n {1}\nPHP\""
                                    .format(data['ee_db_pass'],
                                            "\n\ndefine(\'WP_DEBUG\', false);"),
-                                   log=False
+                                   log=False, cwd=ee_site_htdocs
                                  )
         except CommandExecutionError as e:
                 raise SiteError("generate wp-config failed for wp single site")
@@ -336,13 +372,13 @@ def setupwordpress(self, data):
                                          "\ndefine(\'WPMU_ACCEL_REDIRECT\',"
                                          " true);",
                                          "\n\ndefine(\'WP_DEBUG\', false);"),
-                                 log=False
+                                 log=False, cwd=ee_site_htdocs
                                  )
         except CommandExecutionError as e:
                 raise SiteError("generate wp-config failed for wp multi site")
 
-    EEFileUtils.mvfile(self, os.getcwd()+'/wp-config.php',
-                       os.path.abspath(os.path.join(os.getcwd(), os.pardir)))
+    EEFileUtils.mvfile(self, ee_site_htdocs + 'wp-config.php',
+                       os.path.abspath(ee_site_webroot))
 
     if not ee_wp_user:
         ee_wp_user = EEVariables.ee_user
@@ -394,7 +430,7 @@ def setupwordpress(self, data):
                                  + "--admin_password=\'{0}\' "
                                  "--admin_email=\'{1}\'"
                                  .format(ee_wp_pass, ee_wp_email),
-                                 log=False)
+                                 log=False, cwd=ee_site_htdocs)
         except CommandExceutionError as e:
             raise SiteError("setup wordpress tables failed for single site")
     else:
@@ -420,7 +456,7 @@ def setupwordpress(self, data):
                                  .format(ee_wp_pass, ee_wp_email,
                                          subdomains='--subdomains'
                                          if not data['wpsubdir'] else ''),
-                                 log=False)
+                                 log=False, cwd=ee_site_htdocs)
         except CommandExecutionError as e:
             raise SiteError("setup wordpress tables failed for wp multi site")
 
@@ -428,7 +464,8 @@ def setupwordpress(self, data):
     try:
         EEShellExec.cmd_exec(self, " php /usr/bin/wp --allow-root "
                              "rewrite structure "
-                             "/%year%/%monthnum%/%day%/%postname%/")
+                             "/%year%/%monthnum%/%day%/%postname%/",
+                             cwd=ee_site_htdocs)
     except CommandExecutionError as e:
         raise SiteError("Update wordpress permalinks failed")
 
@@ -451,14 +488,14 @@ def setupwordpress(self, data):
 
 def setupwordpressnetwork(self, data):
     ee_site_webroot = data['webroot']
-    EEFileUtils.chdir(self, '{0}/htdocs/'.format(ee_site_webroot))
     Log.info(self, "Setting up WordPress Network \t", end='')
     try:
         EEShellExec.cmd_exec(self, 'wp --allow-root core multisite-convert'
                              ' --title=\'{0}\' {subdomains}'
                              .format(data['www_domain'],
                                      subdomains='--subdomains'
-                                     if not data['wpsubdir'] else ''))
+                                     if not data['wpsubdir'] else ''),
+                             cwd='{0}/htdocs/'.format(ee_site_webroot))
     except CommandExecutionError as e:
         Log.info(self, "[" + Log.ENDC + Log.FAIL + "Fail" + Log.OKBLUE + "]")
         raise SiteError("setup wordpress network failed")
@@ -467,15 +504,18 @@ def setupwordpressnetwork(self, data):
 
 def installwp_plugin(self, plugin_name, data):
     ee_site_webroot = data['webroot']
+    ee_site_htdocs = '{0}/htdocs/'.format(ee_site_webroot)
     Log.info(self, "Installing plugin {0}, please wait..."
              .format(plugin_name))
-    EEFileUtils.chdir(self, '{0}/htdocs/'.format(ee_site_webroot))
-    try:
-        EEShellExec.cmd_exec(self, "php /usr/bin/wp plugin "
-                             "--allow-root install "
-                             "{0}".format(plugin_name))
-    except CommandExecutionError as e:
-        raise SiteError("plugin installation failed")
+    if not unpack_artifact(self, WP_PLUGIN_URL.format(plugin_name),
+                           ee_site_htdocs + 'wp-content/plugins/'):
+        try:
+            EEShellExec.cmd_exec(self, "php /usr/bin/wp plugin "
+                                 "--allow-root install "
+                                 "{0}".format(plugin_name),
+                                 cwd=ee_site_htdocs)
+        except CommandExecutionError as e:
+            raise SiteError("plugin installation failed")
 
     try:
         EEShellExec.cmd_exec(self, "php /usr/bin/wp plugin "
@@ -484,7 +524,7 @@ def installwp_plugin(self, plugin_name, data):
                              .format(plugin_name,
                                      na='--network' if data['multisite']
                                      else ''
-                                     ))
+                                     ), cwd=ee_site_htdocs)
     except CommandExecutionError as e:
         raise SiteError("plugin activation failed")
 
@@ -493,11 +533,11 @@ def uninstallwp_plugin(self, plugin_name, data):
     ee_site_webroot = data['webroot']
     Log.debug(self, "Uninstalling plugin {0}, please wait..."
               .format(plugin_name))
-    EEFileUtils.chdir(self, '{0}/htdocs/'.format(ee_site_webroot))
     try:
         EEShellExec.cmd_exec(self, "php /usr/bin/wp plugin "
                              "--allow-root uninstall "
-                             "{0}".format(plugin_name))
+                             "{0}".format(plugin_name),
+                             cwd='{0}/htdocs/'.format(ee_site_webroot))
     except CommandExecutionError as e:
         raise SiteError("plugin uninstall failed")
 
@@ -512,43 +552,150 @@ def setwebrootpermissions(self, webroot):
         raise SiteError("problem occured while settingup webroot permissions")
 
 
+def setupeeconfig(self, data):
+    """Writes database credentials of MySQL site to ee-config.php"""
+    try:
+        eedbconfig = open("{0}/ee-config.php".format(data['webroot']),
+                          encoding='utf-8', mode='w')
+        eedbconfig.write("<?php \ndefine('DB_NAME', '{0}');"
+                         "\ndefine('DB_USER', '{1}'); "
+                         "\ndefine('DB_PASSWORD', '{2}');"
+                         "\ndefine('DB_HOST', '{3}');\n?>"
+                         .format(data['ee_db_name'], data['ee_db_user'],
+                                 data['ee_db_pass'], data['ee_db_host']))
+        eedbconfig.close()
+    except IOError as e:
+        Log.debug(self, str(e))
+        raise SiteError("Error occured while generating ee-config.php")
+
+
+def setup_prompts(self):
+    """True if setupdatabase asks for database name or user"""
+    return any(str(self.app.config.get('mysql', option)).lower() == 'true'
+               for option in ('db-name', 'db-user'))
+
+
+def setup_tasks(self, data, wp_creds):
+    """
+        Steps of site creation as EETaskGraph, a step only waits for the
+        steps it needs. WordPress is downloaded and its database created
+        while the NGINX configuration is written and tested.
+        Credentials of the WordPress admin are added to wp_creds.
+    """
+    graph = EETaskGraph()
+    graph.add('nginx', lambda: setupdomain(self, data))
+    # Fix Nginx Hashbucket size error
+    graph.add('hashbucket', lambda: hashbucket(self), requires=['nginx'])
+    content = ['nginx']
+    if data['pagespeed']:
+        graph.add('pagespeed', lambda: operateOnPagespeed(self, data),
+                  requires=['nginx'])
+        content.append('pagespeed')
+    if 'ee_db_name' in data.keys():
+        graph.add('database', lambda: setupdatabase(self, data))
+    if data['wp']:
+        graph.add('download', lambda: downloadwordpress(self, data))
+        graph.add('wordpress',
+                  lambda: wp_creds.update(setupwordpress(self, data,
+                                                         download=False)),
+                  requires=['nginx', 'download', 'database'])
+        content.append('wordpress')
+    elif 'ee_db_name' in data.keys():
+        graph.add('ee-config', lambda: setupeeconfig(self, data),
+                  requires=['nginx', 'database'])
+        content.append('ee-config')
+    graph.add('permissions',
+              lambda: setwebrootpermissions(self, data['webroot']),
+              requires=content)
+    return graph
+
+
 def sitebackup(self, data):
+    """
+        Stores nginx configuration, webroot of html, php, proxy and mysql
+        sites and the database of the site as a backup in the backup
+        store of the site, the webroot and config of mysql and proxy sites
+        are removed afterwards as they used to be moved to the backup
+    """
     ee_site_webroot = data['webroot']
-    backup_path = ee_site_webroot + '/backup/{0}'.format(EEVariables.ee_date)
-    if not EEFileUtils.isexist(self, backup_path):
-        EEFileUtils.mkdir(self, backup_path)
-    Log.info(self, "Backup location : {0}".format(backup_path))
-    EEFileUtils.copyfile(self, '/etc/nginx/sites-available/{0}'
-                         .format(data['site_name']), backup_path)
-
-    if data['currsitetype'] in ['html', 'php', 'proxy', 'mysql']:
-        Log.info(self, "Backing up Webroot \t\t", end='')
-        EEFileUtils.mvfile(self, ee_site_webroot + '/htdocs', backup_path)
-        Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
+    store = BackupStore(ee_site_webroot + '/backup/store')
+    name = EEVariables.ee_date
+    Log.info(self, "Backup location : {0} ({1})".format(store.root, name))
+    sources = [(data['site_name'], '/etc/nginx/sites-available/{0}'
+                .format(data['site_name']))]
+    move_webroot = data['currsitetype'] in ['html', 'php', 'proxy', 'mysql']
+    if move_webroot:
+        sources.append(('htdocs', ee_site_webroot + '/htdocs'))
 
     configfiles = glob.glob(ee_site_webroot + '/*-config.php')
-    # if configfiles and EEFileUtils.isexist(self, configfiles[0]):
-    #     ee_db_name = (EEFileUtils.grep(self, configfiles[0],
-    #                   'DB_NAME').split(',')[1]
-    #                   .split(')')[0].strip().replace('\'', ''))
+    streams = []
+    dump = None
     if data['ee_db_name']:
-        Log.info(self, 'Backing up database \t\t', end='')
+        if configfiles:
+            sources.append((os.path.basename(configfiles[0]),
+                            configfiles[0]))
+        errors = tempfile.TemporaryFile()
         try:
-            if not EEShellExec.cmd_exec(self, "mysqldump {0} > {1}/{0}.sql"
-                                        .format(data['ee_db_name'],
-                                                backup_path)):
-                Log.info(self,
-                         "[" + Log.ENDC + Log.FAIL + "Fail" + Log.OKBLUE + "]")
-                raise SiteError("mysqldump failed to backup database")
-        except CommandExecutionError as e:
-            Log.info(self, "[" + Log.ENDC + "Fail" + Log.OKBLUE + "]")
+            dump = subprocess.Popen(low_priority(dump_command(
+                                    data['ee_db_name'])),
+                                    stdout=subprocess.PIPE, stderr=errors)
+        except OSError as e:
+            Log.debug(self, "{0}".format(e))
+            log_step(self, "Backing up site \t\t", done=False)
             raise SiteError("mysqldump failed to backup database")
-        Log.info(self, "[" + Log.ENDC + "Done" + Log.OKBLUE + "]")
-        # move wp-config.php/ee-config.php to backup
-        if data['currsitetype'] in ['mysql', 'proxy']:
-            EEFileUtils.mvfile(self, configfiles[0], backup_path)
-        else:
-            EEFileUtils.copyfile(self, configfiles[0], backup_path)
+        streams.append(('{0}.sql'.format(data['ee_db_name']), dump.stdout))
+
+    try:
+        with EEProfile.span('backup', data['site_name']):
+            manifest = store.backup(name, sources, streams)
+    except (OSError, BackupStoreError) as e:
+        Log.debug(self, "{0}".format(e))
+        log_step(self, "Backing up site \t\t", done=False)
+        raise SiteError("site backup failed")
+    finally:
+        if dump is not None:
+            dump.stdout.close()
+            dump.wait()
+            errors.seek(0)
+            message = errors.read().decode('utf-8', 'replace').strip()
+            errors.close()
+    if dump is not None and dump.returncode:
+        Log.debug(self, message)
+        store.remove(name)
+        log_step(self, "Backing up site \t\t", done=False)
+        raise SiteError("mysqldump failed to backup database")
+    log_step(self, "Backing up site \t\t")
+    Log.debug(self, "Backed up {0} entries".format(len(manifest['entries'])))
+
+    # the backup used to be made by moving these away
+    if move_webroot:
+        EEFileUtils.rm(self, ee_site_webroot + '/htdocs')
+    if data['ee_db_name'] and configfiles and \
+       data['currsitetype'] in ['mysql', 'proxy']:
+        EEFileUtils.rm(self, configfiles[0])
+
+
+def siterestore(self, webroot, name=None):
+    """
+        Reassembles backup called name, the latest by default, of site in
+        <webroot>/backup/<name> the way backups used to be laid out
+    """
+    store = BackupStore(webroot + '/backup/store')
+    names = store.names()
+    if not names:
+        raise SiteError("no backups found in {0}".format(store.root))
+    if name is None:
+        name = names[-1]
+    elif name not in names:
+        raise SiteError("backup {0} not found, backups: {1}"
+                        .format(name, ", ".join(names)))
+    path = webroot + '/backup/{0}'.format(name)
+    try:
+        store.restore(name, path)
+    except (OSError, BackupStoreError) as e:
+        Log.debug(self, "{0}".format(e))
+        raise SiteError("restoring backup {0} failed".format(name))
+    return path
 
 
 def site_package_check(self, stype):
@@ -856,7 +1003,11 @@ def deleteDB(self, dbname, dbuser, dbhost):
         except MySQLConnectionError as e:
             Log.debug(self, "Mysql Connection problem occured")
 
-        if dbuser != 'root':
+        if dbuser != 'root' and \
+           not EEMysql.check_user_exists(self, dbuser, dbhost):
+            Log.debug(self, "user `{0}`@`{1}` does not exist"
+                      .format(dbuser, dbhost))
+        elif dbuser != 'root':
             Log.debug(self, "dropping user `{0}`".format(dbuser))
             try:
                 EEMysql.execute(self,
@@ -37,6 +37,11 @@ def ee_stack_hook(app):
     pass
 
 
+def package_url(packages, path):
+    """URL of the package downloaded to path"""
+    return [package[0] for package in packages if package[1] == path][0]
+
+
 class EEStackController(CementBaseController):
     class Meta:
         label = 'stack'
@@ -975,19 +980,14 @@ class EEStackController(CementBaseController):
 
             if any('/tmp/pma.tar.gz' == x[1]
                     for x in packages):
-                EEExtract.extract(self, '/tmp/pma.tar.gz', '/tmp/')
-                Log.debug(self, 'Extracting file /tmp/pma.tar.gz to '
-                          'loaction /tmp/')
-                if not os.path.exists('{0}22222/htdocs/db'
-                                      .format(EEVariables.ee_webroot)):
-                    Log.debug(self, "Creating new  directory "
-                              "{0}22222/htdocs/db"
-                              .format(EEVariables.ee_webroot))
-                    os.makedirs('{0}22222/htdocs/db'
-                                .format(EEVariables.ee_webroot))
-                shutil.move('/tmp/phpmyadmin-STABLE/',
-                            '{0}22222/htdocs/db/pma/'
-                            .format(EEVariables.ee_webroot))
+                Log.debug(self, 'Extracting phpMyAdmin to location '
+                          '{0}22222/htdocs/db/pma'
+                          .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/pma.tar.gz'),
+                                 '{0}22222/htdocs/db/pma'
+                                 .format(EEVariables.ee_webroot),
+                                 strip='phpmyadmin-STABLE')
                 Log.debug(self, 'Setting Privileges of webroot permission to  '
                           '{0}22222/htdocs/db/pma file '
                           .format(EEVariables.ee_webroot))
@@ -1001,9 +1001,10 @@ class EEStackController(CementBaseController):
                 Log.debug(self, "Extracting memcache.tar.gz to location"
                           " {0}22222/htdocs/cache/memcache "
                           .format(EEVariables.ee_webroot))
-                EEExtract.extract(self, '/tmp/memcache.tar.gz',
-                                  '{0}22222/htdocs/cache/memcache'
-                                  .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/memcache.tar.gz'),
+                                 '{0}22222/htdocs/cache/memcache'
+                                 .format(EEVariables.ee_webroot))
                 Log.debug(self, "Setting Privileges to "
                           "{0}22222/htdocs/cache/memcache file"
                           .format(EEVariables.ee_webroot))
@@ -1015,19 +1016,14 @@ class EEStackController(CementBaseController):
 
             if any('/tmp/webgrind.tar.gz' == x[1]
                     for x in packages):
-                Log.debug(self, "Extracting file webgrind.tar.gz to "
-                          "location /tmp/ ")
-                EEExtract.extract(self, '/tmp/webgrind.tar.gz', '/tmp/')
-                if not os.path.exists('{0}22222/htdocs/php'
-                                      .format(EEVariables.ee_webroot)):
-                    Log.debug(self, "Creating directroy "
-                              "{0}22222/htdocs/php"
-                              .format(EEVariables.ee_webroot))
-                    os.makedirs('{0}22222/htdocs/php'
-                                .format(EEVariables.ee_webroot))
-                shutil.move('/tmp/webgrind-master/',
-                            '{0}22222/htdocs/php/webgrind'
-                            .format(EEVariables.ee_webroot))
+                Log.debug(self, "Extracting Webgrind to location "
+                          "{0}22222/htdocs/php/webgrind"
+                          .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/webgrind.tar.gz'),
+                                 '{0}22222/htdocs/php/webgrind'
+                                 .format(EEVariables.ee_webroot),
+                                 strip='webgrind-master')
 
                 EEFileUtils.searchreplace(self, "{0}22222/htdocs/php/webgrind/"
                                           "config.php"
@@ -1055,17 +1051,14 @@ class EEStackController(CementBaseController):
 
             if any('/tmp/anemometer.tar.gz' == x[1]
                     for x in packages):
-                Log.debug(self, "Extracting file anemometer.tar.gz to "
-                          "location /tmp/ ")
-                EEExtract.extract(self, '/tmp/anemometer.tar.gz', '/tmp/')
-                if not os.path.exists('{0}22222/htdocs/db/'
-                                      .format(EEVariables.ee_webroot)):
-                    Log.debug(self, "Creating directory")
-                    os.makedirs('{0}22222/htdocs/db/'
-                                .format(EEVariables.ee_webroot))
-                shutil.move('/tmp/Anemometer-master',
-                            '{0}22222/htdocs/db/anemometer'
-                            .format(EEVariables.ee_webroot))
+                Log.debug(self, "Extracting Anemometer to location "
+                          "{0}22222/htdocs/db/anemometer"
+                          .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/anemometer.tar.gz'),
+                                 '{0}22222/htdocs/db/anemometer'
+                                 .format(EEVariables.ee_webroot),
+                                 strip='Anemometer-master')
                 chars = ''.join(random.sample(string.ascii_letters, 8))
                 try:
                     EEShellExec.cmd_exec(self, 'mysql < {0}22222/htdocs/db'
@@ -1104,20 +1097,15 @@ class EEStackController(CementBaseController):
 
             if any('/tmp/vimbadmin.tar.gz' == x[1] for x in packages):
                 # Extract ViMbAdmin
-                Log.debug(self, "Extracting ViMbAdmin.tar.gz to "
-                          "location /tmp/")
-                EEExtract.extract(self, '/tmp/vimbadmin.tar.gz', '/tmp/')
-                if not os.path.exists('{0}22222/htdocs/'
-                                      .format(EEVariables.ee_webroot)):
-                    Log.debug(self, "Creating directory "
-                              "{0}22222/htdocs/"
-                              .format(EEVariables.ee_webroot))
-                    os.makedirs('{0}22222/htdocs/'
-                                .format(EEVariables.ee_webroot))
-                shutil.move('/tmp/ViMbAdmin-{0}/'
-                            .format(EEVariables.ee_vimbadmin),
-                            '{0}22222/htdocs/vimbadmin/'
-                            .format(EEVariables.ee_webroot))
+                Log.debug(self, "Extracting ViMbAdmin to location "
+                          "{0}22222/htdocs/vimbadmin"
+                          .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/vimbadmin.tar.gz'),
+                                 '{0}22222/htdocs/vimbadmin'
+                                 .format(EEVariables.ee_webroot),
+                                 strip='ViMbAdmin-{0}'
+                                 .format(EEVariables.ee_vimbadmin))
 
                 # Donwload composer and install ViMbAdmin
                 Log.debug(self, "Downloading composer "
@@ -1260,20 +1248,15 @@ class EEStackController(CementBaseController):
 
             if any('/tmp/roundcube.tar.gz' == x[1] for x in packages):
                 # Extract RoundCubemail
-                Log.debug(self, "Extracting file /tmp/roundcube.tar.gz "
-                          "to location /tmp/ ")
-                EEExtract.extract(self, '/tmp/roundcube.tar.gz', '/tmp/')
-                if not os.path.exists('{0}roundcubemail'
-                                      .format(EEVariables.ee_webroot)):
-                    Log.debug(self, "Creating new directory "
-                              " {0}roundcubemail/"
-                              .format(EEVariables.ee_webroot))
-                    os.makedirs('{0}roundcubemail/'
-                                .format(EEVariables.ee_webroot))
-                shutil.move('/tmp/roundcubemail-{0}/'
-                            .format(EEVariables.ee_roundcube),
-                            '{0}roundcubemail/htdocs'
-                            .format(EEVariables.ee_webroot))
+                Log.debug(self, "Extracting Roundcube to location "
+                          "{0}roundcubemail/htdocs"
+                          .format(EEVariables.ee_webroot))
+                EEExtract.stream(self, package_url(packages,
+                                                   '/tmp/roundcube.tar.gz'),
+                                 '{0}roundcubemail/htdocs'
+                                 .format(EEVariables.ee_webroot),
+                                 strip='roundcubemail-{0}'
+                                 .format(EEVariables.ee_roundcube))
 
                 # Install Roundcube depednet pear packages
                 EEShellExec.cmd_exec(self, "pear install Mail_Mime Net_SMTP"
@@ -1594,7 +1577,14 @@ class EEStackController(CementBaseController):
                 EEAptGet.install(self, apt_packages)
             if len(packages):
                 Log.debug(self, "Downloading following: {0}".format(packages))
-                EEDownload.download(self, packages)
+                # tarballs are fetched into the artifact cache alongside
+                # the rest and extracted from there by post_pref, tools
+                # which are not versioned are never used stale
+                EEDownload.download(self, packages,
+                                    current=['/usr/bin/wp',
+                                             '/usr/bin/mysqltuner'],
+                                    cached=[package[1] for package in packages
+                                            if package[1].endswith('.tar.gz')])
             Log.debug(self, "Calling post_pref")
             self.post_pref(apt_packages, packages)
             if disp_msg:
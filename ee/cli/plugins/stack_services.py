@@ -48,9 +48,9 @@ class EEStackStatusController(CementBaseController):
         if self.app.pargs.mysql:
             if ((EEVariables.ee_mysql_host is "localhost") or
                (EEVariables.ee_mysql_host is "127.0.0.1")):
-                if (EEAptGet.is_installed(self, 'mysql-server') or
-                   EEAptGet.is_installed(self, 'percona-server-server-5.6') or
-                   EEAptGet.is_installed(self, 'mariadb-server')):
+                if any(EEAptGet.installed_map(self, [
+                       'mysql-server', 'percona-server-server-5.6',
+                       'mariadb-server']).values()):
                     services = services + ['mysql']
                 else:
                     Log.info(self, "MySQL is not installed")
@@ -114,9 +114,9 @@ class EEStackStatusController(CementBaseController):
         if self.app.pargs.mysql:
             if ((EEVariables.ee_mysql_host is "localhost") or
                (EEVariables.ee_mysql_host is "127.0.0.1")):
-                if (EEAptGet.is_installed(self, 'mysql-server') or
-                   EEAptGet.is_installed(self, 'percona-server-server-5.6') or
-                   EEAptGet.is_installed(self, 'mariadb-server')):
+                if any(EEAptGet.installed_map(self, [
+                       'mysql-server', 'percona-server-server-5.6',
+                       'mariadb-server']).values()):
                     services = services + ['mysql']
                 else:
                     Log.info(self, "MySQL is not installed")
@@ -180,9 +180,9 @@ class EEStackStatusController(CementBaseController):
         if self.app.pargs.mysql:
             if ((EEVariables.ee_mysql_host is "localhost") or
                (EEVariables.ee_mysql_host is "127.0.0.1")):
-                if (EEAptGet.is_installed(self, 'mysql-server') or
-                   EEAptGet.is_installed(self, 'percona-server-server-5.6') or
-                   EEAptGet.is_installed(self, 'mariadb-server')):
+                if any(EEAptGet.installed_map(self, [
+                       'mysql-server', 'percona-server-server-5.6',
+                       'mariadb-server']).values()):
                     services = services + ['mysql']
                 else:
                     Log.info(self, "MySQL is not installed")
@@ -246,9 +246,9 @@ class EEStackStatusController(CementBaseController):
         if self.app.pargs.mysql:
             if ((EEVariables.ee_mysql_host is "localhost") or
                (EEVariables.ee_mysql_host is "127.0.0.1")):
-                if (EEAptGet.is_installed(self, 'mysql-server') or
-                   EEAptGet.is_installed(self, 'percona-server-server-5.6') or
-                   EEAptGet.is_installed(self, 'mariadb-server')):
+                if any(EEAptGet.installed_map(self, [
+                       'mysql-server', 'percona-server-server-5.6',
+                       'mariadb-server']).values()):
                     services = services + ['mysql']
                 else:
                     Log.info(self, "MySQL is not installed")
@@ -311,9 +311,9 @@ class EEStackStatusController(CementBaseController):
         if self.app.pargs.mysql:
             if ((EEVariables.ee_mysql_host is "localhost") or
                (EEVariables.ee_mysql_host is "127.0.0.1")):
-                if (EEAptGet.is_installed(self, 'mysql-server') or
-                   EEAptGet.is_installed(self, 'percona-server-server-5.6') or
-                   EEAptGet.is_installed(self, 'mariadb-server')):
+                if any(EEAptGet.installed_map(self, [
+                       'mysql-server', 'percona-server-server-5.6',
+                       'mariadb-server']).values()):
                     services = services + ['mysql']
                 else:
                     Log.info(self, "MySQL is not installed")
@@ -0,0 +1,164 @@
+"""Stats Plugin for EasyEngine."""
+
+from cement.core.controller import CementBaseController, expose
+from cement.core import handler, hook
+from ee.core.accesslog import parse_since
+from ee.core.logging import Log
+from ee.core import history
+import collections
+import sqlite3
+import time
+
+
+def ee_stats_hook(app):
+    # do something with the ``app`` object here.
+    pass
+
+
+class EEStatsController(CementBaseController):
+    class Meta:
+        label = 'ee_stats'
+        stacked_on = 'base'
+        aliases = ['stats']
+        aliases_only = True
+        stacked_type = 'nested'
+        description = 'Show how long ee commands took over time'
+        usage = "ee stats (command) [options]"
+
+    @expose(hide=True)
+    def default(self):
+        self.app.args.print_help()
+
+
+class EEStatsHistoryController(CementBaseController):
+    class Meta:
+        label = 'history'
+        description = 'Show duration trends of ee commands'
+        stacked_on = 'ee_stats'
+        stacked_type = 'nested'
+        arguments = [
+            (['--since'],
+                dict(help='Only show commands newer than given time, '
+                     'e.g. 6h, 2d or "2015-08-01", default 90d',
+                     action='store', default='90d')),
+            (['--command'],
+                dict(help='Show single command by period, e.g. '
+                     '"site create"', action='store', default=None)),
+            (['--period'],
+                dict(help='Period of --command trend', action='store',
+                     choices=('day', 'week', 'month'), default='week')),
+            ]
+        usage = "ee stats history [options]"
+
+    @expose(hide=True)
+    def default(self):
+        """Default function of stats history"""
+        try:
+            since = parse_since(self.app.pargs.since)
+        except ValueError as e:
+            Log.error(self, "{0}".format(e))
+        try:
+            runs = history.load(since)
+        except sqlite3.Error as e:
+            Log.debug(self, "{0}".format(e))
+            Log.error(self, "Unable to read command history")
+        if not runs:
+            Log.info(self, "No commands recorded since {0}"
+                     .format(self.format_time(since)))
+            return
+
+        command = self.app.pargs.command
+        if command:
+            selected = [run for run in runs if run.command == command]
+            if not selected:
+                Log.error(self, "No {0} recorded since {1}"
+                          .format(command, self.format_time(since)))
+            self.trend(selected)
+        else:
+            self.summary(runs)
+        self.compare(runs, command)
+
+    @staticmethod
+    def format_time(stamp):
+        return time.strftime('%Y-%m-%d %H:%M', time.localtime(stamp))
+
+    @staticmethod
+    def seconds(value):
+        return "-" if value is None else "{0:.1f}s".format(value)
+
+    def table(self, title, groups):
+        """Prints runs, p50, p95 and max duration of every group"""
+        Log.info(self, "{0:24}{1:>7}{2:>8}{3:>9}{4:>9}{5:>9}"
+                 .format(title, "runs", "failed", "p50", "p95", "max"),
+                 log=False)
+        for name, runs in groups.items():
+            durations = [run.duration for run in runs]
+            Log.info(self, "{0:24}{1:>7}{2:>8}{3:>9}{4:>9}{5:>9}"
+                     .format(name, len(runs),
+                             sum(1 for run in runs if run.exit_code),
+                             self.seconds(history.percentile(durations, 50)),
+                             self.seconds(history.percentile(durations, 95)),
+                             self.seconds(max(durations))), log=False)
+
+    def summary(self, runs):
+        commands = collections.defaultdict(list)
+        for run in runs:
+            commands[run.command].append(run)
+        self.table("Command", collections.OrderedDict(
+            sorted(commands.items(), key=lambda item: -len(item[1]))))
+
+    def trend(self, runs):
+        """Durations of a command by period and where its time went"""
+        periods = collections.OrderedDict()
+        for run in runs:
+            periods.setdefault(history.period_of(run.started,
+                                                 self.app.pargs.period),
+                               []).append(run)
+        self.table(self.app.pargs.period.capitalize(), periods)
+
+        phases = collections.defaultdict(float)
+        for run in runs:
+            for kind, (count, total) in run.phases.items():
+                phases[kind] += total
+        if phases:
+            Log.info(self, "\nMean time per run", log=False)
+            for kind, total in sorted(phases.items(),
+                                      key=lambda item: -item[1]):
+                Log.info(self, "{0:24}{1:>9}".format(
+                         kind, self.seconds(total / len(runs))), log=False)
+
+    def compare(self, runs, command=None):
+        """p95 of every command before and after the last stack change"""
+        change = history.last_stack_change(runs)
+        if change is None:
+            return
+        before = collections.defaultdict(list)
+        after = collections.defaultdict(list)
+        for run in runs:
+            if run.command in history.STACK_CHANGES or \
+               (command and run.command != command):
+                continue
+            (before if run.started < change.started
+             else after)[run.command].append(run.duration)
+        commands = [name for name in sorted(after) if name in before]
+        if not commands:
+            return
+        Log.info(self, "\np95 before and after ee {0} on {1}"
+                 .format(change.command, self.format_time(change.started)),
+                 log=False)
+        for name in commands:
+            old = history.percentile(before[name], 95)
+            new = history.percentile(after[name], 95)
+            Log.info(self, "{0:24}{1:>9} -> {2:>9}{3:>+8.0f}%"
+                     .format(name, self.seconds(old), self.seconds(new),
+                             100.0 * (new - old) / old if old else 0),
+                     log=False)
+
+
+def load(app):
+    # register the plugin class.. this only happens if the plugin is enabled
+    handler.register(EEStatsController)
+    handler.register(EEStatsHistoryController)
+
+    # register a hook (function) to run after arguments are parsed.
+    hook.register('post_argument_parsing', ee_stats_hook)
@@ -8,7 +8,9 @@ from ee.core.logging import Log
 
 def ee_sync_hook(app):
     # do something with the ``app`` object here.
-    pass
+    from ee.core.database import init_db
+    import ee.cli.plugins.models
+    init_db(app)
 
 
 class EESyncController(CementBaseController):
@@ -32,6 +34,14 @@ class EESyncController(CementBaseController):
         sites = getAllsites(self)
         if not sites:
             pass
+        # one query for all sites instead of connecting to every database
+        try:
+            databases = EEMysql.databases(self)
+        except (MySQLConnectionError, StatementExcecutionError) as e:
+            Log.debug(self, str(e))
+            Log.warn(self, "Unable to list MySQL databases, database "
+                     "records are not checked")
+            databases = None
         for site in sites:
             if site.site_type in ['mysql', 'wp', 'wpsubdir', 'wpsubdomain']:
                 ee_site_webroot = site.site_path
@@ -53,16 +63,12 @@ class EESyncController(CementBaseController):
                                       .split(')')[0].strip().replace('\'', ''))
 
                         # Check if database really exist
-                        try:
-                            if not EEMysql.check_db_exists(self, ee_db_name):
-                                # Mark it as deleted if not exist
-                                ee_db_name = 'deleted'
-                                ee_db_user = 'deleted'
-                                ee_db_pass = 'deleted'
-                        except StatementExcecutionError as e:
-                            Log.debug(self, str(e))
-                        except Exception as e:
-                            Log.debug(self, str(e))
+                        if databases is not None and \
+                           ee_db_name not in databases:
+                            # Mark it as deleted if not exist
+                            ee_db_name = 'deleted'
+                            ee_db_user = 'deleted'
+                            ee_db_pass = 'deleted'
 
                         if site.db_name != ee_db_name:
                             # update records if any mismatch found
@@ -26,7 +26,8 @@ class EEUpdateController(CementBaseController):
         filename = "eeupdate" + time.strftime("%Y%m%d-%H%M%S")
         EEDownload.download(self, [["http://rt.cx/eeup",
                                     "/tmp/{0}".format(filename),
-                                    "update script"]])
+                                    "update script"]],
+                            current=["/tmp/{0}".format(filename)])
         try:
             Log.info(self, "updating EasyEngine, please wait...")
             os.system("bash /tmp/{0}".format(filename))
@@ -0,0 +1,240 @@
+"""EasyEngine Nginx access log parsing and statistics."""
+import array
+import collections
+import math
+import multiprocessing
+import os
+import re
+import time
+from ee.core.blockgzip import TimeLocal, read_range
+
+# log_format rt_cache (see nginx-core.mustache):
+# '$remote_addr $upstream_response_time $upstream_cache_status [$time_local] '
+# '$http_host "$request" $status $body_bytes_sent '
+# '"$http_referer" "$http_user_agent"'
+# $upstream_response_time lists one value per upstream tried, e.g.
+# "0.012, 0.340" or "- : 0.020" after an internal redirect.
+RT_CACHE = re.compile(
+    rb'^(\S+) ([\d.-]+(?:(?:, | : )[\d.-]+)*) (\S+) \[([^\]]+)\] (\S+) '
+    rb'"([^"\n]*)" (\d{3}) (\d+|-)(?: "[^"\n]*" "([^"\n]*)")?[^\n]*$',
+    re.M)
+
+
+def upstream_time(value):
+    """Sums $upstream_response_time of all upstreams tried, None if none"""
+    if value == b'-':
+        return None
+    total = 0.0
+    for part in re.split(rb', | : ', value):
+        if part != b'-':
+            total += float(part)
+    return total
+
+
+def request_url(request):
+    """Returns path of "$request" without query string"""
+    parts = request.split(b' ')
+    if len(parts) < 2:
+        return request.decode('utf-8', 'replace')
+    return parts[1].split(b'?', 1)[0].decode('utf-8', 'replace')
+
+
+def parse_block(data, since=None, to_epoch=None, until=None, agents=False):
+    """
+        Parses block of complete rt_cache lines logged between since and
+        until into columns:
+        ts, status, bytes, upstream (-1 when no upstream was used)
+        are arrays, cache, url and ip are lists, so is ua with agents
+    """
+    to_epoch = to_epoch or TimeLocal()
+    cols = dict(ts=array.array('d'), status=array.array('H'),
+                bytes=array.array('d'), upstream=array.array('d'),
+                cache=[], url=[], ip=[])
+    ts, status, size = cols['ts'], cols['status'], cols['bytes']
+    upstream, cache, url, ip = (cols['upstream'], cols['cache'],
+                                cols['url'], cols['ip'])
+    if agents:
+        ua = cols['ua'] = []
+    for m in RT_CACHE.finditer(data):
+        stamp = to_epoch(m.group(4))
+        if (since and stamp < since) or (until and stamp > until):
+            continue
+        ts.append(stamp)
+        status.append(int(m.group(7)))
+        size.append(0 if m.group(8) == b'-' else int(m.group(8)))
+        up = upstream_time(m.group(2))
+        upstream.append(-1.0 if up is None else up)
+        cache.append(m.group(3).decode('ascii', 'replace'))
+        url.append(request_url(m.group(6)))
+        ip.append(m.group(1).decode('ascii', 'replace'))
+        if agents:
+            ua.append((m.group(9) or b'-').decode('utf-8', 'replace'))
+    return cols
+
+
+class LatencyHistogram():
+    """
+        Log scaled histogram of durations, about 2% resolution, so
+        percentiles of millions of requests take a few KB and can be
+        merged across workers
+    """
+    scale = 50
+    size = 800
+
+    def __init__(self):
+        self.buckets = array.array('L', [0]) * self.size
+        self.count = 0
+
+    def add(self, seconds):
+        bucket = int(math.log1p(seconds * 1000) * self.scale)
+        self.buckets[min(bucket, self.size - 1)] += 1
+        self.count += 1
+
+    def merge(self, other):
+        for i, value in enumerate(other.buckets):
+            if value:
+                self.buckets[i] += value
+        self.count += other.count
+
+    def percentile(self, pct):
+        """Returns duration in seconds below which pct % of values fall"""
+        if not self.count:
+            return None
+        rank = math.ceil(self.count * pct / 100.0)
+        seen = 0
+        for i, value in enumerate(self.buckets):
+            seen += value
+            if seen >= rank:
+                return math.expm1((i + 0.5) / self.scale) / 1000
+        return None
+
+
+class AccessStats():
+    """Aggregated statistics of access log requests"""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.first = None
+        self.last = None
+        self.status = collections.Counter()
+        self.cache = collections.Counter()
+        self.urls = collections.Counter()
+        self.clients = collections.Counter()
+        self.upstream = LatencyHistogram()
+
+    def add(self, cols):
+        """Adds columns returned by parse_block"""
+        if not cols['ts']:
+            return
+        self.requests += len(cols['ts'])
+        self.bytes += int(sum(cols['bytes']))
+        first, last = min(cols['ts']), max(cols['ts'])
+        self.first = first if self.first is None else min(self.first, first)
+        self.last = last if self.last is None else max(self.last, last)
+        self.status.update(cols['status'])
+        self.cache.update(cols['cache'])
+        self.urls.update(cols['url'])
+        self.clients.update(cols['ip'])
+        for value in cols['upstream']:
+            if value >= 0:
+                self.upstream.add(value)
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.bytes += other.bytes
+        for attr, pick in (('first', min), ('last', max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            if mine is None or theirs is None:
+                setattr(self, attr, theirs if mine is None else mine)
+            else:
+                setattr(self, attr, pick(mine, theirs))
+        self.status.update(other.status)
+        self.cache.update(other.cache)
+        self.urls.update(other.urls)
+        self.clients.update(other.clients)
+        self.upstream.merge(other.upstream)
+
+    def rate(self):
+        """Requests per second over the logged period"""
+        if not self.requests:
+            return 0.0
+        return self.requests / max(self.last - self.first, 1.0)
+
+    def status_mix(self):
+        """Returns list of (class, share %) e.g. ('2xx', 97.5)"""
+        classes = collections.Counter()
+        for code, count in self.status.items():
+            classes['{0}xx'.format(code // 100)] += count
+        return [(name, 100.0 * count / self.requests)
+                for name, count in sorted(classes.items())]
+
+    def cache_mix(self):
+        """Returns list of ($upstream_cache_status, share %)"""
+        return [(name, 100.0 * count / self.requests)
+                for name, count in self.cache.most_common()]
+
+
+def site_of(path):
+    """Site name of /var/log/nginx/<site>.access.log[.N[.gz]]"""
+    return os.path.basename(path).split('.access.log')[0]
+
+
+def analyze_file(args):
+    """Worker: parse one log file, returns (site, AccessStats)"""
+    path, since, until = args
+    stats = AccessStats()
+    to_epoch = TimeLocal()
+    # indexed archives only decompress the blocks of the time range
+    for block in read_range(path, since, until):
+        stats.add(parse_block(block, since, to_epoch, until))
+    return (site_of(path), stats)
+
+
+def analyze(paths, since=None, workers=None, until=None):
+    """
+        Parses access logs, one worker process per file,
+        returns dict of site: AccessStats
+    """
+    if since:
+        # rotated files last written before since hold nothing of interest
+        paths = [path for path in paths if os.path.getmtime(path) >= since]
+    jobs = [(path, since, until) for path in paths]
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs))
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.map(analyze_file, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [analyze_file(job) for job in jobs]
+
+    sites = {}
+    for site, stats in results:
+        if site in sites:
+            sites[site].merge(stats)
+        else:
+            sites[site] = stats
+    return sites
+
+
+def parse_since(value, now=None):
+    """
+        Converts --since value to epoch, accepts durations like
+        90s, 30m, 6h, 2d, 1w or a date 'YYYY-MM-DD[ HH:MM[:SS]]'
+    """
+    now = time.time() if now is None else now
+    units = dict(s=1, m=60, h=3600, d=86400, w=604800)
+    value = value.strip()
+    if value[:-1].isdigit() and value[-1:] in units:
+        return now - int(value[:-1]) * units[value[-1]]
+    if value.isdigit():
+        return now - int(value)
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return time.mktime(time.strptime(value, fmt))
+        except ValueError:
+            continue
+    raise ValueError("invalid time {0}".format(value))
@@ -1,17 +1,70 @@
 """EasyEngine package installation using apt-get module."""
-import apt
-import apt_pkg
+import os
 import sys
 import subprocess
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
 from ee.core.apt_repo import EERepo
 from sh import apt_get
 from sh import ErrorReturnCode
 
 
+class EEPackageIndex():
+    """
+        Process wide index of installed packages, read straight from the
+        dpkg status database instead of opening a full apt cache.
+        Rebuilt only when /var/lib/dpkg/status changes, dpkg replaces
+        the file on every install/remove.
+    """
+    status_file = '/var/lib/dpkg/status'
+
+    # Package states for which apt reports a current version
+    installed_states = ('installed', 'half-configured', 'unpacked',
+                        'half-installed', 'triggers-awaited',
+                        'triggers-pending')
+
+    _stamp = None
+    _installed = frozenset()
+
+    @classmethod
+    def installed(cls):
+        """Returns set of installed package names"""
+        try:
+            st = os.stat(cls.status_file)
+        except OSError:
+            return None
+        stamp = (st.st_ino, st.st_size, st.st_mtime)
+        if stamp != cls._stamp:
+            cls._installed = cls.parse(cls.status_file)
+            cls._stamp = stamp
+        return cls._installed
+
+    @classmethod
+    def parse(cls, path):
+        """Parses dpkg status file, keeps only Package and Status fields"""
+        installed = set()
+        package = None
+        with open(path, encoding='utf-8', errors='replace', mode='r') as f:
+            for line in f:
+                if line.startswith('Package:'):
+                    package = line[8:].strip()
+                elif line.startswith('Status:') and package:
+                    status = line[7:].split()
+                    if status and status[-1] in cls.installed_states:
+                        installed.add(package)
+                elif line == '\n':
+                    package = None
+        return frozenset(installed)
+
+    @classmethod
+    def invalidate(cls):
+        cls._stamp = None
+
+
 class EEAptGet():
     """Generic apt-get intialisation"""
 
+    @EEProfile.timed('apt-get', lambda self: 'update')
     def update(self):
         """
         Similar to `apt-get update`
@@ -54,6 +107,7 @@ class EEAptGet():
         except Exception as e:
             Log.error(self, "apt-get update exited with error")
 
+    @EEProfile.timed('apt-get', lambda self: 'check upgrade')
     def check_upgrade(self):
         """
         Similar to `apt-get upgrade`
@@ -73,6 +127,7 @@ class EEAptGet():
         except Exception as e:
             Log.error(self, "Unable to check for packages upgrades")
 
+    @EEProfile.timed('apt-get', lambda self: 'dist-upgrade')
     def dist_upgrade(self):
         """
         Similar to `apt-get upgrade`
@@ -101,6 +156,8 @@ class EEAptGet():
             Log.error(self, "Error while installing packages, "
                       "apt-get exited with error")
 
+    @EEProfile.timed('apt-get', lambda self, packages:
+                     'install ' + ' '.join(packages))
     def install(self, packages):
         all_packages = ' '.join(packages)
         try:
@@ -130,6 +187,8 @@ class EEAptGet():
             Log.error(self, "Check logs for reason "
                       "`tail /var/log/ee/ee.log` & Try Again!!!")
 
+    @EEProfile.timed('apt-get', lambda self, packages, *args, **kw:
+                     'remove ' + ' '.join(packages))
     def remove(self, packages, auto=False, purge=False):
         all_packages = ' '.join(packages)
         try:
@@ -157,6 +216,7 @@ class EEAptGet():
             Log.error(self, "Error while installing packages, "
                       "apt-get exited with error")
 
+    @EEProfile.timed('apt-get', lambda self: 'autoclean')
     def auto_clean(self):
         """
         Similar to `apt-get autoclean`
@@ -171,6 +231,7 @@ class EEAptGet():
             Log.debug(self, "{0}".format(e))
             Log.error(self, "Unable to apt-get autoclean")
 
+    @EEProfile.timed('apt-get', lambda self: 'autoremove')
     def auto_remove(self):
         """
         Similar to `apt-get autoremove`
@@ -187,11 +248,21 @@ class EEAptGet():
         Checks if package is available in cache and is installed or not
         returns True if installed otherwise returns False
         """
-        apt_cache = apt.cache.Cache()
-        apt_cache.open()
-        if (package_name.strip() in apt_cache and
-           apt_cache[package_name.strip()].is_installed):
-            # apt_cache.close()
-            return True
-        # apt_cache.close()
-        return False
+        return EEAptGet.installed_map(self, [package_name])[package_name]
+
+    def installed_map(self, package_names):
+        """
+        Checks installation state of several packages at once
+        returns dict of package name: True if installed otherwise False
+        """
+        installed = EEPackageIndex.installed()
+        if installed is None:
+            # No dpkg status database, fall back to full apt resolution
+            import apt
+            apt_cache = apt.cache.Cache()
+            apt_cache.open()
+            return dict((name, name.strip() in apt_cache and
+                         apt_cache[name.strip()].is_installed)
+                        for name in package_names)
+        return dict((name, name.strip() in installed)
+                    for name in package_names)
@@ -0,0 +1,273 @@
+"""EasyEngine local cache of downloaded artifacts."""
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import urllib.error
+import urllib.request
+
+EE_ARTIFACT_CACHE = '/var/lib/ee/cache'
+# Seconds a download is used without asking the server whether it changed
+TTL = 86400
+# Seconds to wait for the server to answer or send more data
+TIMEOUT = 30
+CHUNK = 256 * 1024
+
+WP_CORE_URL = 'https://wordpress.org/latest.tar.gz'
+WP_PLUGIN_URL = 'https://downloads.wordpress.org/plugin/{0}.zip'
+
+
+class DownloadError(Exception):
+    """Raised when an artifact can not be fetched or fails verification"""
+    pass
+
+
+def url_key(url):
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()
+
+
+class ArtifactCache():
+    """
+        Downloads kept by SHA-256 of their content in objects/ab/abcd...,
+        the same file fetched from several URLs is stored once. What every
+        URL gave last is kept in urls/<sha1 of URL>.json along with the
+        ETag and Last-Modified it was sent with.
+
+        Within ttl seconds of being checked a download is used as it is,
+        once older it is still used while a conditional request checks
+        for a newer one in the background. In offline mode nothing is
+        fetched, whatever is cached is used however old it is.
+
+        Interrupted downloads are kept in partial/ and resumed with a
+        Range request if the server still has the same file.
+    """
+
+    def __init__(self, root=EE_ARTIFACT_CACHE, ttl=TTL, offline=False,
+                 timeout=TIMEOUT):
+        self.root = root
+        self.ttl = ttl
+        self.offline = offline
+        self.timeout = timeout
+
+    def object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest[:2], digest)
+
+    def entry_path(self, url):
+        return os.path.join(self.root, 'urls', url_key(url) + '.json')
+
+    def entry(self, url):
+        """What was fetched from url, None if its object is missing"""
+        try:
+            with open(self.entry_path(url), encoding='utf-8', mode='r') as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if not os.path.isfile(self.object_path(entry['sha256'])):
+            return None
+        return entry
+
+    def save_entry(self, url, entry):
+        path = self.entry_path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '{0}.{1}.{2}'.format(path, os.getpid(),
+                                   threading.get_ident())
+        with open(tmp, encoding='utf-8', mode='w') as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def fresh(self, entry):
+        return time.time() - entry.get('checked', 0) < self.ttl
+
+    def get(self, url, sha256=None, background=True, current=False):
+        """
+            Returns (path of cached file, bytes transferred). A stale file
+            is returned right away and revalidated by a background thread
+            unless background is False. With current the cached file is
+            revalidated before use whatever its age, for URLs like
+            installer scripts which are not versioned.
+        """
+        entry = self.entry(url)
+        if entry is not None and sha256 and \
+           entry['sha256'] != sha256.lower():
+            entry = None
+        if entry is not None and (self.offline or
+                                  (not current and self.fresh(entry))):
+            return (self.object_path(entry['sha256']), 0)
+        if self.offline:
+            raise DownloadError("{0} is not cached and ee is offline"
+                                .format(url))
+        if entry is not None and background and not sha256 and \
+           not current:
+            thread = threading.Thread(target=self.revalidate_quietly,
+                                      args=(url,))
+            thread.start()
+            return (self.object_path(entry['sha256']), 0)
+        return self.fetch(url, sha256, current)
+
+    def revalidate_quietly(self, url):
+        try:
+            self.fetch(url)
+        except (DownloadError, OSError):
+            # the cached file is used until the server is reachable again
+            pass
+
+    def copy(self, url, path, sha256=None, current=False):
+        """
+            Copies artifact of url to path, returns (size, bytes
+            transferred)
+        """
+        cached, transferred = self.get(url, sha256, current=current)
+        tmp = '{0}.{1}.tmp'.format(path, threading.get_ident())
+        shutil.copyfile(cached, tmp)
+        os.replace(tmp, path)
+        return (os.path.getsize(path), transferred)
+
+    def fetch(self, url, sha256=None, current=False):
+        """
+            Downloads url unless the cached copy is still current, returns
+            (path of cached file, bytes transferred). With current the
+            cached copy is always revalidated.
+        """
+        partial = os.path.join(self.root, 'partial', url_key(url))
+        os.makedirs(os.path.dirname(partial), exist_ok=True)
+        # one process or thread fetches a URL at a time, the others wait
+        # and find it cached
+        with open(partial + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            entry = self.entry(url)
+            if entry is not None and sha256 and \
+               entry['sha256'] != sha256.lower():
+                # not what is expected, fetch it again unconditionally
+                entry = None
+            if entry is not None and not current and self.fresh(entry):
+                return (self.object_path(entry['sha256']), 0)
+            return self.request(url, entry, partial, sha256)
+
+    def request(self, url, entry, partial, sha256):
+        headers = {'User-Agent': 'EasyEngine'}
+        validators = self.partial_validators(partial)
+        offset = os.path.getsize(partial) if validators else 0
+        if offset and (validators.get('etag') or
+                       validators.get('last_modified')):
+            headers['Range'] = 'bytes={0}-'.format(offset)
+            headers['If-Range'] = (validators.get('etag') or
+                                   validators['last_modified'])
+        elif entry is not None:
+            offset = 0
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        try:
+            response = urllib.request.urlopen(
+                urllib.request.Request(url, headers=headers),
+                timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry is not None:
+                entry['checked'] = time.time()
+                self.save_entry(url, entry)
+                return (self.object_path(entry['sha256']), 0)
+            if e.code == 416 and offset:
+                # partial file no longer matches, start over
+                self.remove_partial(partial)
+                return self.request(url, entry, partial, sha256)
+            raise DownloadError("{0}: HTTP {1} {2}"
+                                .format(url, e.code, e.reason))
+        except (urllib.error.URLError, OSError) as e:
+            raise DownloadError("{0}: {1}".format(url, getattr(e, 'reason',
+                                                               e)))
+
+        with response:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            digest = hashlib.sha256()
+            if response.status == 206 and offset:
+                mode = 'ab'
+                with open(partial, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK), b''):
+                        digest.update(chunk)
+            else:
+                mode = 'wb'
+                offset = 0
+            self.save_partial_validators(partial, etag, last_modified)
+            transferred = 0
+            try:
+                with open(partial, mode) as f:
+                    for chunk in iter(lambda: response.read(CHUNK), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        transferred += len(chunk)
+            except OSError as e:
+                # kept in partial/, resumed by the next attempt
+                raise DownloadError("{0}: {1}".format(url, e))
+            length = response.headers.get('Content-Length')
+            if length is not None and transferred < int(length):
+                raise DownloadError("{0}: connection closed after {1} of "
+                                    "{2} bytes".format(url, transferred,
+                                                       length))
+
+        digest = digest.hexdigest()
+        if sha256 and digest != sha256.lower():
+            self.remove_partial(partial)
+            raise DownloadError("{0}: SHA-256 {1} does not match {2}"
+                                .format(url, digest, sha256))
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(partial, path)
+        self.remove_partial(partial)
+        now = time.time()
+        self.save_entry(url, dict(url=url, sha256=digest,
+                                  size=os.path.getsize(path), etag=etag,
+                                  last_modified=last_modified, checked=now,
+                                  fetched=now))
+        if entry is not None and entry['sha256'] != digest:
+            self.release(entry['sha256'])
+        return (path, transferred)
+
+    def partial_validators(self, partial):
+        """ETag and Last-Modified of an interrupted download, None if none"""
+        if not os.path.isfile(partial) or not os.path.getsize(partial):
+            return None
+        try:
+            with open(partial + '.json', encoding='utf-8', mode='r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def save_partial_validators(self, partial, etag, last_modified):
+        with open(partial + '.json', encoding='utf-8', mode='w') as f:
+            json.dump(dict(etag=etag, last_modified=last_modified), f)
+
+    def remove_partial(self, partial):
+        for path in (partial, partial + '.json'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def release(self, digest):
+        """Removes object no URL refers to any more"""
+        directory = os.path.join(self.root, 'urls')
+        for name in os.listdir(directory):
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8',
+                          mode='r') as f:
+                    if json.load(f).get('sha256') == digest:
+                        return
+            except (IOError, OSError, ValueError):
+                continue
+        if os.path.exists(self.object_path(digest)):
+            os.remove(self.object_path(digest))
+
+
+def artifact_cache(self):
+    """ArtifactCache set up by the [cache] section of ee.conf"""
+    config = self.app.config
+    if not config.has_section('cache'):
+        return ArtifactCache()
+    return ArtifactCache(root=config.get('cache', 'dir'),
+                         ttl=int(config.get('cache', 'ttl')),
+                         offline=str(config.get('cache', 'offline'))
+                         .lower() in ('true', 'yes', '1', 'on'))
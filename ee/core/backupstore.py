@@ -0,0 +1,234 @@
+"""EasyEngine deduplicated backup store."""
+import hashlib
+import json
+import os
+import stat
+import threading
+import time
+import zlib
+
+# Pieces chunks are cut from, a chunk may end after any of them; lines
+# of SQL dumps and text files are pieces of their own
+PIECE = 64 * 1024
+MIN_CHUNK = 512 * 1024
+MAX_CHUNK = 4 * 1024 * 1024
+# One in CUT pieces ends a chunk once it is MIN_CHUNK long
+CUT = 8
+
+
+class BackupStoreError(Exception):
+    """Raised when a backup can not be read or is incomplete"""
+    pass
+
+
+def chunks(stream):
+    """
+        Yields chunks of stream with boundaries that depend on content,
+        not offset, so inserting bytes only changes chunks around them
+    """
+    chunk = []
+    size = 0
+    for piece in iter(lambda: stream.readline(PIECE), b''):
+        chunk.append(piece)
+        size += len(piece)
+        if size >= MAX_CHUNK or \
+           (size >= MIN_CHUNK and zlib.crc32(piece) % CUT == 0):
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+class BackupStore():
+    """
+        Backups of a site kept in root, file contents and database dumps
+        are split in chunks stored once under their SHA-256 compressed by
+        zlib in chunks/ab/abcd..., each backup is a manifest <name>.json
+        listing files, their metadata and chunks.
+
+        Files with the size, mtime and mode they had in the last backup
+        are not read again, their chunks are taken from its manifest, so
+        a backup costs about what changed since the previous one.
+        Owners are kept and given back on restore, FIFOs, sockets and
+        devices are left out.
+    """
+
+    def __init__(self, root, level=6):
+        self.root = root
+        self.level = level
+
+    def chunk_path(self, digest):
+        return os.path.join(self.root, 'chunks', digest[:2], digest)
+
+    def manifest_path(self, name):
+        return os.path.join(self.root, name + '.json')
+
+    def put_chunk(self, data):
+        """Stores data unless stored already, returns its SHA-256"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = '{0}.{1}.{2}'.format(path, os.getpid(),
+                                       threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(zlib.compress(data, self.level))
+            os.replace(tmp, path)
+        return digest
+
+    def put_stream(self, stream):
+        """Stores stream, returns (list of chunk digests, size)"""
+        digests = []
+        size = 0
+        for chunk in chunks(stream):
+            digests.append(self.put_chunk(chunk))
+            size += len(chunk)
+        return (digests, size)
+
+    def get_chunk(self, digest):
+        try:
+            with open(self.chunk_path(digest), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (IOError, OSError, zlib.error) as e:
+            raise BackupStoreError("chunk {0}: {1}".format(digest, e))
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupStoreError("chunk {0} is corrupt".format(digest))
+        return data
+
+    def names(self):
+        """Names of backups, oldest first"""
+        if not os.path.isdir(self.root):
+            return []
+        manifests = [name[:-5] for name in os.listdir(self.root)
+                     if name.endswith('.json')]
+        return sorted(manifests, key=lambda name: os.path.getmtime(
+            self.manifest_path(name)))
+
+    def load(self, name):
+        try:
+            with open(self.manifest_path(name), encoding='utf-8',
+                      mode='r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            raise BackupStoreError("backup {0}: {1}".format(name, e))
+
+    def backup(self, name, sources, streams=()):
+        """
+            Stores a backup called name of sources, list of (name in
+            backup, path of file or directory), and streams, list of
+            (name in backup, file object). Returns its manifest.
+        """
+        names = self.names()
+        previous = {}
+        if names:
+            previous = dict((entry['path'], entry)
+                            for entry in self.load(names[-1])['entries']
+                            if entry['type'] == 'file')
+        entries = []
+        for target, path in sources:
+            if os.path.isdir(path):
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    relative = os.path.relpath(root, path)
+                    base = target if relative == '.' else \
+                        os.path.join(target, relative)
+                    entries.append(self.entry(base, root, previous))
+                    for filename in sorted(files):
+                        entries.append(self.entry(
+                            os.path.join(base, filename),
+                            os.path.join(root, filename), previous))
+                    for dirname in dirs:
+                        if os.path.islink(os.path.join(root, dirname)):
+                            entries.append(self.entry(
+                                os.path.join(base, dirname),
+                                os.path.join(root, dirname), previous))
+            else:
+                entries.append(self.entry(target, path, previous))
+        entries = [entry for entry in entries if entry is not None]
+        for target, stream in streams:
+            digests, size = self.put_stream(stream)
+            entries.append(dict(path=target, type='file', mode=0o600,
+                                mtime=time.time(), size=size,
+                                chunks=digests))
+
+        manifest = dict(name=name, created=time.time(), entries=entries)
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.manifest_path(name) + '.tmp'
+        with open(tmp, encoding='utf-8', mode='w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path(name))
+        return manifest
+
+    def remove(self, name):
+        """Removes manifest of backup, its chunks are kept for others"""
+        if os.path.exists(self.manifest_path(name)):
+            os.remove(self.manifest_path(name))
+
+    def entry(self, target, path, previous):
+        """
+            Manifest entry of path, stored as target, None for anything
+            but a directory, regular file or symlink
+        """
+        info = os.lstat(path)
+        entry = dict(path=target, mode=stat.S_IMODE(info.st_mode),
+                     mtime=info.st_mtime, uid=info.st_uid, gid=info.st_gid)
+        if stat.S_ISLNK(info.st_mode):
+            entry.update(type='symlink', target=os.readlink(path))
+        elif stat.S_ISDIR(info.st_mode):
+            entry.update(type='dir')
+        elif not stat.S_ISREG(info.st_mode):
+            # reading a FIFO would block the backup
+            return None
+        else:
+            entry.update(type='file', size=info.st_size)
+            last = previous.get(target)
+            if last is not None and last['size'] == info.st_size and \
+               last['mtime'] == info.st_mtime and \
+               last['mode'] == entry['mode'] and \
+               all(os.path.exists(self.chunk_path(digest))
+                   for digest in last['chunks']):
+                entry['chunks'] = last['chunks']
+            else:
+                with open(path, 'rb') as f:
+                    entry['chunks'] = self.put_stream(f)[0]
+        return entry
+
+    def restore(self, name, path):
+        """Reassembles backup called name in directory path"""
+        entries = self.load(name)['entries']
+        os.makedirs(path, exist_ok=True)
+        for entry in entries:
+            target = os.path.normpath(os.path.join(path, entry['path']))
+            if not target.startswith(os.path.normpath(path) + os.sep):
+                raise BackupStoreError("{0} is outside of {1}"
+                                       .format(entry['path'], path))
+            if entry['type'] == 'dir':
+                os.makedirs(target, exist_ok=True)
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.lexists(target) and not os.path.isdir(target):
+                os.remove(target)
+            if entry['type'] == 'symlink':
+                os.symlink(entry['target'], target)
+                self.chown(target, entry)
+                continue
+            with open(target, 'wb') as f:
+                for digest in entry['chunks']:
+                    f.write(self.get_chunk(digest))
+            self.chown(target, entry)
+            os.chmod(target, entry['mode'])
+            os.utime(target, (entry['mtime'], entry['mtime']))
+        # directories last, writing files into them changed their mtime
+        for entry in entries:
+            if entry['type'] == 'dir':
+                target = os.path.join(path, entry['path'])
+                self.chown(target, entry)
+                os.chmod(target, entry['mode'])
+                os.utime(target, (entry['mtime'], entry['mtime']))
+
+    @staticmethod
+    def chown(path, entry):
+        """Gives path the owner of entry, backups without one keep ours"""
+        if 'uid' in entry and os.geteuid() == 0:
+            os.lchown(path, entry['uid'], entry['gid'])
@@ -0,0 +1,279 @@
+"""EasyEngine seekable log archives, gzip members indexed by time."""
+import calendar
+import gzip
+import json
+import os
+import re
+import time
+import zlib
+
+# Uncompressed bytes of complete lines per gzip member, the unit read
+# back when seeking to a time range
+BLOCK_SIZE = 256 * 1024
+
+# Sidecar of archive.gz, archive.gz.idx
+INDEX_SUFFIX = '.idx'
+INDEX_VERSION = 1
+
+MONTHS = dict((name.encode(), num) for num, name in
+              enumerate(['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul',
+                         'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], 1))
+
+
+class TimeLocal():
+    """
+        Converts $time_local (10/Oct/2015:13:55:36 +0530) to epoch,
+        caching the conversion of every minute seen
+    """
+    def __init__(self):
+        self.minutes = {}
+
+    def __call__(self, value):
+        minute = value[:17] + value[20:]
+        base = self.minutes.get(minute)
+        if base is None:
+            day, month, year = value[0:2], value[3:6], value[7:11]
+            tz = value[21:26]
+            offset = int(tz[1:3]) * 3600 + int(tz[3:5]) * 60
+            if tz[:1] == b'-':
+                offset = -offset
+            base = calendar.timegm((int(year), MONTHS[month], int(day),
+                                    int(value[12:14]), int(value[15:17]),
+                                    0)) - offset
+            if len(self.minutes) > 100000:
+                self.minutes.clear()
+            self.minutes[minute] = base
+        return base + int(value[18:20])
+
+
+class ClockTime():
+    """
+        Converts time stamps ending in :SS, written in format fmt up to
+        the minute, to epoch, caching the conversion of every minute seen
+    """
+    def __init__(self, fmt, utc=False):
+        self.fmt = fmt
+        self.utc = utc
+        self.minutes = {}
+
+    def __call__(self, value):
+        minute = value[:-3]
+        base = self.minutes.get(minute)
+        if base is None:
+            parsed = time.strptime(minute.decode('ascii'), self.fmt)
+            base = calendar.timegm(parsed) if self.utc else time.mktime(
+                parsed)
+            if len(self.minutes) > 100000:
+                self.minutes.clear()
+            self.minutes[minute] = base
+        return base + int(value[-2:])
+
+
+def epoch(value):
+    return int(value)
+
+
+# Time stamps of the logs EasyEngine looks after,
+# (pattern, converter, arguments to create it or None to use it as is)
+FORMATS = [
+    # nginx access log, [10/Oct/2015:13:55:36 +0530]
+    (rb'\[(\d\d/\w{3}/\d{4}:\d\d:\d\d:\d\d [+-]\d{4})\]', TimeLocal, ()),
+    # nginx error log, 2015/08/01 10:15:00 [error]
+    (rb'^(\d{4}/\d\d/\d\d \d\d:\d\d:\d\d) \[', ClockTime,
+     ('%Y/%m/%d %H:%M',)),
+    # WordPress debug.log, [01-Aug-2015 10:15:00 UTC]
+    (rb'^\[(\d\d-\w{3}-\d{4} \d\d:\d\d:\d\d) UTC\]', ClockTime,
+     ('%d-%b-%Y %H:%M', True)),
+    # php5-fpm log and slow log, [01-Aug-2015 10:15:00]
+    (rb'^\[(\d\d-\w{3}-\d{4} \d\d:\d\d:\d\d)\]', ClockTime,
+     ('%d-%b-%Y %H:%M',)),
+    # MySQL slow log
+    (rb'^SET timestamp=(\d+);', epoch, None),
+]
+
+
+class TimeStamps():
+    """
+        Finds time stamps in log data. The first format found is used for
+        the rest of the log, one log never mixes formats.
+    """
+
+    def __init__(self):
+        self.formats = []
+        for pattern, converter, args in FORMATS:
+            self.formats.append((re.compile(pattern, re.M),
+                                 converter(*args) if args is not None
+                                 else converter))
+        self.found = None
+
+    def span(self, data):
+        """Returns (oldest, newest) epoch in data, (None, None) if none"""
+        for pattern, converter in ([self.found] if self.found
+                                   else self.formats):
+            values = set(pattern.findall(data))
+            if values:
+                self.found = (pattern, converter)
+                stamps = [converter(value) for value in values]
+                return (min(stamps), max(stamps))
+        return (None, None)
+
+    def line(self, line):
+        """Returns epoch of line, None for lines without time stamp"""
+        for pattern, converter in ([self.found] if self.found
+                                   else self.formats):
+            match = pattern.search(line)
+            if match:
+                self.found = (pattern, converter)
+                return converter(match.group(1))
+        return None
+
+
+class BlockWriter():
+    """
+        Writes log data as a series of gzip members, each holding about
+        block_size bytes of complete lines. The result is an ordinary
+        multi-member gzip file zcat and gzip.open read as usual, but every
+        member can also be decompressed on its own.
+
+        index holds [offset, length, oldest, newest] of every member,
+        offsets into the compressed file and epochs of the lines in it.
+    """
+
+    def __init__(self, fileobj, level=6, block_size=BLOCK_SIZE):
+        self.fileobj = fileobj
+        self.level = level
+        self.block_size = block_size
+        self.offset = 0
+        self.buffer = []
+        self.buffered = 0
+        self.index = []
+        self.stamps = TimeStamps()
+
+    def write(self, data):
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.block_size:
+            data = b''.join(self.buffer)
+            end = data.rfind(b'\n') + 1
+            start = 0
+            while end - start >= self.block_size:
+                cut = data.find(b'\n', start + self.block_size - 1) + 1
+                self.write_block(data[start:cut])
+                start = cut
+            self.buffer = [data[start:]]
+            self.buffered = len(data) - start
+
+    def write_block(self, data):
+        member = gzip.compress(data, self.level)
+        self.fileobj.write(member)
+        oldest, newest = self.stamps.span(data)
+        self.index.append([self.offset, len(member), oldest, newest])
+        self.offset += len(member)
+
+    def close(self):
+        """Writes the remaining data, returns the index"""
+        if self.buffered:
+            self.write_block(b''.join(self.buffer))
+            self.buffer = []
+            self.buffered = 0
+        return self.index
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def write_index(path, index):
+    """Writes index of archive path next to it"""
+    tmp = "{0}.{1}.tmp".format(index_path(path), os.getpid())
+    with open(tmp, encoding='utf-8', mode='w') as f:
+        json.dump(dict(version=INDEX_VERSION, blocks=index), f,
+                  separators=(',', ':'))
+    os.replace(tmp, index_path(path))
+
+
+def read_index(path):
+    """Returns block index of archive path, None if it has none"""
+    try:
+        with open(index_path(path), encoding='utf-8', mode='r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if not isinstance(index, dict) or index.get('version') != INDEX_VERSION:
+        return None
+    # an index left behind by an archive replaced since is no use
+    blocks = index.get('blocks') or []
+    if blocks and sum(block[1] for block in blocks) != os.path.getsize(path):
+        return None
+    return blocks
+
+
+def overlaps(block, since, until):
+    oldest, newest = block[2], block[3]
+    if oldest is None:
+        return True
+    if since is not None and newest < since:
+        return False
+    if until is not None and oldest > until:
+        return False
+    return True
+
+
+def read_blocks(path, block_size=4 * 1024 * 1024):
+    """Yields blocks of complete lines of plain or gzipped log file"""
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        rest = b''
+        while 1:
+            data = f.read(block_size)
+            if not data:
+                break
+            data = rest + data
+            end = data.rfind(b'\n') + 1
+            rest = data[end:]
+            if end:
+                yield data[:end]
+        if rest:
+            yield rest
+
+
+def read_range(path, since=None, until=None):
+    """
+        Yields blocks of complete lines of log file. Of archives with an
+        index only the members holding lines between since and until are
+        read, anything else is read whole and left to the caller to filter.
+    """
+    blocks = read_index(path) if path.endswith('.gz') else None
+    if blocks is None:
+        for data in read_blocks(path):
+            yield data
+        return
+    with open(path, 'rb') as f:
+        for block in blocks:
+            if not overlaps(block, since, until):
+                continue
+            f.seek(block[0])
+            member = f.read(block[1])
+            yield zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(member)
+
+
+def search(path, since=None, until=None, pattern=None):
+    """
+        Yields lines of log file logged between since and until and
+        matching compiled bytes pattern. Lines without time stamp, like
+        stack traces, go with the line above them.
+    """
+    stamps = TimeStamps()
+    current = None
+    for data in read_range(path, since, until):
+        for line in data.splitlines():
+            stamp = stamps.line(line)
+            if stamp is not None:
+                current = stamp
+            if current is not None and (
+                    (since is not None and current < since) or
+                    (until is not None and current > until)):
+                continue
+            if pattern is not None and not pattern.search(line):
+                continue
+            yield line
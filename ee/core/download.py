@@ -1,8 +1,13 @@
 """EasyEngine download core classes."""
-import urllib.request
-import urllib.error
+import concurrent.futures
 import os
+import time
+from ee.core.artifacts import DownloadError, artifact_cache
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
+
+# Downloads run at once
+WORKERS = 4
 
 
 class EEDownload():
@@ -10,34 +15,67 @@ class EEDownload():
     def __init__():
         pass
 
-    def download(self, packages):
+    def download(self, packages, workers=WORKERS, current=(), cached=()):
         """Download packages, packges must be list in format of
-        [url, path, package name]"""
-        for package in packages:
-            url = package[0]
-            filename = package[1]
-            pkg_name = package[2]
+        [url, path, package name] or [url, path, package name, sha256].
+
+        Packages are fetched concurrently through the artifact cache,
+        which revalidates what it holds with ETag/If-Modified-Since,
+        resumes interrupted downloads and verifies sha256 when given.
+        Cached copies of packages whose path is in current are checked
+        with the server before use, as for scripts and tools which are
+        not versioned, the others may be used stale. Packages whose path
+        is in cached are only fetched into the artifact cache, for
+        tarballs extracted from there by EEExtract.stream."""
+        if not packages:
+            return True
+        cache = artifact_cache(self)
+        start = time.time()
+
+        def fetch(package):
+            url, filename, pkg_name = package[:3]
+            sha256 = package[3] if len(package) > 3 else None
+            with EEProfile.span('download', url):
+                if filename in cached:
+                    path, transferred = cache.get(
+                        url, sha256, current=filename in current)
+                    size = os.path.getsize(path)
+                else:
+                    directory = os.path.dirname(filename)
+                    if directory and not os.path.exists(directory):
+                        os.makedirs(directory, exist_ok=True)
+                    size, transferred = cache.copy(
+                        url, filename, sha256, current=filename in current)
+            Log.info(self, "Downloading {0:20} {1}"
+                     .format(pkg_name, "[" + Log.ENDC + "Done" +
+                             Log.OKBLUE + "]"))
+            return (size, transferred)
+
+        workers = max(min(workers, len(packages)), 1)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(fetch, package)
+                       for package in packages]
+        failed = []
+        size = transferred = 0
+        for package, future in zip(packages, futures):
             try:
-                directory = os.path.dirname(filename)
-                if not os.path.exists(directory):
-                    os.makedirs(directory)
-                Log.info(self, "Downloading {0:20}".format(pkg_name), end=' ')
-                urllib.request.urlretrieve(url, filename)
-                Log.info(self, "{0}".format("[" + Log.ENDC + "Done"
-                                            + Log.OKBLUE + "]"))
-            except urllib.error.URLError as e:
-                Log.debug(self, "[{err}]".format(err=str(e.reason)))
-                Log.error(self, "Unable to donwload file, {0}"
-                          .format(filename))
-                return False
-            except urllib.error.HTTPError as e:
-                Log.error(self, "Package download failed. {0}"
-                          .format(pkg_name))
-                Log.debug(self, "[{err}]".format(err=str(e.reason)))
-                return False
-            except urllib.error.ContentTooShortError as e:
-                Log.debug(self, "{0}{1}".format(e.errno, e.strerror))
-                Log.error(self, "Package download failed. The amount of the"
-                          " downloaded data is less than "
-                          "the expected amount \{0} ".format(pkg_name))
-                return False
+                done, fetched = future.result()
+                size += done
+                transferred += fetched
+            except (DownloadError, OSError) as e:
+                Log.debug(self, "[{err}]".format(err=str(e)))
+                Log.info(self, "Downloading {0:20} {1}"
+                         .format(package[2], "[" + Log.ENDC + Log.FAIL +
+                                 "Fail" + Log.OKBLUE + "]"))
+                failed.append(package[2])
+
+        elapsed = max(time.time() - start, 0.001)
+        Log.debug(self, "Downloaded {0:.1f} MB ({1:.1f} MB from the network)"
+                  " in {2:.1f}s, {3:.1f} MB/s"
+                  .format(size / 1048576, transferred / 1048576, elapsed,
+                          transferred / 1048576 / elapsed))
+        if failed:
+            Log.error(self, "Unable to download {0}"
+                      .format(", ".join(failed)))
+            return False
+        return True
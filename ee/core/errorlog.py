@@ -0,0 +1,273 @@
+"""EasyEngine Nginx error log fingerprinting and aggregation."""
+import collections
+import gzip
+import multiprocessing
+import os
+import re
+
+# 2015/08/01 10:15:00 [error] 1234#0: *5678 message, client: 1.2.3.4,
+# server: example.com, request: "GET / HTTP/1.1", upstream: "...", ...
+LINE = re.compile(r'^(\d{4}/\d\d/\d\d \d\d:\d\d):\d\d \[(\w+)\] \d+#\d+: '
+                  r'(?:\*\d+ )?(.*)$')
+CONTEXT = re.compile(r', (client|server|request|upstream|host|referrer): '
+                     r'("[^"]*"|[^,]*)')
+
+# Parts of a message which differ between occurrences of the same problem
+QUOTED = re.compile(r'"[^"]*"')
+PATH = re.compile(r'(?<![\w"])/[^\s,"]+')
+ADDRESS = re.compile(r'\b(?:\d{1,3}\.){3}\d{1,3}(?::\d+)?\b|'
+                     r'\[[0-9a-f:]+\](?::\d+)?', re.I)
+HEX = re.compile(r'\b(?:0x)?[0-9a-f]{8,}\b', re.I)
+# keep errno, as in "(111: Connection refused)"
+NUMBER = re.compile(r'(?<!\()\b\d+\b(?!:)')
+ERRNO = re.compile(r'\((\d+): ')
+
+# Upstreams of upstream.mustache, by port
+UPSTREAMS = {'9000': 'php', '9001': 'debug', '8000': 'hhvm'}
+
+# (message pattern, class, directive to look at)
+CLASSES = [
+    (re.compile(r'upstream timed out'), 'upstream timeout',
+     '{kind}_read_timeout / request_terminate_timeout'),
+    (re.compile(r'connect\(\) .*failed \(11: '), 'upstream backlog full',
+     'listen.backlog (php5-fpm)'),
+    (re.compile(r'connect\(\) .*failed \(111: '), 'upstream refused',
+     'pm.max_children (php5-fpm)'),
+    (re.compile(r'no live upstreams'), 'no live upstreams',
+     'upstream server max_fails'),
+    (re.compile(r'upstream sent too big header'), 'upstream header too big',
+     '{kind}_buffer_size'),
+    (re.compile(r'an upstream response is buffered to a temporary file'),
+     'upstream response buffered to disk', '{kind}_buffers'),
+    (re.compile(r'a client request body is buffered to a temporary file'),
+     'request body buffered to disk', 'client_body_buffer_size'),
+    (re.compile(r'client intended to send too large body'),
+     'request body too large', 'client_max_body_size'),
+    (re.compile(r'worker_connections are not enough'),
+     'worker connections exhausted', 'worker_connections'),
+    (re.compile(r'\(24: Too many open files\)'), 'open files exhausted',
+     'worker_rlimit_nofile'),
+    (re.compile(r'limiting (?:requests|connections)'), 'rate limited',
+     'limit_req / limit_conn'),
+]
+
+# Bytes of a plain log handed to one worker
+SPLIT_SIZE = 64 * 1024 * 1024
+BLOCK_SIZE = 4 * 1024 * 1024
+
+
+def fingerprint(message):
+    """Message without addresses, paths, ids and counters"""
+    message = QUOTED.sub('"?"', message)
+    message = PATH.sub('?', message)
+    message = ADDRESS.sub('?', message)
+    message = HEX.sub('?', message)
+    return NUMBER.sub('N', message)
+
+
+class Fingerprints(dict):
+    """
+        fingerprint() cached by message with quoted strings removed and
+        digits zeroed (but errno), most lines only differ in those
+    """
+    digits = str.maketrans('123456789', '000000000')
+
+    def __call__(self, message):
+        if '"' in message:
+            key = QUOTED.sub('', message).translate(self.digits)
+        else:
+            key = message.translate(self.digits)
+        if '(' in message:
+            key = (key, tuple(ERRNO.findall(message)))
+        fp = self.get(key)
+        if fp is None:
+            if len(self) > 100000:
+                self.clear()
+            fp = self[key] = fingerprint(message)
+        return fp
+
+
+def classify(message, upstream):
+    """Returns (class, directive) of performance relevant errors"""
+    kind = 'fastcgi' if upstream.startswith('fastcgi://') else 'proxy'
+    for pattern, name, directive in CLASSES:
+        if pattern.search(message):
+            return (name, directive.format(kind=kind))
+    return (None, None)
+
+
+def upstream_name(upstream):
+    """php, hhvm or debug for the pools of upstream.mustache"""
+    port = upstream.rsplit(':', 1)[-1]
+    return UPSTREAMS.get(port, upstream) if upstream else None
+
+
+class ErrorClass():
+    """Occurrences of a single fingerprint"""
+
+    def __init__(self, level, fp, sample):
+        self.level = level
+        self.fingerprint = fp
+        self.sample = sample
+        self.kind = None
+        self.directive = None
+        self.upstreams = collections.Counter()
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.sites = collections.Counter()
+        self.buckets = collections.Counter()
+
+    def merge(self, other):
+        self.count += other.count
+        self.sites.update(other.sites)
+        self.buckets.update(other.buckets)
+        self.upstreams.update(other.upstreams)
+        for attr, pick in (('first', min), ('last', max)):
+            mine, theirs = getattr(self, attr), getattr(other, attr)
+            if mine is None or theirs is None:
+                setattr(self, attr, theirs if mine is None else mine)
+            else:
+                setattr(self, attr, pick(mine, theirs))
+
+    def as_dict(self):
+        return dict(level=self.level, fingerprint=self.fingerprint,
+                    sample=self.sample, count=self.count,
+                    first=self.first, last=self.last, kind=self.kind,
+                    directive=self.directive,
+                    upstreams=dict(self.upstreams), sites=dict(self.sites),
+                    buckets=dict(sorted(self.buckets.items())))
+
+
+def bucket_of(minute, bucket):
+    """'2015/08/01 10:17' floored to bucket minutes"""
+    if bucket >= 60:
+        hours = bucket // 60
+        hour = int(minute[11:13]) // hours * hours
+        return '{0} {1:02d}:00'.format(minute[:10], hour)
+    return '{0}{1:02d}'.format(minute[:14],
+                               int(minute[14:16]) // bucket * bucket)
+
+
+def aggregate(lines, site, bucket, classes=None):
+    """Adds error log lines to classes, dict of fingerprint: ErrorClass"""
+    classes = {} if classes is None else classes
+    buckets = {}
+    fingerprints = Fingerprints()
+    for line in lines:
+        match = LINE.match(line)
+        if not match:
+            continue
+        minute, level, text = match.groups()
+        context = CONTEXT.search(text)
+        message = text[:context.start()] if context else text
+        fields = dict((key, value.strip('"')) for key, value
+                      in CONTEXT.findall(text))
+        fp = fingerprints(message)
+        key = (level, fp)
+        cls = classes.get(key)
+        if cls is None:
+            cls = classes[key] = ErrorClass(level, fp, text)
+            cls.kind, cls.directive = classify(message,
+                                               fields.get('upstream', ''))
+        cls.count += 1
+        if cls.first is None or minute < cls.first:
+            cls.first = minute
+        if cls.last is None or minute > cls.last:
+            cls.last = minute
+        cls.sites[fields.get('server') or fields.get('host') or site] += 1
+        if 'upstream' in fields:
+            cls.upstreams[upstream_name(fields['upstream'])] += 1
+        period = buckets.get(minute)
+        if period is None:
+            period = buckets[minute] = bucket_of(minute, bucket)
+        cls.buckets[period] += 1
+    return classes
+
+
+def site_of(path):
+    """Site name of /var/log/nginx/<site>.error.log[.N[.gz]]"""
+    name = os.path.basename(path).split('.error.log')[0]
+    return name if name != 'error.log' and name else '-'
+
+
+def split_jobs(paths, bucket, split_size=SPLIT_SIZE):
+    """
+        Work items (path, start, end, bucket), plain logs larger than
+        split_size are cut into ranges which start on a new line
+    """
+    jobs = []
+    for path in paths:
+        size = os.path.getsize(path)
+        if path.endswith('.gz') or size <= split_size:
+            jobs.append((path, 0, None, bucket))
+            continue
+        with open(path, 'rb') as f:
+            start = 0
+            while start < size:
+                f.seek(min(start + split_size, size))
+                f.readline()
+                end = min(f.tell(), size)
+                jobs.append((path, start, end, bucket))
+                start = end
+    return jobs
+
+
+def analyze_range(job):
+    """Worker: aggregates lines of path between start and end offsets"""
+    path, start, end, bucket = job
+    site = site_of(path)
+    classes = {}
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        f.seek(start)
+        remaining = None if end is None else end - start
+        rest = b''
+        while remaining is None or remaining > 0:
+            want = BLOCK_SIZE if remaining is None else min(BLOCK_SIZE,
+                                                            remaining)
+            data = f.read(want)
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            data = rest + data
+            cut = data.rfind(b'\n') + 1
+            rest = data[cut:]
+            aggregate(data[:cut].decode('utf-8', 'replace').splitlines(),
+                      site, bucket, classes)
+        if rest:
+            aggregate([rest.decode('utf-8', 'replace')], site, bucket,
+                      classes)
+    return classes
+
+
+def analyze(paths, bucket=60, workers=None):
+    """
+        Aggregates error logs using a process pool,
+        returns list of ErrorClass, most frequent first
+    """
+    jobs = split_jobs(paths, bucket)
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs))
+    if workers > 1:
+        pool = multiprocessing.Pool(workers)
+        try:
+            results = pool.imap_unordered(analyze_range, jobs)
+            merged = merge(results)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        merged = merge(analyze_range(job) for job in jobs)
+    return sorted(merged.values(), key=lambda cls: -cls.count)
+
+
+def merge(results):
+    merged = {}
+    for classes in results:
+        for key, cls in classes.items():
+            if key in merged:
+                merged[key].merge(cls)
+            else:
+                merged[key] = cls
+    return merged
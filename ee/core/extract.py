@@ -1,7 +1,54 @@
 """EasyEngine extarct core classes."""
+import hashlib
+import shutil
 import tarfile
+import tempfile
+import urllib.error
+import urllib.request
+import zipfile
 import os
+from ee.core.artifacts import CHUNK, TIMEOUT, artifact_cache
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
+
+
+def member_name(name, prefix=''):
+    """
+        Path of archive member relative to where it is extracted, None if
+        it is outside prefix or would be written outside of it
+    """
+    if prefix:
+        if not name.startswith(prefix):
+            return None
+        name = name[len(prefix):]
+    if not name or name.startswith('/') or '..' in name.split('/'):
+        return None
+    return name
+
+
+def merge_tree(source, path):
+    """Moves everything within source into path, replacing files"""
+    for root, dirs, files in os.walk(source):
+        target = os.path.join(path, os.path.relpath(root, source))
+        os.makedirs(target, exist_ok=True)
+        for name in files:
+            os.replace(os.path.join(root, name), os.path.join(target, name))
+    shutil.rmtree(source)
+
+
+class HashingReader():
+    """File object computing SHA-256 of what is read through it"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size=-1):
+        chunk = self.stream.read(size)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
 
 
 class EEExtract():
@@ -19,3 +66,104 @@ class EEExtract():
             Log.debug(self, "{0}{1}".format(e.errno, e.strerror))
             Log.error(self, 'Unable to extract file \{0}'.format(file))
             return False
+
+    def unpack(self, file, path, strip=''):
+        """
+            Extract tar or zip archive to path keeping the archive, leading
+            strip directory is left out of extracted paths. Returns False
+            when the archive is unreadable so callers can fall back.
+        """
+        prefix = strip.strip('/') + '/' if strip else ''
+        try:
+            if zipfile.is_zipfile(file):
+                archive = zipfile.ZipFile(file)
+                members = [(member, member.filename)
+                           for member in archive.infolist()]
+            else:
+                archive = tarfile.open(file)
+                members = [(member, member.name)
+                           for member in archive.getmembers()]
+            with archive:
+                for member, name in members:
+                    name = member_name(name, prefix)
+                    if name is None:
+                        continue
+                    if isinstance(member, zipfile.ZipInfo):
+                        member.filename = name
+                        archive.extract(member, path)
+                    elif member.isfile() or member.isdir():
+                        member.name = name
+                        archive.extract(member, path)
+                    else:
+                        Log.debug(self, "Skipping link {0} in {1}"
+                                  .format(member.name, file))
+            return True
+        except (tarfile.TarError, zipfile.BadZipfile, OSError) as e:
+            Log.debug(self, "Unable to extract {0}: {1}".format(file, e))
+            return False
+
+    def stream(self, url, path, strip='', sha256=None):
+        """
+            Extract tarball at url into path as it downloads, without
+            writing the archive to disk. A copy in the artifact cache, as
+            fetched by EEDownload.download, is extracted instead when
+            there is one. Files are extracted next
+            to path and moved into it once the whole archive was read and
+            its sha256, when given, matched.
+        """
+        cache = artifact_cache(self)
+        entry = cache.entry(url)
+        if entry is not None and (not sha256 or
+                                  entry['sha256'] == sha256.lower()):
+            Log.debug(self, "Extracting cached {0} to {1}".format(url, path))
+            if EEExtract.unpack(self, cache.object_path(entry['sha256']),
+                                path, strip=strip):
+                return True
+        if cache.offline:
+            Log.error(self, "{0} is not cached and ee is offline"
+                      .format(url))
+
+        Log.debug(self, "Extracting {0} to {1}".format(url, path))
+        prefix = strip.strip('/') + '/' if strip else ''
+        parent = os.path.dirname(os.path.normpath(path))
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix='.ee-extract-', dir=parent)
+        os.chmod(staging, 0o755)
+        try:
+            with EEProfile.span('download', url):
+                request = urllib.request.Request(
+                    url, headers={'User-Agent': 'EasyEngine'})
+                with urllib.request.urlopen(request,
+                                            timeout=TIMEOUT) as response:
+                    reader = HashingReader(response)
+                    with tarfile.open(fileobj=reader, mode='r|*') as tar:
+                        for member in tar:
+                            name = member_name(member.name, prefix)
+                            if name is None:
+                                continue
+                            if not (member.isfile() or member.isdir()):
+                                Log.debug(self, "Skipping link {0} in {1}"
+                                          .format(member.name, url))
+                                continue
+                            member.name = name
+                            tar.extract(member, staging)
+                    # padding after the last member is part of the digest
+                    for chunk in iter(lambda: reader.read(CHUNK), b''):
+                        pass
+            digest = reader.digest.hexdigest()
+            if sha256 and digest != sha256.lower():
+                raise ValueError("SHA-256 {0} does not match {1}"
+                                 .format(digest, sha256))
+            Log.debug(self, "Extracted {0} bytes from {1}, SHA-256 {2}"
+                      .format(reader.size, url, digest))
+            if os.path.isdir(path):
+                merge_tree(staging, path)
+            else:
+                os.rename(staging, os.path.normpath(path))
+            return True
+        except (urllib.error.URLError, tarfile.TarError, OSError,
+                ValueError) as e:
+            Log.debug(self, "{0}".format(e))
+            shutil.rmtree(staging, ignore_errors=True)
+            Log.error(self, 'Unable to extract {0}'.format(url))
+            return False
@@ -5,10 +5,27 @@ import sys
 import glob
 import shutil
 import pwd
-import fileinput
+import tempfile
 from ee.core.logging import Log
 
 
+def replace_file(path, text):
+    """
+        Replaces content of path with text through a temporary file, so
+        sys.stdout is never redirected as with fileinput inplace and other
+        threads printing at the same time can not end up in the file
+    """
+    fd, tmp = tempfile.mkstemp(prefix='.ee-', dir=os.path.dirname(path))
+    try:
+        with open(fd, encoding='utf-8', mode='w') as f:
+            f.write(text)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
 class EEFileUtils():
     """Utilities to operate on files"""
     def __init__():
@@ -92,9 +109,9 @@ class EEFileUtils():
             Log.debug(self, "Doning search and replace, File:{0},"
                       "Source string:{1}, Dest String:{2}"
                       .format(fnm, sstr, rstr))
-            for line in fileinput.input(fnm, inplace=True):
-                print(line.replace(sstr, rstr), end='')
-            fileinput.close()
+            with open(fnm, encoding='utf-8', mode='r') as f:
+                text = f.read()
+            replace_file(fnm, text.replace(sstr, rstr))
         except Exception as e:
             Log.debug(self, "{0}".format(e))
             Log.error(self, "Unable to search {0} and replace {1} {2}"
@@ -0,0 +1,152 @@
+"""EasyEngine PHP-FPM slow log analysis."""
+import collections
+import os
+import re
+import time
+
+# [01-Aug-2015 10:15:00]  [pool debug] pid 12345
+# script_filename = /var/www/example.com/htdocs/index.php
+# [0x00007f3b5c0132d8] curl_exec() /var/www/.../class-http.php:1510
+# ...
+ENTRY = re.compile(r'^\[(\d\d-\w{3}-\d{4} \d\d:\d\d:\d\d)\]\s+'
+                   r'\[pool ([^\]]+)\] pid (\d+)\n'
+                   r'script_filename = ([^\n]*)\n'
+                   r'((?:\[0x[0-9a-f]+\] [^\n]*\n)*)', re.M)
+FRAME = re.compile(r'^\[0x[0-9a-f]+\] (.*?)\(\) (.*?):(\d+)$', re.M)
+WEBROOT = re.compile(r'^/var/www/([^/]+)/htdocs/')
+PLUGIN = re.compile(r'(?:^|/)wp-content/(?:mu-)?plugins/([^/]+)')
+
+# Slow log of the debug pool set up by `ee stack install --php`
+EE_FPM_SLOW_LOG = '/var/log/php5/slow.log'
+EE_FPM_SLOW_CURSOR = '/var/lib/ee/log-cursors/php5-fpm-slow.json'
+
+# An entry at the very end of a log modified this recently may still be
+# being written, leave it for the next run
+SETTLE_TIME = 2
+# Bytes of the log read and checkpointed at a time
+READ_SIZE = 16 * 1024 * 1024
+
+
+def relative(path):
+    """Path inside the site, same file of every site looks the same"""
+    return WEBROOT.sub('', path)
+
+
+def site_of(path):
+    match = WEBROOT.match(path)
+    return match.group(1) if match else None
+
+
+def parse_entries(data, settled=True):
+    """
+        Yields (end offset, entry) for slow log text, entry is a dict of
+        ts, pool, pid, script and frames, a list of (function, file, line)
+        starting with the innermost call.
+        Unless settled the trailing entry is held back.
+    """
+    matches = list(ENTRY.finditer(data))
+    if matches and not settled:
+        matches.pop()
+    for match in matches:
+        frames = [(func, path, int(line)) for func, path, line
+                  in FRAME.findall(match.group(5))]
+        yield (match.end(), dict(ts=parse_time(match.group(1)),
+                                 pool=match.group(2),
+                                 pid=int(match.group(3)),
+                                 script=match.group(4),
+                                 frames=frames))
+
+
+def parse_time(value):
+    return time.mktime(time.strptime(value, '%d-%b-%Y %H:%M:%S'))
+
+
+class Hotspot():
+    """Occurrences of a script, frame, call stack or plugin"""
+
+    def __init__(self):
+        self.count = 0
+        self.first = None
+        self.last = None
+        self.sites = set()
+
+    def add(self, ts, site):
+        self.count += 1
+        self.first = ts if self.first is None else min(self.first, ts)
+        self.last = ts if self.last is None else max(self.last, ts)
+        if site:
+            self.sites.add(site)
+
+
+class FpmSlowReport():
+    """Slow requests grouped by script, stack, frame and plugin"""
+
+    def __init__(self):
+        self.entries = 0
+        self.scripts = collections.defaultdict(Hotspot)
+        self.stacks = collections.defaultdict(Hotspot)
+        # innermost frame, what PHP was busy with when the trace was taken
+        self.frames = collections.defaultdict(Hotspot)
+        # any frame, counted once per trace
+        self.callers = collections.defaultdict(Hotspot)
+        self.plugins = collections.defaultdict(Hotspot)
+
+    def add(self, entry):
+        self.entries += 1
+        ts = entry['ts']
+        site = site_of(entry['script'])
+        self.scripts[relative(entry['script'])].add(ts, site)
+        frames = [(func, relative(path)) for func, path, line
+                  in entry['frames']]
+        if not frames:
+            return
+        self.stacks[tuple(frames)].add(ts, site)
+        func, path, line = entry['frames'][0]
+        self.frames['{0}() {1}:{2}'.format(func, relative(path),
+                                           line)].add(ts, site)
+        seen = set()
+        plugins = set()
+        for func, path in frames:
+            seen.add('{0}() {1}'.format(func, path))
+            match = PLUGIN.search(path)
+            if match:
+                plugins.add(match.group(1))
+        for caller in seen:
+            self.callers[caller].add(ts, site)
+        for plugin in plugins:
+            self.plugins[plugin].add(ts, site)
+
+    @staticmethod
+    def top(hotspots, limit):
+        return sorted(hotspots.items(),
+                      key=lambda item: -item[1].count)[:limit]
+
+
+def analyze(cursor, settle_time=SETTLE_TIME, read_size=READ_SIZE):
+    """
+        Aggregates entries of log read through LogCursor read_size bytes
+        at a time, the cursor is committed after each part.
+        Returns FpmSlowReport.
+    """
+    settled = time.time() - os.path.getmtime(cursor.path) >= settle_time
+    report = FpmSlowReport()
+    while True:
+        data = cursor.read(read_size)
+        if not data:
+            break
+        text = data.decode('utf-8', 'surrogateescape')
+        consumed = 0
+        # the trailing entry may go on in the next part
+        for end, entry in parse_entries(text, settled=False):
+            consumed = end
+            report.add(entry)
+        if not consumed:
+            # only the last entry of the log is left
+            if settled:
+                for end, entry in parse_entries(text):
+                    report.add(entry)
+                cursor.commit(len(data))
+            break
+        cursor.commit(len(text[:consumed].encode('utf-8',
+                                                 'surrogateescape')))
+    return report
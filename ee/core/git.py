@@ -1,6 +1,7 @@
 """EasyEngine GIT module"""
 from sh import git, ErrorReturnCode
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
 import os
 
 
@@ -10,6 +11,8 @@ class EEGit:
         # TODO method for core variables
         pass
 
+    @EEProfile.timed('git', lambda self, paths, *args, **kw:
+                     'add ' + ' '.join(paths))
     def add(self, paths, msg="Intializating"):
         """
             Initializes Directory as repository if not already git repo.
@@ -0,0 +1,164 @@
+"""EasyEngine history of ee commands and their durations."""
+import json
+import math
+import re
+import sqlite3
+import time
+from ee.core.variables import EEVariables
+
+# The table lives in the ee database next to sites. It is written with
+# the sqlite3 module at exit of every command, importing SQLAlchemy
+# there would slow down each of them.
+SCHEMA = ['''CREATE TABLE IF NOT EXISTS command_history (
+                 id INTEGER PRIMARY KEY,
+                 command VARCHAR,
+                 argv VARCHAR,
+                 started FLOAT,
+                 duration FLOAT,
+                 exit_code INTEGER,
+                 phases VARCHAR,
+                 ee_version VARCHAR)''',
+          '''CREATE INDEX IF NOT EXISTS command_history_started
+                 ON command_history (started)''']
+
+# Seconds to wait for a site create holding the database
+BUSY_TIMEOUT = 2
+
+# Values of options with names like these never reach the database
+SECRET = re.compile(r'pass|secret|token|key', re.IGNORECASE)
+REDACTED = '***'
+
+# Commands which change the stack, durations are compared before and
+# after the last of them
+STACK_CHANGES = ('stack upgrade', 'stack install', 'update')
+
+
+def redact(argv):
+    """Returns argv with values of password like options replaced"""
+    args = []
+    hide = False
+    for arg in argv:
+        if hide and not arg.startswith('-'):
+            args.append(REDACTED)
+        elif arg.startswith('-') and '=' in arg:
+            name, value = arg.split('=', 1)
+            args.append(name + '=' + REDACTED if SECRET.search(name)
+                        else arg)
+        else:
+            args.append(arg)
+        hide = arg.startswith('-') and '=' not in arg and \
+            bool(SECRET.search(arg))
+    return args
+
+
+def command_names(controllers):
+    """Labels and aliases of controllers and their exposed commands"""
+    names = set()
+    for controller in controllers:
+        meta = getattr(controller, 'Meta', None)
+        if meta is not None:
+            names.add(getattr(meta, 'label', None))
+            names.update(getattr(meta, 'aliases', []))
+        for member in vars(controller).values():
+            expose = getattr(member, '__cement_meta__', None)
+            if expose is not None and expose['label'] != 'default':
+                names.add(expose['label'])
+                names.update(expose['aliases'])
+    names.discard(None)
+    names.discard('base')
+    return names
+
+
+def command_of(argv, names):
+    """Leading words of argv which name commands, like 'site create'"""
+    words = []
+    for arg in argv:
+        if arg.startswith('-') or arg not in names:
+            break
+        words.append(arg)
+    return ' '.join(words)
+
+
+def connect(path=EEVariables.ee_db_path):
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    # readers and the writer at exit of a concurrent ee never block
+    # each other, the mode is kept in the database file
+    connection.execute('PRAGMA journal_mode=WAL')
+    for statement in SCHEMA:
+        connection.execute(statement)
+    return connection
+
+
+def record(rows, path=EEVariables.ee_db_path):
+    """
+        Inserts rows, dicts of command, argv, started, duration, exit_code
+        and phases, in a single transaction
+    """
+    connection = connect(path)
+    try:
+        with connection:
+            connection.executemany(
+                'INSERT INTO command_history (command, argv, started, '
+                'duration, exit_code, phases, ee_version) VALUES '
+                '(?, ?, ?, ?, ?, ?, ?)',
+                [(row['command'], json.dumps(row['argv']), row['started'],
+                  row['duration'], row['exit_code'],
+                  json.dumps(row['phases']), EEVariables.ee_version)
+                 for row in rows])
+    finally:
+        connection.close()
+
+
+def load(since=None, command=None, path=EEVariables.ee_db_path):
+    """Returns list of Run, oldest first"""
+    connection = connect(path)
+    try:
+        sql = ('SELECT command, started, duration, exit_code, phases '
+               'FROM command_history WHERE started >= ?')
+        args = [since or 0]
+        if command is not None:
+            sql += ' AND command = ?'
+            args.append(command)
+        rows = connection.execute(sql + ' ORDER BY started', args).fetchall()
+    finally:
+        connection.close()
+    return [Run(*row) for row in rows]
+
+
+class Run():
+    """Single recorded ee command"""
+
+    def __init__(self, command, started, duration, exit_code, phases):
+        self.command = command
+        self.started = started
+        self.duration = duration
+        self.exit_code = exit_code
+        try:
+            self.phases = json.loads(phases or '{}')
+        except ValueError:
+            self.phases = {}
+
+
+def percentile(values, pct):
+    """Nearest rank percentile of values, None if there are none"""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(int(math.ceil(len(values) * pct / 100.0)) - 1, 0)]
+
+
+def period_of(started, period):
+    """Label of the day, week or month started falls in"""
+    if period == 'day':
+        return time.strftime('%Y-%m-%d', time.localtime(started))
+    if period == 'week':
+        return time.strftime('%Y week %W', time.localtime(started))
+    return time.strftime('%Y-%m', time.localtime(started))
+
+
+def last_stack_change(runs):
+    """Last successful run changing the stack, None if there was none"""
+    for run in reversed(runs):
+        if run.command in STACK_CHANGES and run.exit_code == 0:
+            return run
+    return None
@@ -0,0 +1,132 @@
+"""EasyEngine log compression and rotation."""
+import glob
+import multiprocessing
+import os
+import time
+from ee.core.blockgzip import BlockWriter, index_path, write_index
+
+# Bytes read from a log and handed to the compressor at once
+CHUNK_SIZE = 1024 * 1024
+
+
+def compress_range(src, dst, size=None):
+    """
+        Streams src into BlockWriter dst in chunks, up to size bytes
+        when given, returns number of bytes read
+    """
+    done = 0
+    while size is None or done < size:
+        want = CHUNK_SIZE if size is None else min(CHUNK_SIZE, size - done)
+        chunk = src.read(want)
+        if not chunk:
+            break
+        dst.write(chunk)
+        done += len(chunk)
+    return done
+
+
+def archive_name(path, stamp=None):
+    """Dated archive name of rotated log, access.log-20150801-101500.gz"""
+    stamp = stamp or time.strftime('%Y%m%d-%H%M%S')
+    name = "{0}-{1}.gz".format(path, stamp)
+    count = 0
+    # never overwrite an archive rotated within the same second
+    while os.path.exists(name):
+        count += 1
+        name = "{0}-{1}-{2}.gz".format(path, stamp, count)
+    return name
+
+
+def prune_archives(path, keep):
+    """Removes all but newest keep rotated archives of path"""
+    archives = sorted(glob.glob(glob.escape(path) + '-[0-9]*-[0-9]*.gz'))
+    removed = []
+    for archive in archives[:max(len(archives) - keep, 0)]:
+        os.remove(archive)
+        if os.path.exists(index_path(archive)):
+            os.remove(index_path(archive))
+        removed.append(archive)
+    return removed
+
+
+def gzip_log(path, level=6, rotate=False, keep=None):
+    """
+        Compresses log file without loading it in memory.
+
+        The archive is a seekable multi-member gzip file, see BlockWriter,
+        with its index of time stamps written next to it as archive.idx.
+
+        Without rotate, path.gz is written next to the log (atomically
+        replacing an older one) and the log is left alone.
+
+        With rotate, the log is compressed to a dated archive and then
+        truncated in place. nginx and php-fpm keep their log open with
+        O_APPEND, so they go on writing at the start of the emptied file.
+        Whatever they appended while the archive was written is picked up
+        right before truncating, only lines written between that last read
+        and the truncate itself can be lost, as with copytruncate of
+        logrotate. Archives beyond keep are removed afterwards.
+
+        Returns dict with path, archive, bytes_in, bytes_out, seconds and
+        pruned archives.
+    """
+    start = time.time()
+    out = archive_name(path) if rotate else path + '.gz'
+    tmp = "{0}.{1}.tmp".format(out, os.getpid())
+    pruned = []
+    try:
+        with open(path, 'rb') as src:
+            with open(tmp, 'wb') as f:
+                dst = BlockWriter(f, level)
+                if rotate:
+                    size = os.fstat(src.fileno()).st_size
+                    done = compress_range(src, dst, size)
+                    # catch up with lines written meanwhile, then empty it
+                    done += compress_range(src, dst)
+                    os.truncate(path, 0)
+                else:
+                    done = compress_range(src, dst)
+                index = dst.close()
+        stat = os.stat(path)
+        os.chmod(tmp, stat.st_mode & 0o777)
+        try:
+            os.chown(tmp, stat.st_uid, stat.st_gid)
+        except OSError:
+            pass
+        # index first, read_index() rejects it until the archive matches
+        write_index(out, index)
+        os.replace(tmp, out)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    if rotate and keep is not None:
+        pruned = prune_archives(path, keep)
+    return dict(path=path, archive=out, bytes_in=done,
+                bytes_out=os.path.getsize(out),
+                seconds=time.time() - start, pruned=pruned)
+
+
+def _gzip_worker(args):
+    path, level, rotate, keep = args
+    try:
+        return gzip_log(path, level, rotate, keep)
+    except (IOError, OSError) as e:
+        return dict(path=path, error=str(e))
+
+
+def gzip_logs(paths, level=6, rotate=False, keep=None, workers=None):
+    """
+        Compresses logs concurrently, one process per log, returns results
+        of gzip_log in order of paths, failures as dict(path, error)
+    """
+    jobs = [(path, level, rotate, keep) for path in paths]
+    workers = min(workers or multiprocessing.cpu_count(), len(jobs))
+    if workers <= 1:
+        return [_gzip_worker(job) for job in jobs]
+    pool = multiprocessing.Pool(workers)
+    try:
+        return pool.map(_gzip_worker, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,149 @@
+"""EasyEngine log cursor, remembers how far a log was read across runs."""
+import json
+import os
+
+
+class LogCursor():
+    """
+        Reads what was appended to a log since the previous run.
+
+        The inode and offset reached are kept in a small JSON state file.
+        When the log was rotated by renaming, the rest of the old file
+        (found as <log>.1) is returned before the new log, when it was
+        truncated the log is read from the start again.
+
+        >>> cursor = LogCursor('/var/log/php5/slow.log', state_file)
+        >>> data = cursor.read()
+        >>> cursor.commit(consumed)
+    """
+
+    def __init__(self, path, state_file):
+        self.path = path
+        self.state_file = state_file
+        self.pending = None
+        self.limited = False
+
+    def load(self):
+        try:
+            with open(self.state_file, encoding='utf-8', mode='r') as f:
+                state = json.load(f)
+            if isinstance(state, dict):
+                return state
+        except (IOError, OSError, ValueError):
+            pass
+        return {}
+
+    def save(self, state):
+        directory = os.path.dirname(self.state_file)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        tmp = '{0}.{1}'.format(self.state_file, os.getpid())
+        with open(tmp, encoding='utf-8', mode='w') as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_file)
+
+    def reset(self):
+        """Forget position, next read starts at beginning of the log"""
+        if os.path.exists(self.state_file):
+            os.remove(self.state_file)
+
+    def rewind(self):
+        """Next read starts at beginning of the log, as it is now"""
+        self.save(dict(inode=os.stat(self.path).st_ino, offset=0))
+
+    def seek_end(self):
+        """Skip what the log holds now, next read starts at its end"""
+        st = os.stat(self.path)
+        self.save(dict(inode=st.st_ino, offset=st.st_size))
+
+    @staticmethod
+    def _read_from(path, offset, limit=None):
+        with open(path, 'rb') as f:
+            st = os.fstat(f.fileno())
+            f.seek(offset)
+            size = max(st.st_size - offset, 0)
+            if limit is not None:
+                size = min(size, limit)
+            return (f.read(size), st.st_ino)
+
+    def read(self, limit=None):
+        """
+            Returns bytes appended since last commit, up to the last
+            complete line, at most limit bytes when given. Read and commit
+            again until nothing is returned to go through a large log in
+            parts. limited tells whether limit stopped the read short.
+        """
+        state = self.load()
+        inode, offset = state.get('inode'), state.get('offset', 0)
+        st = os.stat(self.path)
+        rotated = b''
+        remaining = 0
+        if inode is not None and inode != st.st_ino:
+            try:
+                old = os.stat(self.path + '.1')
+                if old.st_ino == inode and old.st_size >= offset:
+                    rotated, inode = self._read_from(self.path + '.1',
+                                                     offset, limit)
+                    remaining = old.st_size - offset - len(rotated)
+                    rotated = rotated[:rotated.rfind(b'\n') + 1]
+            except (IOError, OSError):
+                rotated = b''
+            if not rotated:
+                inode, offset = st.st_ino, 0
+        elif st.st_size < offset:
+            # truncated in place
+            offset = 0
+
+        if rotated and remaining:
+            # limit reached within the rotated log, new log comes next time
+            data, current = b'', st.st_ino
+        elif rotated:
+            if limit is not None:
+                limit -= len(rotated)
+            data, current = self._read_from(self.path, 0, limit)
+        else:
+            data, current = self._read_from(self.path, offset, limit)
+        self.limited = bool(remaining) or (limit is not None and
+                                           len(data) >= limit)
+        data = data[:data.rfind(b'\n') + 1]
+        self.pending = dict(inode=inode, offset=offset, rotated=len(rotated),
+                            current=current, partial=bool(remaining))
+        return rotated + data
+
+    def commit(self, consumed):
+        """Store position after consumed bytes of data returned by read"""
+        pending = self.pending
+        if pending is None:
+            return
+        if pending['rotated'] and (consumed < pending['rotated'] or
+                                   pending['partial']):
+            state = dict(inode=pending['inode'],
+                         offset=pending['offset'] + consumed)
+        elif pending['rotated']:
+            state = dict(inode=pending['current'],
+                         offset=consumed - pending['rotated'])
+        else:
+            state = dict(inode=pending['current'],
+                         offset=pending['offset'] + consumed)
+        self.save(state)
+        self.pending = None
+
+
+class DictCursor(LogCursor):
+    """
+        LogCursor keeping its state in states, a dict of log path: state
+        stored by the caller along with its own data
+    """
+
+    def __init__(self, path, states):
+        LogCursor.__init__(self, path, None)
+        self.states = states
+
+    def load(self):
+        return dict(self.states.get(self.path, {}))
+
+    def save(self, state):
+        self.states[self.path] = state
+
+    def reset(self):
+        self.states.pop(self.path, None)
@@ -0,0 +1,225 @@
+"""EasyEngine multiplexed follower of site logs."""
+import collections
+import fcntl
+import os
+import re
+import sys
+import time
+from ee.core.logwatch import LogWatcher
+
+# $status and $upstream_response_time of log_format rt_cache
+ACCESS = re.compile(r'^\S+ ([\d.-]+(?:(?:, | : )[\d.-]+)*) \S+ \[[^\]]+\] '
+                    r'\S+ "[^"]*" (\d{3}) ')
+
+
+class QuietLogWatcher(LogWatcher):
+    """LogWatcher not announcing every file it (un)watches"""
+
+    def log(self, line):
+        pass
+
+
+class TokenBucket():
+    """Allows rate events per second on average, bursts up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(rate, 1))
+        self.tokens = self.capacity
+        self.stamp = time.time()
+
+    def take(self, now):
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class LineFilter():
+    """
+        Decides on raw lines before anything is formatted.
+        status is a list of codes or classes (404, 5xx), min_upstream is
+        in seconds, both only match access log lines.
+    """
+
+    def __init__(self, pattern=None, status=None, min_upstream=None):
+        self.pattern = re.compile(pattern) if pattern else None
+        self.status = tuple(code.strip().lower().rstrip('x')
+                            for code in status) if status else None
+        self.min_upstream = min_upstream
+
+    def __call__(self, line):
+        if self.pattern is not None and not self.pattern.search(line):
+            return False
+        if self.status is None and self.min_upstream is None:
+            return True
+        match = ACCESS.match(line)
+        if match is None:
+            return False
+        if self.status is not None and not match.group(2).startswith(
+                self.status):
+            return False
+        if self.min_upstream is not None:
+            total = 0.0
+            for part in re.split(r', | : ', match.group(1)):
+                if part != '-':
+                    total += float(part)
+            if total < self.min_upstream:
+                return False
+        return True
+
+
+class LogFollower():
+    """
+        Follows logs of many sites through a single LogWatcher.
+
+        Every line passing the filter is prefixed with its site and log
+        name, 1 in sample lines are kept, and per site and global rate
+        limits apply. Output is written in batches to a non-blocking
+        descriptor, what the terminal or pipe can not take is kept for the
+        next batch up to flush_size and dropped beyond that instead of
+        blocking. Counts of dropped lines are reported every
+        report_interval seconds.
+    """
+
+    # bytes buffered before they are written anyway
+    flush_size = 64 * 1024
+    report_interval = 5.0
+
+    def __init__(self, files, line_filter=None, sample=1, site_rate=None,
+                 rate=None, out=None, err=None):
+        """
+            (dict) @files:
+                log file path: site name
+        """
+        self.labels = {}
+        for path, site in files.items():
+            name = os.path.splitext(os.path.basename(path))[0]
+            self.labels[os.path.realpath(path)] = "{0} {1}| ".format(site,
+                                                                    name)
+        self.line_filter = line_filter or LineFilter()
+        self.sample = max(int(sample or 1), 1)
+        self.site_rate = site_rate
+        self.site_buckets = {}
+        self.bucket = TokenBucket(rate) if rate else None
+        self.out = out or sys.stdout
+        self.err = err or sys.stderr
+        self.buffer = []
+        self.buffered = 0
+        # bytes of earlier batches the output did not take yet
+        self.pending = b''
+        self.seen = collections.Counter()
+        self.dropped = collections.Counter()
+        self.last_report = time.time()
+
+    def callback(self, filename, lines):
+        label = self.labels.get(filename)
+        if label is None:
+            label = "{0}| ".format(os.path.basename(filename))
+        now = time.time()
+        site_bucket = None
+        if self.site_rate:
+            site_bucket = self.site_buckets.get(label)
+            if site_bucket is None:
+                site_bucket = TokenBucket(self.site_rate)
+                self.site_buckets[label] = site_bucket
+        for line in lines:
+            if not self.line_filter(line):
+                continue
+            self.seen[label] += 1
+            if self.sample > 1 and self.seen[label] % self.sample:
+                continue
+            if site_bucket is not None and not site_bucket.take(now):
+                self.dropped['site rate'] += 1
+                continue
+            if self.bucket is not None and not self.bucket.take(now):
+                self.dropped['rate'] += 1
+                continue
+            text = label + line.rstrip('\n') + '\n'
+            self.buffer.append(text)
+            self.buffered += len(text)
+        if self.buffered >= self.flush_size:
+            self.flush()
+
+    def fileno(self):
+        """Descriptor of out, None when it has none"""
+        try:
+            return self.out.fileno()
+        except (AttributeError, ValueError, OSError):
+            return None
+
+    def flush(self):
+        """
+            Write buffered lines as far as output takes them without
+            blocking, keep the rest for the next flush up to flush_size
+        """
+        fd = self.fileno()
+        if fd is None:
+            if self.buffer:
+                self.out.write(''.join(self.buffer))
+                self.out.flush()
+        elif self.buffer or self.pending:
+            data = self.pending + ''.join(self.buffer).encode('utf-8',
+                                                             'replace')
+            try:
+                written = os.write(fd, data)
+            except BlockingIOError:
+                written = 0
+            rest = data[written:]
+            if len(rest) > self.flush_size:
+                # the line being written is always finished, whole lines
+                # after it are kept up to flush_size and the others dropped
+                current = rest.find(b'\n') + 1 or len(rest)
+                keep = rest.rfind(b'\n', current,
+                                  max(self.flush_size, current)) + 1
+                keep = max(keep, current)
+                self.dropped['slow output'] += rest.count(b'\n', keep)
+                rest = rest[:keep]
+            self.pending = rest
+        self.buffer = []
+        self.buffered = 0
+        self.report()
+
+    def report(self, force=False):
+        now = time.time()
+        if not self.dropped or (not force and
+                                now - self.last_report < self.report_interval):
+            return
+        try:
+            self.err.write("-- dropped {0} lines ({1}) --\n".format(
+                           sum(self.dropped.values()), ", ".join(
+                               "{0}: {1}".format(reason, count)
+                               for reason, count
+                               in sorted(self.dropped.items()))))
+            self.err.flush()
+        except BlockingIOError:
+            # err may share the non-blocking descriptor of out
+            return
+        self.dropped.clear()
+        self.last_report = now
+
+    def follow(self):
+        watcher = QuietLogWatcher(list(self.labels.keys()), self.callback)
+        watcher.tick = self.flush
+        fd = self.fileno()
+        flags = None
+        if fd is not None:
+            self.out.flush()
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        try:
+            watcher.loop()
+        finally:
+            self.flush()
+            if flags is not None:
+                # the descriptor is shared with the shell, give it back
+                # as it was and write out what is left
+                fcntl.fcntl(fd, fcntl.F_SETFL, flags)
+                if self.pending:
+                    os.write(fd, self.pending)
+                    self.pending = b''
+            self.report(force=True)
+            watcher.close()
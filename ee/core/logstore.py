@@ -0,0 +1,384 @@
+"""EasyEngine columnar store of Nginx access logs."""
+import array
+import collections
+import itertools
+import json
+import mmap
+import operator
+import os
+import re
+import shutil
+import time
+from ee.core.accesslog import TimeLocal, parse_block
+from ee.core.logcursor import DictCursor
+
+EE_LOG_STORE = '/var/lib/ee/logstore'
+STORE_VERSION = 1
+
+# Column files of a day, <store>/<site>/<YYYYmmdd>/<name>.col, as
+# (name, array typecode). upstream is in milliseconds, -1 without
+# upstream, cache, url, ua and ip are ids of the site dictionaries.
+COLUMNS = [('ts', 'I'), ('status', 'H'), ('bytes', 'Q'), ('upstream', 'i'),
+           ('cache', 'H'), ('url', 'I'), ('ua', 'I'), ('ip', 'I')]
+TYPECODES = dict(COLUMNS)
+DICTIONARIES = ('cache', 'url', 'ua', 'ip')
+
+# Bytes of log parsed and appended to the store at once
+READ_SIZE = 32 * 1024 * 1024
+
+WHERE = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|==|=|>|<|~)\s*(.*?)\s*$')
+OPERATORS = {'=': operator.eq, '==': operator.eq, '!=': operator.ne,
+             '>': operator.gt, '>=': operator.ge, '<': operator.lt,
+             '<=': operator.le}
+# what rows can be counted by
+GROUPS = ('url', 'ua', 'ip', 'cache', 'status', 'hour', 'day', 'site')
+
+# what a value given for a numeric column is multiplied with
+SCALE = dict(ts=1, status=1, bytes=1, upstream=1000)
+
+
+class Dictionary():
+    """
+        Distinct values of a column, one per line, the line number is the
+        id stored in the column files
+    """
+
+    def __init__(self, path, count=0, size=0):
+        self.path = path
+        self.count = count
+        self.size = size
+        self.ids = None
+        self.new = []
+
+    def values(self):
+        if not self.size:
+            return []
+        with open(self.path, 'rb') as f:
+            data = f.read(self.size)
+        values = data.decode('utf-8', 'surrogateescape').split('\n')
+        return values[:self.count]
+
+    def encode(self, values):
+        """Returns array of ids of values, adding unknown ones"""
+        if self.ids is None:
+            self.ids = dict((value, index) for index, value
+                            in enumerate(self.values()))
+        ids = self.ids
+        encoded = array.array('I')
+        for value in values:
+            index = ids.get(value)
+            if index is None:
+                index = ids[value] = len(ids)
+                self.new.append(value)
+            encoded.append(index)
+        return encoded
+
+    def flush(self):
+        if self.new:
+            data = ''.join(value + '\n' for value in self.new).encode(
+                'utf-8', 'surrogateescape')
+            with open(self.path, 'ab') as f:
+                f.write(data)
+            self.count += len(self.new)
+            self.size += len(data)
+            self.new = []
+
+
+def local_day(stamp):
+    """
+        Local day of stamp as YYYYMMDD with the stamps it starts and ends
+        at, taken from local midnights as zones are not all whole hours
+        away from UTC
+    """
+    now = time.localtime(stamp)
+    begin = time.mktime((now.tm_year, now.tm_mon, now.tm_mday,
+                         0, 0, 0, 0, 0, -1))
+    end = time.mktime((now.tm_year, now.tm_mon, now.tm_mday + 1,
+                       0, 0, 0, 0, 0, -1))
+    if not begin <= stamp < end:
+        # midnight skipped by a daylight saving change
+        begin = end = stamp
+    return (time.strftime('%Y%m%d', now), begin, end)
+
+
+class SiteStore():
+    """
+        Column files and dictionaries of one site.
+
+        manifest.json holds rows of every day, length of every dictionary
+        and the log cursors. It is only replaced after the rows of a batch
+        have been appended, whatever was appended past it by an indexing
+        run which did not finish is cut off by recover().
+    """
+
+    def __init__(self, root, site):
+        self.site = site
+        self.path = os.path.join(root, site)
+        self.manifest = self.load()
+        self.dictionaries = {}
+        for name in DICTIONARIES:
+            count, size = self.manifest['dicts'].get(name, (0, 0))
+            self.dictionaries[name] = Dictionary(
+                os.path.join(self.path, name + '.dict'), count, size)
+
+    def load(self):
+        try:
+            with open(os.path.join(self.path, 'manifest.json'),
+                      encoding='utf-8', mode='r') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == STORE_VERSION:
+                return manifest
+        except (IOError, OSError, ValueError):
+            pass
+        return dict(version=STORE_VERSION, days={}, dicts={}, cursors={})
+
+    def days(self, since=None, until=None):
+        """Sorted days with rows, YYYYmmdd, of the local dates in range"""
+        first = time.strftime('%Y%m%d', time.localtime(since)) if since \
+            else None
+        last = time.strftime('%Y%m%d', time.localtime(until)) if until \
+            else None
+        return [day for day in sorted(self.manifest['days'])
+                if (first is None or day >= first) and
+                (last is None or day <= last)]
+
+    def column_path(self, day, name):
+        return os.path.join(self.path, day, name + '.col')
+
+    def recover(self):
+        """Cut column and dictionary files back to what manifest holds"""
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        for day in os.listdir(self.path):
+            if not os.path.isdir(os.path.join(self.path, day)):
+                continue
+            rows = self.manifest['days'].get(day, 0)
+            for name, code in COLUMNS:
+                path = self.column_path(day, name)
+                size = rows * array.array(code).itemsize
+                if os.path.exists(path) and os.path.getsize(path) > size:
+                    os.truncate(path, size)
+        for dictionary in self.dictionaries.values():
+            if (os.path.exists(dictionary.path) and
+               os.path.getsize(dictionary.path) > dictionary.size):
+                os.truncate(dictionary.path, dictionary.size)
+
+    def append(self, cols):
+        """Appends columns returned by parse_block, agents included"""
+        if not cols['ts']:
+            return 0
+        upstream = array.array('i', (int(value * 1000 + 0.5) if value >= 0
+                                     else -1 for value in cols['upstream']))
+        data = dict(ts=array.array('I', map(int, cols['ts'])),
+                    status=cols['status'],
+                    bytes=array.array('Q', map(int, cols['bytes'])),
+                    upstream=upstream)
+        for name in DICTIONARIES:
+            data[name] = self.dictionaries[name].encode(cols[name])
+
+        # lines are written in order, so rows of a day come in runs and
+        # the day is only looked up again outside the current one
+        start = 0
+        day = None
+        begin = end = 0
+        for index, stamp in enumerate(data['ts']):
+            if begin <= stamp < end:
+                continue
+            current, begin, end = local_day(stamp)
+            if current != day:
+                if day is not None:
+                    self.append_rows(day, data, start, index)
+                day = current
+                start = index
+        self.append_rows(day, data, start, len(data['ts']))
+        return len(data['ts'])
+
+    def append_rows(self, day, data, start, end):
+        directory = os.path.join(self.path, day)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        for name, code in COLUMNS:
+            with open(self.column_path(day, name), 'ab') as f:
+                data[name][start:end].tofile(f)
+        days = self.manifest['days']
+        days[day] = days.get(day, 0) + end - start
+
+    def commit(self):
+        """Makes appended rows part of the store"""
+        for name, dictionary in self.dictionaries.items():
+            dictionary.flush()
+            self.manifest['dicts'][name] = [dictionary.count,
+                                            dictionary.size]
+        path = os.path.join(self.path, 'manifest.json')
+        tmp = '{0}.{1}'.format(path, os.getpid())
+        with open(tmp, encoding='utf-8', mode='w') as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp, path)
+
+    def column(self, day, name):
+        """Column of day as memory mapped array, no copy is made"""
+        rows = self.manifest['days'][day]
+        if not rows:
+            return array.array(TYPECODES[name])
+        with open(self.column_path(day, name), 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(mapped).cast(TYPECODES[name])[:rows]
+
+
+def index_log(root, site, path, read_size=READ_SIZE):
+    """
+        Appends lines of access log path written since the previous run to
+        store of site, returns number of rows added
+    """
+    store = SiteStore(root, site)
+    store.recover()
+    cursor = DictCursor(path, store.manifest['cursors'])
+    to_epoch = TimeLocal()
+    added = 0
+    while 1:
+        data = cursor.read(read_size)
+        if not data:
+            break
+        added += store.append(parse_block(data, to_epoch=to_epoch,
+                                          agents=True))
+        cursor.commit(len(data))
+        store.commit()
+    return added
+
+
+def remove_store(root, site):
+    path = os.path.join(root, site)
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+
+
+def sites(root):
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root)
+                  if os.path.isfile(os.path.join(root, name,
+                                                 'manifest.json')))
+
+
+class Condition():
+    """
+        Condition of --where, column, operator and value, like
+        status>=500, upstream>1.5, cache=MISS or url~^/wp-admin/
+    """
+
+    def __init__(self, text):
+        match = WHERE.match(text)
+        if match is None:
+            raise ValueError("invalid condition {0}".format(text))
+        self.name, self.op, value = match.groups()
+        if self.name not in TYPECODES:
+            raise ValueError("unknown column {0}".format(self.name))
+        if self.name in DICTIONARIES:
+            if self.op in ('=', '=='):
+                self.test = value.__eq__
+            elif self.op == '!=':
+                self.test = value.__ne__
+            elif self.op == '~':
+                self.test = re.compile(value).search
+            else:
+                raise ValueError("{0} can only be compared with =, != or ~"
+                                 .format(self.name))
+        else:
+            if self.op == '~':
+                raise ValueError("{0} can not be matched with ~"
+                                 .format(self.name))
+            self.value = int(float(value) * SCALE[self.name])
+        self.ids = {}
+
+    def mask(self, store, column):
+        """Iterator of booleans, one per row of column"""
+        if self.name in DICTIONARIES:
+            ids = self.ids.get(store.site)
+            if ids is None:
+                values = store.dictionaries[self.name].values()
+                ids = self.ids[store.site] = frozenset(
+                    index for index, value in enumerate(values)
+                    if self.test(value))
+            return map(ids.__contains__, column)
+        match = map(OPERATORS[self.op], column, itertools.repeat(self.value))
+        if self.name == 'upstream':
+            # rows served without upstream never match
+            match = map(operator.and_, match,
+                        map(operator.ge, column, itertools.repeat(0)))
+        return match
+
+
+class QueryResult():
+    """Rows matching a query, counted by group"""
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.groups = collections.Counter()
+
+
+def hour_label(value):
+    """Hours since epoch to local time"""
+    return time.strftime('%Y-%m-%d %H:00', time.localtime(value * 3600))
+
+
+def query(root, site_names, conditions=None, group=None, since=None,
+          until=None):
+    """
+        Counts rows of sites matching all conditions by group, one of
+        GROUPS. Every filter and count is done with
+        map(), itertools.compress() and Counter over the memory mapped
+        columns, no Python code runs per row.
+    """
+    conditions = list(conditions or [])
+    if since:
+        conditions.append(Condition('ts>={0}'.format(int(since))))
+    if until:
+        conditions.append(Condition('ts<={0}'.format(int(until))))
+    result = QueryResult()
+    for site in site_names:
+        store = SiteStore(root, site)
+        counts = collections.Counter()
+        for day in store.days(since, until):
+            mask = None
+            for condition in conditions:
+                match = condition.mask(store,
+                                       store.column(day, condition.name))
+                mask = match if mask is None else map(operator.and_, mask,
+                                                      match)
+            if mask is not None:
+                mask = bytes(mask)
+                rows = sum(mask)
+                result.bytes += sum(itertools.compress(
+                    store.column(day, 'bytes'), mask))
+            else:
+                rows = store.manifest['days'][day]
+                result.bytes += sum(store.column(day, 'bytes'))
+            result.rows += rows
+
+            if group in ('site', 'day'):
+                if rows:
+                    counts[site if group == 'site' else '{0}-{1}-{2}'.format(
+                        day[:4], day[4:6], day[6:])] += rows
+                continue
+            if group == 'hour':
+                values = map(operator.floordiv, store.column(day, 'ts'),
+                             itertools.repeat(3600))
+            elif group in TYPECODES:
+                values = store.column(day, group)
+            else:
+                continue
+            if mask is not None:
+                values = itertools.compress(values, mask)
+            counts.update(values)
+
+        if group in DICTIONARIES:
+            values = store.dictionaries[group].values()
+            for index, count in counts.items():
+                result.groups[values[index]] += count
+        elif group == 'hour':
+            for value, count in counts.items():
+                result.groups[hour_label(value)] += count
+        else:
+            result.groups.update(counts)
+    return result
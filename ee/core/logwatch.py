@@ -1,4 +1,3 @@
-
 """
 Real time log files watcher supporting log rotation.
 """
@@ -7,13 +6,107 @@ import os
 import time
 import errno
 import stat
-from ee.core.logging import Log
+import struct
+import selectors
+import ctypes
+import ctypes.util
+
+
+class Inotify(object):
+    """Minimal inotify binding through ctypes.
+
+    Raises OSError when inotify is not available (non Linux systems,
+    exhausted max_user_instances, ...), callers should fall back to
+    polling in that case.
+    """
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+
+    # events which mean a watched name may point to another file now
+    RESCAN = (IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE |
+              IN_DELETE_SELF | IN_MOVE_SELF | IN_ATTRIB | IN_Q_OVERFLOW |
+              IN_IGNORED)
+
+    DIR_MASK = (IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO |
+                IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+    _event = struct.Struct('iIII')
+
+    def __init__(self):
+        libname = ctypes.util.find_library('c') or 'libc.so.6'
+        try:
+            self.libc = ctypes.CDLL(libname, use_errno=True)
+            init = self.libc.inotify_init1
+        except (OSError, AttributeError):
+            raise OSError(errno.ENOSYS, "inotify not available")
+        self.fd = init(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self.watches = {}
+
+    def fileno(self):
+        return self.fd
+
+    def add_watch(self, path, mask=DIR_MASK):
+        """Watch path, returns watch descriptor"""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self):
+        """Returns list of (path, mask) for pending events"""
+        events = []
+        try:
+            buf = os.read(self.fd, 64 * 1024)
+        except OSError as err:
+            if err.errno in (errno.EAGAIN, errno.EINTR):
+                return events
+            raise
+        pos = 0
+        while pos + self._event.size <= len(buf):
+            wd, mask, cookie, length = self._event.unpack_from(buf, pos)
+            pos += self._event.size
+            name = buf[pos:pos + length].rstrip(b'\0')
+            pos += length
+            path = self.watches.get(wd)
+            if mask & self.IN_IGNORED:
+                self.watches.pop(wd, None)
+            if path is not None and name:
+                path = os.path.join(path, os.fsdecode(name))
+            events.append((path, mask))
+        return events
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.watches.clear()
 
 
 class LogWatcher(object):
     """Looks for changes in all files of a directory.
     This is useful for watching log file changes in real-time.
-    It also supports files rotation.
+    It also supports files rotation, both by renaming (new inode)
+    and by copytruncate (file shrinks in place).
+
+    Changes are picked up through inotify when available, otherwise
+    files are polled with an interval backing off while they are idle.
 
     Example:
 
@@ -24,7 +117,25 @@ class LogWatcher(object):
     >>> l.loop()
     """
 
-    def __init__(self, filelist, callback, extensions=["log"], tail_lines=0):
+    # longest sleep between two polls of idle files
+    max_interval = 2.0
+
+    # with inotify, still rescan all names this often as a safety net
+    rescan_interval = 5.0
+
+    # bytes read from a file at once, bounds memory used per read
+    chunk_size = 256 * 1024
+
+    # lines longer than this are passed on in pieces
+    max_line = 1024 * 1024
+
+    # called at least every tick_interval seconds while looping when set,
+    # e.g. to flush buffered output
+    tick = None
+    tick_interval = 0.25
+
+    def __init__(self, filelist, callback, extensions=["log"], tail_lines=0,
+                 use_inotify=True):
         """Arguments:
 
         (str) @folder:
@@ -40,17 +151,29 @@ class LogWatcher(object):
 
         (int) @tail_lines:
             read last N lines from files being watched before starting
+
+        (bool) @use_inotify:
+            wait for inotify events instead of polling when available
         """
         self.files_map = {}
+        # unterminated last line of each file, by file object
+        self.partial = {}
         self.filelist = filelist
         self.callback = callback
         # self.folder = os.path.realpath(folder)
         self.extensions = extensions
+        self.inotify = None
+        self.watched_dirs = set()
         # assert (os.path.isdir(self.folder), "%s does not exists"
         #                                     % self.folder)
         for file in self.filelist:
             assert (os.path.isfile(file))
         assert callable(callback)
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError:
+                self.inotify = None
         self.update_files()
         # The first time we run the script we move all file markers at EOF.
         # In case of files created afterwards we don't do this.
@@ -64,17 +187,71 @@ class LogWatcher(object):
     def __del__(self):
         self.close()
 
-    def loop(self, interval=0.1, async=False):
+    def loop(self, interval=0.1, blocking=True):
         """Start the loop.
-        If async is True make one loop then return.
+        If blocking is False make one loop then return.
         """
+        if self.inotify is not None:
+            return self.inotify_loop(blocking)
+        return self.poll_loop(interval, blocking)
+
+    def poll_loop(self, interval=0.1, blocking=True):
+        """Poll files, sleeping longer while nothing is written"""
+        delay = interval
         while 1:
             self.update_files()
+            active = False
             for fid, file in list(iter(self.files_map.items())):
-                self.readfile(file)
-            if async:
+                if self.readfile(file):
+                    active = True
+            if self.tick is not None:
+                self.tick()
+            if not blocking:
                 return
-            time.sleep(interval)
+            if active:
+                delay = interval
+            else:
+                delay = min(delay * 2, self.max_interval)
+            if self.tick is not None:
+                delay = min(delay, self.tick_interval)
+            time.sleep(delay)
+
+    def inotify_loop(self, blocking=True):
+        """Sleep until inotify reports a change in a watched directory"""
+        selector = selectors.DefaultSelector()
+        selector.register(self.inotify.fileno(), selectors.EVENT_READ)
+        last_scan = time.time()
+        try:
+            while 1:
+                rescan = False
+                changed = set()
+                timeout = self.rescan_interval if blocking else 0
+                if self.tick is not None:
+                    timeout = min(timeout, self.tick_interval)
+                if selector.select(timeout):
+                    for path, mask in self.inotify.read_events():
+                        if mask & Inotify.RESCAN or path is None:
+                            rescan = True
+                        changed.add(path)
+                elif blocking and (time.time() - last_scan >=
+                                   self.rescan_interval):
+                    rescan = True
+
+                if rescan:
+                    self.update_files()
+                    last_scan = time.time()
+                for fid, file in list(iter(self.files_map.items())):
+                    if rescan or file.name in changed:
+                        self.readfile(file)
+                if self.tick is not None:
+                    self.tick()
+                if self.inotify is None:
+                    # ran out of inotify watches
+                    return self.poll_loop(blocking=blocking)
+                if not blocking:
+                    return
+        finally:
+            selector.close()
 
     def log(self, line):
         """Log when a file is un/watched"""
@@ -93,35 +270,37 @@ class LogWatcher(object):
     #         return ls
 
     @staticmethod
-    def tail(fname, window):
-        """Read last N lines from file fname."""
+    def tail(fname, window, blocksize=64 * 1024):
+        """Read last N lines from file fname.
+        Scans backwards from the end in large blocks and counts newlines
+        on the raw bytes, only the returned lines are decoded.
+        """
         try:
-            f = open(fname, encoding='utf-8', mode='r')
+            f = open(fname, mode='rb')
         except IOError as err:
             if err.errno == errno.ENOENT:
                 return []
             else:
                 raise
-        else:
-            BUFSIZ = 1024
-            f.seek(0, os.SEEK_END)
-            fsize = f.tell()
-            block = -1
-            data = ""
-            exit = False
-            while not exit:
-                step = (block * BUFSIZ)
-                if abs(step) >= fsize:
-                    f.seek(0)
-                    exit = True
-                else:
-                    f.seek(step, os.SEEK_END)
-                data = f.read().strip()
-                if data.count('\n') >= window:
-                    break
-                else:
-                    block -= 1
-            return data.splitlines()[-window:]
+        with f:
+            pos = f.seek(0, os.SEEK_END)
+            blocks = []
+            newlines = 0
+            seen_data = False
+            while pos > 0 and newlines < window:
+                step = min(blocksize, pos)
+                pos -= step
+                f.seek(pos)
+                block = f.read(step)
+                if not seen_data:
+                    # trailing blank lines do not count
+                    block = block.rstrip()
+                    seen_data = bool(block)
+                newlines += block.count(b'\n')
+                blocks.append(block)
+            data = b''.join(reversed(blocks)).strip()
+            return [line.decode('utf-8', 'replace')
+                    for line in data.splitlines()[-window:]]
 
     def update_files(self):
         ls = []
@@ -159,14 +338,57 @@ class LogWatcher(object):
             if fid not in self.files_map:
                 self.watch(fname)
 
-    def readfile(self, file):
-        lines = file.readlines()
-        if lines:
+    def readfile(self, file, flush=False):
+        """Pass new lines of file to callback, returns number of lines.
+        File is read in chunks of chunk_size bytes, a line which is not
+        terminated yet is kept back until the rest of it is written,
+        unless flush is True.
+        """
+        try:
+            if os.fstat(file.fileno()).st_size < file.tell():
+                # copytruncate rotation, start over from the beginning
+                self.log("truncated logfile %s" % file.name)
+                file.seek(0)
+                self.partial.pop(file, None)
+        except (OSError, ValueError):
+            pass
+        count = 0
+        while 1:
+            chunk = file.read(self.chunk_size)
+            if not chunk:
+                break
+            data = self.partial.pop(file, b'') + chunk
+            end = data.rfind(b'\n') + 1
+            if end == 0 and len(data) < self.max_line:
+                self.partial[file] = data
+                continue
+            if end == 0:
+                # overlong line, hand it over in pieces
+                end = len(data)
+            elif end < len(data):
+                self.partial[file] = data[end:]
+            lines = self.splitlines(data[:end])
+            count += len(lines)
+            self.callback(file.name, lines)
+        if flush and file in self.partial:
+            lines = self.splitlines(self.partial.pop(file))
+            count += len(lines)
             self.callback(file.name, lines)
+        return count
+
+    @staticmethod
+    def splitlines(data):
+        """Decode bytes into lines, every line keeps its newline"""
+        lines = data.decode('utf-8', 'replace').split('\n')
+        last = lines.pop()
+        lines = [line + '\n' for line in lines]
+        if last:
+            lines.append(last)
+        return lines
 
     def watch(self, fname):
         try:
-            file = open(fname, encoding='utf-8', mode='r')
+            file = open(fname, mode='rb')
             fid = self.get_file_id(os.stat(fname))
         except EnvironmentError as err:
             if err.errno != errno.ENOENT:
@@ -174,16 +396,29 @@ class LogWatcher(object):
         else:
             self.log("watching logfile %s" % fname)
             self.files_map[fid] = file
+            self.watch_dir(os.path.dirname(fname))
+
+    def watch_dir(self, dirname):
+        """Subscribe to inotify events of directory holding a log file"""
+        if self.inotify is None or dirname in self.watched_dirs:
+            return
+        try:
+            self.inotify.add_watch(dirname)
+            self.watched_dirs.add(dirname)
+        except OSError:
+            # e.g. max_user_watches reached, poll from now on
+            self.inotify.close()
+            self.inotify = None
 
     def unwatch(self, file, fid):
         # file no longer exists; if it has been renamed
         # try to read it for the last time in case the
         # log rotator has written something in it.
-        lines = self.readfile(file)
+        self.readfile(file, flush=True)
         self.log("un-watching logfile %s" % file.name)
         del self.files_map[fid]
-        if lines:
-            self.callback(file.name, lines)
+        self.partial.pop(file, None)
+        file.close()
 
     @staticmethod
     def get_file_id(st):
@@ -193,3 +428,7 @@ class LogWatcher(object):
         for id, file in list(iter(self.files_map.items())):
             file.close()
         self.files_map.clear()
+        self.partial.clear()
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
@@ -0,0 +1,433 @@
+"""EasyEngine metrics of Nginx, PHP5-fpm and MySQL for Prometheus."""
+import collections
+import concurrent.futures
+import configparser
+import glob
+import json
+import os
+import re
+import socket
+import ssl
+import struct
+import time
+import urllib.request
+import pymysql
+from ee.core.accesslog import TimeLocal, parse_block, site_of
+from ee.core.logcursor import DictCursor
+
+# Written for the textfile collector of node_exporter, point its
+# --collector.textfile.directory here or pass --output to ee metrics
+EE_METRICS_FILE = '/var/lib/ee/metrics/ee.prom'
+EE_METRICS_STATE = '/var/lib/ee/metrics/state.json'
+
+FPM_POOLS = '/etc/php5/fpm/pool.d/*.conf'
+NGINX_VHOST = '/etc/nginx/sites-available/22222'
+NGINX_STATUS_URL = 'https://127.0.0.1:22222/nginx_status'
+ACCESS_LOGS = '/var/log/nginx/*.access.log'
+
+# Seconds to wait for any endpoint
+TIMEOUT = 2
+# Bytes of access log parsed per site and scrape, the rest is left for
+# the next one
+READ_SIZE = 16 * 1024 * 1024
+# Upper bounds of upstream response time buckets, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# (field of pm.status_path?json, metric, type)
+FPM_STATUS = [
+    ('start since', 'uptime_seconds', 'gauge'),
+    ('accepted conn', 'accepted_connections_total', 'counter'),
+    ('listen queue', 'listen_queue', 'gauge'),
+    ('max listen queue', 'max_listen_queue', 'gauge'),
+    ('listen queue len', 'listen_queue_length', 'gauge'),
+    ('idle processes', 'idle_processes', 'gauge'),
+    ('active processes', 'active_processes', 'gauge'),
+    ('total processes', 'total_processes', 'gauge'),
+    ('max active processes', 'max_active_processes', 'gauge'),
+    ('max children reached', 'max_children_reached_total', 'counter'),
+    ('slow requests', 'slow_requests_total', 'counter'),
+]
+
+# (variable of SHOW GLOBAL STATUS, type)
+MYSQL_STATUS = [
+    ('Uptime', 'gauge'), ('Threads_connected', 'gauge'),
+    ('Threads_running', 'gauge'), ('Max_used_connections', 'gauge'),
+    ('Connections', 'counter'), ('Aborted_connects', 'counter'),
+    ('Aborted_clients', 'counter'), ('Questions', 'counter'),
+    ('Slow_queries', 'counter'), ('Bytes_received', 'counter'),
+    ('Bytes_sent', 'counter'), ('Created_tmp_tables', 'counter'),
+    ('Created_tmp_disk_tables', 'counter'),
+    ('Innodb_buffer_pool_read_requests', 'counter'),
+    ('Innodb_buffer_pool_reads', 'counter'),
+    ('Innodb_row_lock_waits', 'counter'), ('Table_locks_waited', 'counter'),
+]
+
+STUB_STATUS = re.compile(r'Active connections:\s*(\d+)\s+'
+                         r'server accepts handled requests\s+'
+                         r'(\d+)\s+(\d+)\s+(\d+)\s+'
+                         r'Reading:\s*(\d+)\s+Writing:\s*(\d+)\s+'
+                         r'Waiting:\s*(\d+)')
+
+STUB_STATUS_LOCATION = '''
+  # Nginx status for ee metrics
+  location = /nginx_status {
+    stub_status on;
+    access_log off;
+  }
+'''
+
+
+class MetricSet():
+    """Samples by metric name, rendered in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics = collections.OrderedDict()
+
+    def add(self, name, kind, text, value, **labels):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = (kind, text, [])
+        metric[2].append(('', labels, value))
+
+    def add_histogram(self, name, text, buckets, total, count, **labels):
+        """buckets is a list of (upper bound, observations up to it)"""
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = ('histogram', text, [])
+        for bound, value in buckets:
+            metric[2].append(('_bucket', dict(labels, le=str(bound)), value))
+        metric[2].append(('_bucket', dict(labels, le='+Inf'), count))
+        metric[2].append(('_sum', labels, total))
+        metric[2].append(('_count', labels, count))
+
+    def update(self, other):
+        for name, (kind, text, samples) in other.metrics.items():
+            if name in self.metrics:
+                self.metrics[name][2].extend(samples)
+            else:
+                self.metrics[name] = (kind, text, list(samples))
+
+    def samples(self):
+        return sum(len(metric[2]) for metric in self.metrics.values())
+
+    @staticmethod
+    def escape(value):
+        return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+                .replace('\n', '\\n'))
+
+    def render(self):
+        lines = []
+        for name, (kind, text, samples) in self.metrics.items():
+            lines.append('# HELP {0} {1}'.format(name, text))
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+            for suffix, labels, value in samples:
+                if labels:
+                    label = '{' + ','.join(
+                        '{0}="{1}"'.format(key, self.escape(labels[key]))
+                        for key in sorted(labels)) + '}'
+                else:
+                    label = ''
+                lines.append('{0}{1}{2} {3}'.format(name, suffix, label,
+                                                    repr(float(value))
+                                                    if isinstance(value, float)
+                                                    else value))
+        return '\n'.join(lines) + '\n'
+
+
+def fcgi_record(kind, content=b''):
+    return struct.pack('!BBHHBx', 1, kind, 1, len(content), 0) + content
+
+
+def fcgi_length(length):
+    if length < 128:
+        return struct.pack('!B', length)
+    return struct.pack('!I', length | 0x80000000)
+
+
+def fcgi_get(address, script, query='', timeout=TIMEOUT):
+    """
+        GET request for script straight to the FastCGI server at address,
+        host:port or path of a unix socket, as nginx would pass it.
+        Returns (status, body).
+    """
+    params = dict(GATEWAY_INTERFACE='CGI/1.1', REQUEST_METHOD='GET',
+                  SCRIPT_NAME=script, SCRIPT_FILENAME=script,
+                  REQUEST_URI=script + ('?' + query if query else ''),
+                  DOCUMENT_URI=script, QUERY_STRING=query,
+                  SERVER_PROTOCOL='HTTP/1.1', REMOTE_ADDR='127.0.0.1')
+    data = b''
+    for name, value in params.items():
+        name, value = name.encode(), value.encode()
+        data += fcgi_length(len(name)) + fcgi_length(len(value)) + name + value
+    request = (fcgi_record(1, struct.pack('!HB5x', 1, 0)) +
+               fcgi_record(4, data) + fcgi_record(4) + fcgi_record(5))
+
+    if ':' in address:
+        host, port = address.rsplit(':', 1)
+        sock = socket.create_connection((host, int(port)), timeout)
+    else:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(address)
+    try:
+        sock.sendall(request)
+        stream = sock.makefile('rb')
+        output = []
+        while 1:
+            header = stream.read(8)
+            if len(header) < 8:
+                break
+            version, kind, request_id, length, padding = struct.unpack(
+                '!BBHHBx', header)
+            content = stream.read(length + padding)[:length]
+            if kind == 6:
+                output.append(content)
+            elif kind == 3:
+                break
+    finally:
+        sock.close()
+
+    head, _, body = b''.join(output).partition(b'\r\n\r\n')
+    status = 200
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'status:'):
+            status = int(line.split()[1])
+    return (status, body)
+
+
+def fpm_pools(pattern=FPM_POOLS):
+    """Returns list of (pool, listen, status path, ping path)"""
+    pools = []
+    for path in sorted(glob.glob(pattern)):
+        config = configparser.ConfigParser(interpolation=None, strict=False)
+        try:
+            config.read(path)
+        except configparser.Error:
+            continue
+        for pool in config.sections():
+            section = config[pool]
+            if 'pm.status_path' in section and 'listen' in section:
+                pools.append((pool, section['listen'],
+                              section['pm.status_path'],
+                              section.get('ping.path')))
+    return pools
+
+
+def collect_fpm():
+    metrics = MetricSet()
+    for pool, listen, status_path, ping_path in fpm_pools():
+        up = 0
+        try:
+            if ping_path:
+                start = time.time()
+                fcgi_get(listen, ping_path)
+                metrics.add('ee_phpfpm_ping_seconds', 'gauge',
+                            'Time PHP5-fpm took to answer ping.path',
+                            time.time() - start, pool=pool)
+            code, body = fcgi_get(listen, status_path, 'json')
+            if code == 200:
+                status = json.loads(body.decode('utf-8', 'replace'))
+                up = 1
+                for field, name, kind in FPM_STATUS:
+                    if field in status:
+                        metrics.add('ee_phpfpm_' + name, kind,
+                                    'PHP5-fpm status field ' + field,
+                                    status[field], pool=pool)
+        except (OSError, ValueError):
+            up = 0
+        metrics.add('ee_phpfpm_up', 'gauge',
+                    'Whether status page of the pool could be read', up,
+                    pool=pool)
+    return metrics
+
+
+def collect_mysql():
+    metrics = MetricSet()
+    connection = pymysql.connect(read_default_file='~/.my.cnf',
+                                 connect_timeout=TIMEOUT)
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SHOW GLOBAL STATUS")
+        status = dict((row[0], row[1]) for row in cursor.fetchall())
+    finally:
+        connection.close()
+    metrics.add('ee_mysql_up', 'gauge', 'Whether MySQL could be queried', 1)
+    for variable, kind in MYSQL_STATUS:
+        if variable not in status:
+            continue
+        try:
+            value = int(status[variable])
+        except ValueError:
+            continue
+        name = variable.lower()
+        if kind == 'counter':
+            name += '_total'
+        metrics.add('ee_mysql_' + name, kind,
+                    'MySQL global status ' + variable, value)
+    return metrics
+
+
+def collect_nginx():
+    metrics = MetricSet()
+    context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+    # the 22222 certificate is self signed
+    context.verify_mode = ssl.CERT_NONE
+    with urllib.request.urlopen(NGINX_STATUS_URL, timeout=TIMEOUT,
+                                context=context) as response:
+        text = response.read().decode('utf-8', 'replace')
+    match = STUB_STATUS.search(text)
+    if match is None:
+        raise ValueError("unexpected stub_status output")
+    values = [int(value) for value in match.groups()]
+    metrics.add('ee_nginx_connections_active', 'gauge',
+                'Open client connections', values[0])
+    for state, value in zip(('reading', 'writing', 'waiting'), values[4:]):
+        metrics.add('ee_nginx_connections', 'gauge',
+                    'Client connections by state', value, state=state)
+    metrics.add('ee_nginx_connections_accepted_total', 'counter',
+                'Accepted client connections', values[1])
+    metrics.add('ee_nginx_connections_handled_total', 'counter',
+                'Handled client connections', values[2])
+    metrics.add('ee_nginx_requests_total', 'counter', 'Client requests',
+                values[3])
+    return metrics
+
+
+def collect_sites(state):
+    """
+        Counts requests appended to site access logs since the previous
+        scrape, totals are kept in state so they only ever grow
+    """
+    metrics = MetricSet()
+    cursors = state.setdefault('cursors', {})
+    sites = state.setdefault('sites', {})
+    to_epoch = TimeLocal()
+    for path in sorted(glob.glob(ACCESS_LOGS)):
+        site = site_of(path)
+        cursor = DictCursor(path, cursors)
+        if path not in cursors:
+            # start counting now, not with the whole history of the log
+            cursor.seek_end()
+        data = cursor.read(READ_SIZE)
+        totals = sites.setdefault(site, dict(status={}, cache={}, bytes=0,
+                                             buckets=[0] * len(BUCKETS),
+                                             sum=0.0, count=0))
+        cols = parse_block(data, to_epoch=to_epoch)
+        for code in cols['status']:
+            key = '{0}xx'.format(code // 100)
+            totals['status'][key] = totals['status'].get(key, 0) + 1
+        for cache in cols['cache']:
+            totals['cache'][cache] = totals['cache'].get(cache, 0) + 1
+        totals['bytes'] += int(sum(cols['bytes']))
+        buckets = totals['buckets']
+        for value in cols['upstream']:
+            if value < 0:
+                continue
+            totals['sum'] += value
+            totals['count'] += 1
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    buckets[index] += 1
+                    break
+        cursor.commit(len(data))
+
+    for site in sorted(sites):
+        totals = sites[site]
+        for code, count in sorted(totals['status'].items()):
+            metrics.add('ee_site_requests_total', 'counter',
+                        'Requests by status class', count, site=site,
+                        status=code)
+        for cache, count in sorted(totals['cache'].items()):
+            metrics.add('ee_site_cache_requests_total', 'counter',
+                        'Requests by $upstream_cache_status', count,
+                        site=site, cache=cache)
+        metrics.add('ee_site_sent_bytes_total', 'counter',
+                    'Response body bytes sent', totals['bytes'], site=site)
+        cumulative = []
+        seen = 0
+        for bound, count in zip(BUCKETS, totals['buckets']):
+            seen += count
+            cumulative.append((bound, seen))
+        metrics.add_histogram('ee_site_upstream_seconds',
+                              'Upstream response time of requests',
+                              cumulative, totals['sum'], totals['count'],
+                              site=site)
+    return metrics
+
+
+def collect(state, workers=4):
+    """
+        Runs all collectors concurrently, returns (MetricSet, errors),
+        errors is a dict of collector: message
+    """
+    collectors = collections.OrderedDict([
+        ('nginx', collect_nginx), ('phpfpm', collect_fpm),
+        ('mysql', collect_mysql), ('sites', lambda: collect_sites(state))])
+    metrics = MetricSet()
+    errors = {}
+    status = MetricSet()
+    with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+        started = dict((name, time.time()) for name in collectors)
+        futures = collections.OrderedDict(
+            (name, executor.submit(function))
+            for name, function in collectors.items())
+        for name, future in futures.items():
+            try:
+                metrics.update(future.result())
+                success = 1
+            except Exception as e:
+                errors[name] = str(e)
+                success = 0
+            status.add('ee_scrape_collector_success', 'gauge',
+                       'Whether the collector succeeded', success,
+                       collector=name)
+            status.add('ee_scrape_collector_duration_seconds', 'gauge',
+                       'Time the collector took',
+                       time.time() - started[name], collector=name)
+    metrics.update(status)
+    return (metrics, errors)
+
+
+def write_textfile(path, text):
+    """Replaces path atomically, a scrape never sees a partial file"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, encoding='utf-8', mode='w') as f:
+        f.write(text)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def load_state(path=EE_METRICS_STATE):
+    try:
+        with open(path, encoding='utf-8', mode='r') as f:
+            state = json.load(f)
+        if isinstance(state, dict):
+            return state
+    except (IOError, OSError, ValueError):
+        pass
+    return {}
+
+
+def save_state(state, path=EE_METRICS_STATE):
+    write_textfile(path, json.dumps(state))
+
+
+def ensure_stub_status(path=NGINX_VHOST):
+    """Adds stub_status to the 22222 vhost, returns True if it was added"""
+    if not os.path.isfile(path):
+        return False
+    with open(path, encoding='utf-8', mode='r') as f:
+        content = f.read()
+    if 'stub_status' in content:
+        return False
+    end = content.rstrip().rfind('}')
+    if end < 0:
+        return False
+    content = content[:end] + STUB_STATUS_LOCATION.lstrip('\n') + '\n' + \
+        content[end:]
+    with open(path, encoding='utf-8', mode='w') as f:
+        f.write(content)
+    return True
@@ -1,13 +1,44 @@
 """EasyEngine MySQL core classes."""
 import pymysql
 from pymysql import connections, DatabaseError, Error
+import atexit
+import concurrent.futures
 import configparser
+import contextlib
+import hashlib
+import json
 from os.path import expanduser
 import sys
 import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import zlib
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
 from ee.core.variables import EEVariables
 
+# Seconds a connection may be idle before it is pinged ahead of reuse
+PING_AFTER = 30
+
+# Statements after which cached lists of databases and users are stale
+# (grant ... identified by creates the user)
+CHANGES_ACCOUNTS = re.compile(r'^\s*((create|drop|rename)\s+'
+                              r'(database|schema|user)|grant)\b',
+                              re.IGNORECASE)
+
+# Where ee stack migrate backs up all databases
+BACKUP_DIR = '/var/ee-mysqlbackup'
+# Schemas generated by the server, nothing to back up
+SKIP_BACKUP = ('information_schema', 'performance_schema', 'sys')
+# Defaults of backup-workers and backup-compression in [mysql] of ee.conf
+BACKUP_WORKERS = 2
+BACKUP_LEVEL = 6
+CHUNK = 256 * 1024
+
 
 class MySQLConnectionError(Exception):
     """Custom Exception when MySQL server Not Connected"""
@@ -24,9 +55,104 @@ class DatabaseNotExistsError(Exception):
     pass
 
 
+class BackupError(Exception):
+    """Raised when a database could not be dumped"""
+    pass
+
+
+def mysql_option(self, key, default):
+    """Option of [mysql] in ee.conf, default when it is not set"""
+    config = self.app.config
+    if config.has_section('mysql') and key in config.keys('mysql'):
+        return config.get('mysql', key)
+    return default
+
+
+def low_priority(argv):
+    """argv run at lowest CPU and best-effort IO priority when possible"""
+    if shutil.which('ionice'):
+        argv = ['ionice', '-c2', '-n7'] + argv
+    if shutil.which('nice'):
+        argv = ['nice', '-n', '19'] + argv
+    return argv
+
+
+def dump_command(database):
+    return ['mysqldump', database, '--max_allowed_packet=1024M',
+            '--single-transaction']
+
+
+def dump_database(database, path, level=BACKUP_LEVEL, threads=1):
+    """
+        Dumps database to gzip file path, compressed by pigz with threads
+        when it is installed and by zlib otherwise. Returns dict of sizes,
+        duration and SHA-256 of the file.
+    """
+    start = time.time()
+    digest = hashlib.sha256()
+    dumped = 0
+    tmp = path + '.part'
+    pigz = shutil.which('pigz')
+    with tempfile.TemporaryFile() as errors:
+        dump = subprocess.Popen(low_priority(dump_command(database)),
+                                stdout=subprocess.PIPE, stderr=errors)
+        source = dump.stdout
+        compress = compressor = None
+        if pigz:
+            compress = subprocess.Popen(low_priority(
+                [pigz, '-{0}'.format(level), '-p', str(threads), '-c']),
+                stdin=dump.stdout, stdout=subprocess.PIPE, stderr=errors)
+            # pigz exiting sends mysqldump SIGPIPE
+            dump.stdout.close()
+            source = compress.stdout
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+        try:
+            with open(tmp, 'wb') as f:
+                for chunk in iter(lambda: source.read(CHUNK), b''):
+                    if compressor is not None:
+                        dumped += len(chunk)
+                        chunk = compressor.compress(chunk)
+                    f.write(chunk)
+                    digest.update(chunk)
+                if compressor is not None:
+                    chunk = compressor.flush()
+                    f.write(chunk)
+                    digest.update(chunk)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        finally:
+            source.close()
+            returncode = dump.wait()
+            if compress is not None and compress.wait() and not returncode:
+                returncode = compress.returncode
+        errors.seek(0)
+        message = errors.read().decode('utf-8', 'replace').strip()
+    if returncode:
+        os.remove(tmp)
+        raise BackupError("{0}: {1}".format(database, message or
+                                             "exited with {0}"
+                                             .format(returncode)))
+    os.replace(tmp, path)
+    return dict(database=database, file=path, dumped=dumped or None,
+                size=os.path.getsize(path), duration=time.time() - start,
+                sha256=digest.hexdigest())
+
+
 class EEMysql():
     """Method for MySQL connection"""
 
+    # connection of every thread, opened on first use and kept until exit
+    local = threading.local()
+    opened = []
+    lock = threading.Lock()
+    # databases and users looked up once for the command, see databases()
+    known = {}
+
+    @EEProfile.timed('mysql', lambda self: 'connect')
     def connect(self):
         """Makes connection with MySQL server"""
         try:
@@ -39,6 +165,7 @@ class EEMysql():
             Log.debug(self, str(e))
             raise MySQLConnectionError
 
+    @EEProfile.timed('mysql', lambda self, db_name: 'connect ' + db_name)
     def dbConnection(self, db_name):
         try:
             connection = pymysql.connect(db=db_name,
@@ -53,73 +180,233 @@ class EEMysql():
             Log.debug(self, str(e))
             raise MySQLConnectionError
 
+    def connection(self):
+        """
+            Connection of the current thread, connects on first use and
+            checks the server is still there when it was idle for a while
+        """
+        connection = getattr(EEMysql.local, 'connection', None)
+        if connection is not None and \
+           time.time() - EEMysql.local.used > PING_AFTER:
+            try:
+                connection.ping()
+            except Error as e:
+                Log.debug(self, "MySQL connection lost: {0}".format(e))
+                EEMysql.discard(self)
+                connection = None
+        if connection is None:
+            connection = EEMysql.connect(self)
+            EEMysql.local.connection = connection
+            with EEMysql.lock:
+                if not EEMysql.opened:
+                    atexit.register(EEMysql.close_all)
+                EEMysql.opened.append(connection)
+        EEMysql.local.used = time.time()
+        return connection
+
+    def discard(self):
+        """Closes connection of the current thread, next use reconnects"""
+        connection = getattr(EEMysql.local, 'connection', None)
+        EEMysql.local.connection = None
+        if connection is None:
+            return
+        with EEMysql.lock:
+            if connection in EEMysql.opened:
+                EEMysql.opened.remove(connection)
+        try:
+            connection.close()
+        except Error:
+            pass
+
+    @staticmethod
+    def close_all():
+        with EEMysql.lock:
+            opened, EEMysql.opened[:] = list(EEMysql.opened), []
+        for connection in opened:
+            try:
+                connection.close()
+            except Error:
+                pass
+
+    @contextlib.contextmanager
+    def session(self):
+        """
+            Cursor on the connection of the current thread, committed when
+            the block completes and rolled back when it raises
+        """
+        connection = EEMysql.connection(self)
+        try:
+            cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            connection.commit()
+        except (AttributeError, Error) as e:
+            Log.debug(self, str(e))
+            try:
+                connection.rollback()
+            except Error:
+                # the connection itself failed, reconnect next time
+                EEMysql.discard(self)
+            raise StatementExcecutionError(str(e))
+        except BaseException:
+            connection.rollback()
+            raise
+
+    @EEProfile.timed('mysql', lambda self, statement, *args, **kw: statement)
     def execute(self, statement, errormsg='', log=True):
         """Get login details from ~/.my.cnf & Execute MySQL query"""
-        connection = EEMysql.connect(self)
         log and Log.debug(self, "Exceuting MySQL Statement : {0}"
                           .format(statement))
         try:
-            cursor = connection.cursor()
-            sql = statement
-            cursor.execute(sql)
+            with EEMysql.session(self) as cursor:
+                cursor.execute(statement)
+        finally:
+            # a failed grant may still have created the user
+            EEMysql.forget(self, [statement])
 
-            # connection is not autocommit by default.
-            # So you must commit to save your changes.
-            connection.commit()
-        except AttributeError as e:
-            Log.debug(self, str(e))
-            raise StatementExcecutionError
-        except Error as e:
-            Log.debug(self, str(e))
-            raise StatementExcecutionError
+    @EEProfile.timed('mysql', lambda self, statements, *args, **kw:
+                     '{0} statements'.format(len(statements)))
+    def execute_many(self, statements, errormsg='', log=True):
+        """
+            Execute statements one after another on one connection and
+            commit once. Raises StatementExcecutionError at the first one
+            that fails, statements after it are not run and what can be
+            is rolled back (DDL such as create database is committed by
+            MySQL as soon as it runs).
+        """
+        try:
+            with EEMysql.session(self) as cursor:
+                for statement in statements:
+                    log and Log.debug(self, "Exceuting MySQL Statement : {0}"
+                                      .format(statement))
+                    cursor.execute(statement)
         finally:
-            connection.close()
+            EEMysql.forget(self, statements)
+
+    def databases(self):
+        """Names of all databases, queried once and cached for the command"""
+        with EEMysql.lock:
+            if 'databases' in EEMysql.known:
+                return EEMysql.known['databases']
+        with EEMysql.session(self) as cursor:
+            cursor.execute("show databases")
+            databases = frozenset(row[0] for row in cursor.fetchall())
+        with EEMysql.lock:
+            EEMysql.known['databases'] = databases
+        return databases
+
+    def users(self):
+        """(user, host) of all accounts, queried once for the command"""
+        with EEMysql.lock:
+            if 'users' in EEMysql.known:
+                return EEMysql.known['users']
+        with EEMysql.session(self) as cursor:
+            cursor.execute("select user, host from mysql.user")
+            users = frozenset((row[0], row[1]) for row in cursor.fetchall())
+        with EEMysql.lock:
+            EEMysql.known['users'] = users
+        return users
+
+    def forget(self, statements=None):
+        """Drops cached databases and users when statements changed them"""
+        if statements is None or \
+           any(CHANGES_ACCOUNTS.match(statement) for statement in statements):
+            with EEMysql.lock:
+                EEMysql.known.clear()
 
-    def backupAll(self):
-        import subprocess
+    def database_sizes(self):
+        """(database, bytes of data and indexes) to back up, largest first"""
+        with EEMysql.session(self) as cursor:
+            cursor.execute("select table_schema, sum(data_length + "
+                           "index_length) from information_schema.tables "
+                           "group by table_schema")
+            sizes = dict((row[0], int(row[1] or 0))
+                         for row in cursor.fetchall())
+        return sorted(((name, sizes.get(name, 0))
+                       for name in EEMysql.databases(self)
+                       if name not in SKIP_BACKUP),
+                      key=lambda item: -item[1])
+
+    def backupAll(self, directory=BACKUP_DIR):
+        """
+            Dumps every database to <directory>/<name><date>.sql.gz, the
+            largest ones first and backup-workers of them at once, and
+            lists sizes, durations and SHA-256 of the files in
+            manifest<date>.json. Dumps run niced so sites stay responsive.
+        """
+        workers = max(int(mysql_option(self, 'backup-workers',
+                                       BACKUP_WORKERS)), 1)
+        level = int(mysql_option(self, 'backup-compression', BACKUP_LEVEL))
+        threads = max((os.cpu_count() or 1) // workers, 1)
+        Log.info(self, "Backing up database at location: {0}"
+                 .format(directory))
+        if not os.path.exists(directory):
+            Log.debug(self, 'Creating directory {0}'.format(directory))
+            os.makedirs(directory)
         try:
-            Log.info(self, "Backing up database at location: "
-                     "/var/ee-mysqlbackup")
-            # Setup Nginx common directory
-            if not os.path.exists('/var/ee-mysqlbackup'):
-                Log.debug(self, 'Creating directory'
-                          '/var/ee-mysqlbackup')
-                os.makedirs('/var/ee-mysqlbackup')
-
-            db = subprocess.check_output(["mysql -Bse \'show databases\'"],
-                                         universal_newlines=True,
-                                         shell=True).split('\n')
-            for dbs in db:
-                if dbs == "":
-                    continue
-                Log.info(self, "Backing up {0} database".format(dbs))
-                p1 = subprocess.Popen("mysqldump {0}"
-                                      " --max_allowed_packet=1024M"
-                                      " --single-transaction".format(dbs),
-                                      stdout=subprocess.PIPE,
-                                      stderr=subprocess.PIPE, shell=True)
-                p2 = subprocess.Popen("gzip -c > /var/ee-mysqlbackup/{0}{1}.s"
-                                      "ql.gz".format(dbs, EEVariables.ee_date),
-                                      stdin=p1.stdout,
-                                      shell=True)
-
-                # Allow p1 to receive a SIGPIPE if p2 exits
-                p1.stdout.close()
-                output = p1.stderr.read()
-                p1.wait()
-                if p1.returncode == 0:
-                    Log.debug(self, "done")
-                else:
-                    Log.error(self, output.decode("utf-8"))
-        except Exception as e:
-            Log.error(self, "Error: process exited with status %s"
-                            % e)
+            databases = EEMysql.database_sizes(self)
+        except (MySQLConnectionError, StatementExcecutionError) as e:
+            Log.debug(self, str(e))
+            Log.error(self, "Unable to list MySQL databases")
+
+        def backup(database):
+            Log.info(self, "Backing up {0} database".format(database))
+            with EEProfile.span('backup', database):
+                return dump_database(database, os.path.join(
+                    directory, "{0}{1}.sql.gz".format(database,
+                                                      EEVariables.ee_date)),
+                    level, threads)
+
+        start = time.time()
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [(name, size, executor.submit(backup, name))
+                       for name, size in databases]
+        results = []
+        failed = []
+        for name, size, future in futures:
+            try:
+                result = future.result()
+            except (BackupError, OSError) as e:
+                Log.debug(self, str(e))
+                failed.append(name)
+                continue
+            result['estimated_size'] = size
+            results.append(result)
+            Log.debug(self, "Backed up {0} in {1:.1f}s, {2} bytes"
+                      .format(name, result['duration'], result['size']))
+
+        duration = time.time() - start
+        manifest = os.path.join(directory, "manifest{0}.json"
+                                .format(EEVariables.ee_date))
+        with open(manifest, encoding='utf-8', mode='w') as f:
+            json.dump(dict(started=start, duration=duration, workers=workers,
+                           compression=level, databases=results,
+                           failed=failed), f, indent=2)
+        Log.info(self, "Backed up {0} databases, {1:.1f} MB in {2:.1f}s"
+                 .format(len(results),
+                         sum(result['size'] for result in results) / 1048576,
+                         duration))
+        if failed:
+            Log.error(self, "Unable to back up {0}".format(", ".join(failed)))
 
     def check_db_exists(self, db_name):
         try:
-            if EEMysql.dbConnection(self, db_name):
-                return True
-        except DatabaseNotExistsError as e:
+            return db_name in EEMysql.databases(self)
+        except StatementExcecutionError as e:
+            Log.debug(self, str(e))
+            return False
+        except MySQLConnectionError as e:
+            Log.debug(self, str(e))
+            return False
+
+    def check_user_exists(self, user, host=None):
+        """True if user exists, at host when given"""
+        try:
+            return any(name == user and (host is None or at == host)
+                       for name, at in EEMysql.users(self))
+        except StatementExcecutionError as e:
             Log.debug(self, str(e))
             return False
         except MySQLConnectionError as e:
@@ -1,8 +1,7 @@
 """EasyEngine Hash bucket calculate function for Nginx"""
-from ee.core.fileutils import EEFileUtils
+from ee.core.fileutils import EEFileUtils, replace_file
 import math
 import os
-import fileinput
 import re
 import subprocess
 
@@ -30,11 +29,12 @@ def hashbucket(self):
     # Replace hashbucket in Nginx.conf file
     if EEFileUtils.grep(self, "/etc/nginx/nginx.conf",
                         "server_names_hash_bucket_size"):
-        for line in fileinput.FileInput("/etc/nginx/nginx.conf", inplace=1):
-            if "server_names_hash_bucket_size" in line:
-                print("\tserver_names_hash_bucket_size {0};".format(ngx_hash))
-            else:
-                print(line, end='')
+        with open("/etc/nginx/nginx.conf", encoding='utf-8', mode='r') as f:
+            lines = f.readlines()
+        replace_file("/etc/nginx/nginx.conf", ''.join(
+            "\tserver_names_hash_bucket_size {0};\n".format(ngx_hash)
+            if "server_names_hash_bucket_size" in line else line
+            for line in lines))
 
     else:
         EEFileUtils.searchreplace(self, '/etc/nginx/nginx.conf',
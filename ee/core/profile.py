@@ -0,0 +1,191 @@
+"""EasyEngine timing spans of slow operations, enabled by --profile."""
+import collections
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+# Operations listed in the summary printed at exit
+SLOWEST = 15
+
+
+class EEProfile():
+    """
+        Records a span for every shell command, MySQL statement, apt-get
+        run, service action, git commit, download and template render.
+
+        --profile prints a summary when ee exits,
+        --profile-trace=<file> also writes the spans as Chrome trace
+        events (chrome://tracing, https://ui.perfetto.dev) and
+        --profile-stats=<file> a cProfile dump of the whole run.
+
+        Without --profile only the count and total time of every kind
+        are kept in phases, they are recorded in the command history.
+    """
+    enabled = False
+    started = None
+    spans = []
+    trace_file = None
+    stats_file = None
+    profiler = None
+    phases = {}
+    lock = threading.Lock()
+    active = threading.local()
+
+    @classmethod
+    def from_argv(cls, argv):
+        """Removes profile options from argv and enables them"""
+        enable = False
+        options = dict(trace_file=None, stats_file=None)
+        for arg in list(argv):
+            if arg == '--profile':
+                enable = True
+            elif arg.startswith('--profile-trace='):
+                options['trace_file'] = arg.split('=', 1)[1]
+            elif arg.startswith('--profile-stats='):
+                options['stats_file'] = arg.split('=', 1)[1]
+            else:
+                continue
+            argv.remove(arg)
+        if enable or options['trace_file'] or options['stats_file']:
+            cls.enable(**options)
+        return cls.enabled
+
+    @classmethod
+    def enable(cls, trace_file=None, stats_file=None):
+        cls.enabled = True
+        cls.started = time.time()
+        cls.spans = []
+        cls.trace_file = trace_file
+        cls.stats_file = stats_file
+        if stats_file:
+            import cProfile
+            cls.profiler = cProfile.Profile()
+            cls.profiler.enable()
+
+    @classmethod
+    @contextlib.contextmanager
+    def span(cls, kind, detail=None):
+        """Records time spent in the with block"""
+        kinds = getattr(cls.active, 'kinds', None)
+        if kinds is None:
+            kinds = cls.active.kinds = set()
+        # a MySQL statement opening its connection counts once in phases
+        outer = kind not in kinds
+        kinds.add(kind)
+        start = time.time()
+        failed = True
+        try:
+            yield
+            failed = False
+        finally:
+            duration = time.time() - start
+            if outer:
+                kinds.discard(kind)
+                with cls.lock:
+                    count, total = cls.phases.get(kind, (0, 0.0))
+                    cls.phases[kind] = (count + 1, total + duration)
+            if cls.enabled:
+                cls.spans.append((kind, str(detail), start, duration,
+                                  threading.current_thread().ident, failed))
+
+    @classmethod
+    def timed(cls, kind, detail=None):
+        """
+            Decorator recording a span around every call, detail is called
+            with the arguments of the call and names what it worked on
+        """
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not cls.enabled:
+                    name = None
+                elif detail:
+                    name = detail(*args, **kwargs)
+                else:
+                    name = function.__name__
+                with cls.span(kind, name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @classmethod
+    def summary(cls):
+        """Lines of the report printed at exit"""
+        elapsed = time.time() - cls.started
+        spans = cls.spans
+        lines = ["Profile: {0:.2f}s total, {1} spans"
+                 .format(elapsed, len(spans))]
+        if not spans:
+            return lines
+        kinds = collections.OrderedDict()
+        operations = {}
+        for kind, detail, start, duration, thread, failed in spans:
+            stats = kinds.setdefault(kind, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            key = (kind, detail)
+            stats = operations.setdefault(key, [0, 0.0, failed])
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = stats[2] or failed
+        lines.append("{0:12}{1:>7}{2:>10}{3:>10}{4:>10}{5:>7}"
+                     .format("kind", "count", "total", "mean", "max",
+                             "share"))
+        for kind, (count, total, longest) in sorted(
+                kinds.items(), key=lambda item: -item[1][1]):
+            lines.append("{0:12}{1:>7}{2:>9.2f}s{3:>9.3f}s{4:>9.2f}s"
+                         "{5:>6.1f}%"
+                         .format(kind, count, total, total / count, longest,
+                                 100.0 * total / max(elapsed, 0.001)))
+        lines.append("Slowest operations")
+        for (kind, detail), (count, total, failed) in sorted(
+                operations.items(), key=lambda item: -item[1][1])[:SLOWEST]:
+            detail = ' '.join(detail.split())
+            if len(detail) > 100:
+                detail = detail[:97] + '...'
+            lines.append("{0:>9.2f}s {1:>4}x {2:8} {3}{4}"
+                         .format(total, count, kind, detail,
+                                 " (failed)" if failed else ""))
+        return lines
+
+    @classmethod
+    def write_trace(cls, path):
+        """Writes spans as Chrome trace event JSON"""
+        pid = os.getpid()
+        events = []
+        for kind, detail, start, duration, thread, failed in cls.spans:
+            events.append(dict(name=' '.join(detail.split())[:80], cat=kind,
+                               ph='X', pid=pid, tid=thread,
+                               ts=int((start - cls.started) * 1000000),
+                               dur=int(duration * 1000000),
+                               args=dict(detail=detail, failed=failed)))
+        with open(path, encoding='utf-8', mode='w') as f:
+            json.dump(dict(traceEvents=events, displayTimeUnit='ms'), f)
+
+    @classmethod
+    def report(cls, out=None):
+        """Prints summary and writes trace and cProfile files"""
+        if not cls.enabled:
+            return
+        out = out or sys.stderr
+        if cls.profiler is not None:
+            cls.profiler.disable()
+        for line in cls.summary():
+            print(line, file=out)
+        try:
+            if cls.trace_file:
+                cls.write_trace(cls.trace_file)
+                print("Trace written to {0}".format(cls.trace_file),
+                      file=out)
+            if cls.profiler is not None:
+                cls.profiler.dump_stats(cls.stats_file)
+                print("cProfile stats written to {0}".format(cls.stats_file),
+                      file=out)
+        except (IOError, OSError) as e:
+            print("Unable to write profile: {0}".format(e), file=out)
+        cls.enabled = False
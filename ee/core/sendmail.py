@@ -1,33 +1,114 @@
 import smtplib
 import os
+import io
+import gzip
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.utils import COMMASPACE, formatdate
 from email import encoders
 
+# Bytes read from an attached file at once
+CHUNK_SIZE = 1024 * 1024
+
+
+def _gzip_stream(src, limit=None):
+    """
+        Compresses rest of file object src into memory chunk by chunk,
+        returns (data, bytes read), data is None once output exceeds limit
+    """
+    buf = io.BytesIO()
+    read = 0
+    with gzip.GzipFile(fileobj=buf, mode='wb') as gz:
+        while 1:
+            chunk = src.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            gz.write(chunk)
+            read += len(chunk)
+            if limit and buf.tell() > limit:
+                return (None, read)
+    if limit and buf.tell() > limit:
+        return (None, read)
+    return (buf.getvalue(), read)
+
+
+def gzip_attachment(path, limit=None):
+    """
+        Returns attachment dict of gzipped file: name, data, size (of the
+        original file), excerpt.
+        When the compressed file exceeds limit bytes only its last lines
+        are attached, as <name>.tail.gz with excerpt set to True.
+    """
+    name = os.path.basename(path)
+    size = os.path.getsize(path)
+    with open(path, 'rb') as src:
+        data, read = _gzip_stream(src, limit)
+        if data is not None:
+            return dict(name=name + '.gz', data=data, size=size,
+                        excerpt=False)
+
+        # about read bytes compressed to limit, start a bit below that
+        tail = int(read * 0.9)
+        while tail > 0:
+            src.seek(max(size - tail, 0))
+            if size > tail:
+                src.readline()  # skip partial line
+            data, read = _gzip_stream(src, limit)
+            if data is not None:
+                return dict(name=name + '.tail.gz', data=data, size=size,
+                            excerpt=True)
+            tail //= 2
+    return dict(name=name + '.tail.gz', data=gzip.compress(b''), size=size,
+                excerpt=True)
+
+
+def log_attachments(files, max_size=None):
+    """
+        Gzipped attachments for files, max_size bytes of compressed data
+        are shared evenly among files, larger ones are cut to their tail
+    """
+    limit = max_size // len(files) if (max_size and files) else None
+    return [gzip_attachment(f, limit) for f in files]
+
+
+def EESendMail(send_from, send_to, subject, text, files=[], server="localhost",
+               port=587, username='', password='', isTls=True,
+               attachments=None):
+    """
+        Sends mail with files attached to one or more recipients.
+        The message is built once and delivered to all of send_to (address
+        or list of addresses) in a single SMTP session.
+        Files are attached gzipped, attachments prepared with
+        log_attachments can be passed instead.
+    """
+    if isinstance(send_to, str):
+        send_to = [send_to]
+    if attachments is None:
+        attachments = log_attachments(files)
 
-def EESendMail(send_from, send_to, subject, text, files, server="localhost",
-               port=587, username='', password='', isTls=True):
     msg = MIMEMultipart()
     msg['From'] = send_from
-    msg['To'] = send_to
+    msg['To'] = COMMASPACE.join(send_to)
     msg['Date'] = formatdate(localtime=True)
     msg['Subject'] = subject
 
     msg.attach(MIMEText(text))
 
-    for f in files:
-        part = MIMEBase('application', "octet-stream")
-        part.set_payload(open(f, "rb").read())
+    for attachment in attachments:
+        part = MIMEBase('application', "gzip")
+        part.set_payload(attachment['data'])
         encoders.encode_base64(part)
         part.add_header('Content-Disposition', 'attachment; filename="{0}"'
-                        .format(os.path.basename(f)))
+                        .format(attachment['name']))
         msg.attach(part)
 
     smtp = smtplib.SMTP(server, port)
-    if isTls:
-        smtp.starttls()
-
-    smtp.sendmail(send_from, send_to, msg.as_string())
-    smtp.quit()
+    try:
+        if isTls:
+            smtp.starttls()
+        if username:
+            smtp.login(username, password)
+        smtp.sendmail(send_from, send_to, msg.as_string())
+    finally:
+        smtp.quit()
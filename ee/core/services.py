@@ -4,6 +4,7 @@ import sys
 import subprocess
 from subprocess import Popen
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
 import pystache
 
 
@@ -12,6 +13,7 @@ class EEService():
     def ___init__():
         pass
 
+    @EEProfile.timed('service', lambda self, name: 'start ' + name)
     def start_service(self, service_name):
         """
             start service
@@ -38,6 +40,7 @@ class EEService():
             Log.error(self, "\nFailed to start service   {0}"
                       .format(service_name))
 
+    @EEProfile.timed('service', lambda self, name: 'stop ' + name)
     def stop_service(self, service_name):
         """
             Stop service
@@ -59,6 +62,7 @@ class EEService():
             Log.error(self, "\nFailed to stop service : {0}"
                       .format(service_name))
 
+    @EEProfile.timed('service', lambda self, name: 'restart ' + name)
     def restart_service(self, service_name):
         """
             Restart service
@@ -85,6 +89,7 @@ class EEService():
             Log.error(self, "\nFailed to restart service : {0}"
                       .format(service_name))
 
+    @EEProfile.timed('service', lambda self, name: 'reload ' + name)
     def reload_service(self, service_name):
         """
             Stop service
@@ -111,6 +116,7 @@ class EEService():
             Log.error(self, "\nFailed to reload service {0}"
                       .format(service_name))
 
+    @EEProfile.timed('service', lambda self, name: 'status ' + name)
     def get_service_status(self, service_name):
         try:
             is_exist = subprocess.getstatusoutput('which {0}'
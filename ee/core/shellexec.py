@@ -1,8 +1,28 @@
 """EasyEngine shell executaion functions."""
 from ee.core.logging import Log
+from ee.core.profile import EEProfile
+import collections
+import concurrent.futures
 import os
-import sys
+import re
+import shlex
+import signal
 import subprocess
+import sys
+import threading
+import time
+
+# Strings without any of these are split and run without /bin/sh
+SHELL_SYNTAX = re.compile(r'[|&;<>()$`\\"\'*?[\]{}~#!\n]')
+SHELL_BUILTINS = ('cd', 'source', '.', 'export', 'set', 'unset', 'ulimit',
+                  'umask', 'exec', 'eval', 'alias', 'read', 'trap')
+
+# Lines of output kept in CommandResult.output
+TAIL_LINES = 50
+# Bytes read at once, longer lines are logged in parts
+LINE_LIMIT = 64 * 1024
+# Commands run at once by cmd_exec_many
+WORKERS = 4
 
 
 class CommandExecutionError(Exception):
@@ -10,36 +30,158 @@ class CommandExecutionError(Exception):
     pass
 
 
+class CommandResult():
+    """
+        Outcome of a command run by EEShellExec, true when it exited with 0
+        so it can be tested like the boolean cmd_exec used to return
+    """
+
+    def __init__(self, command, returncode, duration, output,
+                 timed_out=False):
+        self.command = command
+        self.returncode = returncode
+        self.duration = duration
+        self.output = output
+        self.timed_out = timed_out
+
+    def __bool__(self):
+        return self.returncode == 0
+
+    def __repr__(self):
+        return '<CommandResult {0!r} rc={1} {2:.2f}s>'.format(
+            self.command, self.returncode, self.duration)
+
+
+def command_argv(command):
+    """
+        Returns argv to run command with, argv lists are used as they are,
+        strings without shell syntax are split, None if /bin/sh is needed
+    """
+    if not isinstance(command, str):
+        return [str(arg) for arg in command]
+    if SHELL_SYNTAX.search(command):
+        return None
+    argv = command.split()
+    if not argv or argv[0] in SHELL_BUILTINS or '=' in argv[0]:
+        return None
+    return argv
+
+
+def command_text(command):
+    if isinstance(command, str):
+        return command
+    return ' '.join(shlex.quote(str(arg)) for arg in command)
+
+
 class EEShellExec():
     """Method to run shell commands"""
     def __init__():
         pass
 
-    def cmd_exec(self, command, errormsg='', log=True):
-        """Run shell command from Python"""
+    @EEProfile.timed('shell',
+                     lambda self, command, *args, **kw: command_text(command))
+    def cmd_exec(self, command, errormsg='', log=True, timeout=None,
+                 env=None, prefix='', cwd=None):
+        """
+            Run command, an argv list or a shell command string, from
+            Python. Output is streamed to the debug log line by line (only
+            when log is set, commands with passwords pass log=False) with
+            prefix in front, the process group is killed after timeout
+            seconds and env entries are added to the environment. cwd runs
+            the command in that directory without changing the one of ee,
+            which threads share. Returns CommandResult.
+        """
+        text = command_text(command)
+        argv = command_argv(command)
+        log and Log.debug(self, "Running command: {0}".format(text))
+        if env:
+            env = dict(os.environ, **env)
+
+        start = time.time()
+        tail = collections.deque(maxlen=TAIL_LINES)
+        timer = None
+        timed_out = []
         try:
-            log and Log.debug(self, "Running command: {0}".format(command))
-
-            with subprocess.Popen([command], stdout=subprocess.PIPE,
-                                  stderr=subprocess.PIPE, shell=True) as proc:
-                (cmd_stdout_bytes, cmd_stderr_bytes) = proc.communicate()
-                (cmd_stdout, cmd_stderr) = (cmd_stdout_bytes.decode('utf-8',
-                                            "replace"),
-                                            cmd_stderr_bytes.decode('utf-8',
-                                            "replace"))
-
-            if proc.returncode == 0:
-                return True
-            else:
-                Log.debug(self, "Command Output: {0}, \nCommand Error: {1}"
-                                .format(cmd_stdout, cmd_stderr))
-                return False
+            try:
+                proc = subprocess.Popen(argv if argv is not None else text,
+                                        shell=argv is None, env=env,
+                                        cwd=cwd,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        start_new_session=bool(timeout))
+            except FileNotFoundError as e:
+                if not isinstance(command, str):
+                    raise
+                # what /bin/sh reports for a missing command
+                Log.debug(self, str(e))
+                return CommandResult(text, 127, time.time() - start,
+                                     str(e))
+
+            if timeout:
+                def kill():
+                    timed_out.append(True)
+                    try:
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    except OSError:
+                        pass
+                timer = threading.Timer(timeout, kill)
+                timer.daemon = True
+                timer.start()
+            with proc:
+                for line in iter(lambda: proc.stdout.readline(LINE_LIMIT),
+                                 b''):
+                    line = line.decode('utf-8', 'replace').rstrip('\n')
+                    tail.append(line)
+                    log and Log.debug(self, prefix + line)
+                proc.wait()
         except OSError as e:
                 Log.debug(self, str(e))
                 raise CommandExecutionError
         except Exception as e:
                 Log.debug(self, str(e))
                 raise CommandExecutionError
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        result = CommandResult(text, proc.returncode, time.time() - start,
+                               '\n'.join(tail), bool(timed_out))
+        if result.timed_out:
+            Log.debug(self, "Command timed out after {0}s{1}"
+                      .format(timeout, ": " + text if log else ""))
+        elif not result:
+            if log:
+                Log.debug(self, "Command exited with {0}"
+                          .format(result.returncode))
+            else:
+                Log.debug(self, "Command exited with {0}, output: {1}"
+                          .format(result.returncode, result.output))
+        return result
+
+    def cmd_exec_many(self, commands, errormsg='', log=True, timeout=None,
+                      env=None, workers=WORKERS):
+        """
+            Run independent commands concurrently, at most workers at once,
+            output of every command is logged with [index] in front.
+            Returns CommandResult of every command, in order of commands.
+            Raises CommandExecutionError once all have finished if any of
+            them could not be started.
+        """
+        if not commands:
+            return []
+        workers = max(min(workers, len(commands)), 1)
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            futures = [executor.submit(EEShellExec.cmd_exec, self, command,
+                                       errormsg, log, timeout, env,
+                                       '[{0}] '.format(index))
+                       for index, command in enumerate(commands)]
+            concurrent.futures.wait(futures)
+        results = []
+        for future in futures:
+            if future.exception() is not None:
+                raise CommandExecutionError
+            results.append(future.result())
+        return results
 
     def invoke_editor(self, filepath, errormsg=''):
         """
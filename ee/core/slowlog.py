@@ -0,0 +1,338 @@
+"""EasyEngine MySQL slow log importer for Anemometer."""
+import hashlib
+import math
+import re
+import time
+import pymysql
+from ee.core.logging import Log
+from ee.core.logcursor import LogCursor
+
+# Where the last import stopped, so every run only reads new entries
+EE_SLOW_LOG_CHECKPOINT = '/var/lib/ee/mysql-slow.checkpoint'
+
+# Numeric attributes of an entry kept in global_query_review_history,
+# every one of them as _sum, _min, _max, _pct_95, _stddev and _median
+ATTRIBUTES = ['Query_time', 'Lock_time', 'Rows_sent', 'Rows_examined']
+
+# Rows sent to MySQL per INSERT statement
+BATCH_SIZE = 500
+# Bytes of the log read, imported and checkpointed at a time
+READ_SIZE = 16 * 1024 * 1024
+
+HEADER = re.compile(r'^# (?:Time|User@Host): ', re.M)
+ATTRIBUTE = re.compile(r'(\w+): (\S+)')
+USER_HOST = re.compile(r'^# User@Host: (\S+?)\[[^\]]*\] @ (\S*) '
+                       r'\[([^\]]*)\]')
+TIME_OLD = re.compile(r'^# Time: (\d{6}\s+\d{1,2}:\d\d:\d\d)')
+TIME_ISO = re.compile(r'^# Time: (\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)')
+USE_DB = re.compile(r'^use (`?)(\S+?)\1;$', re.I)
+SET_TIMESTAMP = re.compile(r'^SET timestamp=(\d+);$', re.I)
+
+# Query normalisation, close to pt-query-digest's fingerprint
+FP_COMMENTS = re.compile(r'/\*.*?\*/|(?:--|#)[^\n]*', re.S)
+FP_STRINGS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"",
+                        re.S)
+FP_NUMBERS = re.compile(r'\b(?:0x[0-9a-f]+|[-+]?\d+(?:\.\d+)?'
+                        r'(?:e[-+]?\d+)?)\b', re.I)
+FP_NULL = re.compile(r'\bnull\b')
+FP_SPACE = re.compile(r'\s+')
+FP_LIST = r'\(\s*\?(?:\s*,\s*\?)*\s*\)'
+FP_IN_LIST = re.compile(r'\bin\s*' + FP_LIST)
+FP_VALUES = re.compile(r'\b(values?)\s*' + FP_LIST +
+                       r'(?:\s*,\s*' + FP_LIST + ')*')
+FP_LIMIT = re.compile(r'\blimit \?(?:\s*,\s*\?| offset \?)?')
+
+
+def fingerprint(query):
+    """Abstracts query, literals become ? and lists of them ?+"""
+    query = query.strip().rstrip(';').strip()
+    if query[:4].lower() == 'call':
+        return FP_SPACE.sub(' ', query.split('(', 1)[0]).lower()
+    query = FP_COMMENTS.sub(' ', query)
+    query = FP_STRINGS.sub('?', query)
+    query = FP_SPACE.sub(' ', query).strip().lower()
+    query = FP_NUMBERS.sub('?', query)
+    query = FP_NULL.sub('?', query)
+    query = FP_IN_LIST.sub('in(?+)', query)
+    query = FP_VALUES.sub(lambda m: m.group(1) + '(?+)', query)
+    query = FP_LIMIT.sub('limit ?', query)
+    return query
+
+
+def checksum(fp):
+    """Checksum of fingerprint as stored by pt-query-digest"""
+    digest = hashlib.md5(fp.encode('utf-8', 'surrogateescape'))
+    return int(digest.hexdigest()[-16:], 16)
+
+
+def parse_entries(data):
+    """
+        Parses slow log text, yields (end offset, entry), entry is a dict
+        of ts, user, host, db, attrs (dict of floats) and query.
+        The trailing entry is held back while its query is not terminated,
+        MySQL might still be writing it.
+    """
+    starts = []
+    previous = None
+    for match in HEADER.finditer(data):
+        # '# Time:' line belongs to the '# User@Host:' entry below it
+        if (previous is not None and match.group(0) == '# User@Host: ' and
+           data.find('\n', previous.start()) + 1 == match.start()):
+            previous = None
+            continue
+        starts.append(match.start())
+        previous = match if match.group(0) == '# Time: ' else None
+    for index, start in enumerate(starts):
+        end = starts[index + 1] if index + 1 < len(starts) else len(data)
+        block = data[start:end]
+        if end == len(data) and not block.rstrip().endswith(';'):
+            return
+        entry = dict(ts=None, user='', host='', db=None, attrs={}, query='')
+        query = []
+        for line in block.split('\n'):
+            if line.startswith('#'):
+                match = USER_HOST.match(line)
+                if match:
+                    entry['user'] = match.group(1)
+                    entry['host'] = match.group(2) or match.group(3)
+                    continue
+                match = TIME_ISO.match(line) or TIME_OLD.match(line)
+                if match:
+                    entry['ts'] = parse_time(match.group(1))
+                    continue
+                for key, value in ATTRIBUTE.findall(line):
+                    try:
+                        entry['attrs'][key] = float(value)
+                    except ValueError:
+                        if key == 'Schema':
+                            entry['db'] = value
+                continue
+            match = SET_TIMESTAMP.match(line)
+            if match:
+                entry['ts'] = int(match.group(1))
+                continue
+            match = USE_DB.match(line)
+            if match:
+                entry['db'] = match.group(2)
+                continue
+            if (line.endswith('started with:') or
+               line.startswith(('Tcp port:', 'Time ')) and not query):
+                # header written by mysqld when it (re)opens the log
+                continue
+            query.append(line)
+        entry['query'] = '\n'.join(query).strip()
+        if entry['query']:
+            yield (end, entry)
+
+
+def parse_time(value):
+    """Epoch of '# Time:' header, 150801 10:15:00 or 2015-08-01T10:15:00"""
+    if 'T' in value:
+        return time.mktime(time.strptime(value, '%Y-%m-%dT%H:%M:%S'))
+    return time.mktime(time.strptime(' '.join(value.split()),
+                                     '%y%m%d %H:%M:%S'))
+
+
+class QueryClass():
+    """Statistics of all entries with the same fingerprint"""
+
+    def __init__(self, fp):
+        self.fingerprint = fp
+        self.checksum = checksum(fp)
+        self.sample = None
+        self.sample_time = -1
+        self.db = None
+        self.ts_min = None
+        self.ts_max = None
+        self.count = 0
+        self.values = dict((attr, []) for attr in ATTRIBUTES)
+
+    def add(self, entry):
+        self.count += 1
+        ts = entry['ts']
+        if ts is not None:
+            self.ts_min = ts if self.ts_min is None else min(self.ts_min, ts)
+            self.ts_max = ts if self.ts_max is None else max(self.ts_max, ts)
+        for attr in ATTRIBUTES:
+            if attr in entry['attrs']:
+                self.values[attr].append(entry['attrs'][attr])
+        # like pt-query-digest, the slowest query is the sample
+        query_time = entry['attrs'].get('Query_time', 0)
+        if query_time > self.sample_time:
+            self.sample_time = query_time
+            self.sample = (entry['query'].encode('utf-8', 'surrogateescape')
+                           .decode('utf-8', 'replace'))
+        if entry['db']:
+            self.db = entry['db']
+
+    @staticmethod
+    def summary(values):
+        """sum, min, max, pct_95, stddev, median of values"""
+        if not values:
+            return [None] * 6
+        values = sorted(values)
+        count = len(values)
+        total = sum(values)
+        mean = total / count
+        stddev = math.sqrt(sum((v - mean) ** 2 for v in values) / count)
+        pct_95 = values[max(int(math.ceil(count * 0.95)) - 1, 0)]
+        median = values[(count - 1) // 2]
+        return [total, values[0], values[-1], pct_95, stddev, median]
+
+
+def datetime_of(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S',
+                         time.localtime(ts if ts is not None else time.time()))
+
+
+def connect(config):
+    """Connection to the Anemometer database described by config"""
+    return pymysql.connect(host=config['host'],
+                           port=int(config['port'] or 3306),
+                           user=config['user'], passwd=config['password'],
+                           db='slow_query_log', charset='utf8')
+
+
+def anemometer_config(path):
+    """Reads host, port, user and password from Anemometer config.inc.php"""
+    with open(path, encoding='utf-8', mode='r') as f:
+        content = f.read()
+    config = {}
+    for key in ('host', 'port', 'user', 'password'):
+        match = re.search(r"'{0}'\s*=>\s*'([^']*)'".format(key), content)
+        config[key] = match.group(1) if match else ''
+    return config
+
+
+class EESlowLog():
+    """Incremental import of MySQL slow log into Anemometer tables"""
+
+    def parse(self, data, since=None):
+        """
+            Returns (classes, consumed): QueryClass of entries in data, by
+            fingerprint, and bytes of data to commit to the cursor once
+            they are imported. Entries logged at or before since are left
+            out.
+        """
+        # undecodable bytes are kept as they are so offsets in text map
+        # back to the file
+        text = data.decode('utf-8', 'surrogateescape')
+        classes = {}
+        consumed = 0
+        for end, entry in parse_entries(text):
+            consumed = end
+            if since is not None and entry['ts'] is not None and \
+               entry['ts'] <= since:
+                continue
+            fp = fingerprint(entry['query'])
+            cls = classes.get(fp)
+            if cls is None:
+                cls = classes[fp] = QueryClass(fp)
+            cls.add(entry)
+        consumed = len(text[:consumed].encode('utf-8', 'surrogateescape'))
+        return (classes, consumed)
+
+    def last_imported(self, connection, host):
+        """Epoch of the newest entry imported for host, None if none was"""
+        cursor = connection.cursor()
+        cursor.execute("SELECT MAX(ts_max) FROM global_query_review_history "
+                       "WHERE hostname_max = %s", (host,))
+        row = cursor.fetchone()
+        if not row or row[0] is None:
+            return None
+        return time.mktime(row[0].timetuple())
+
+    def save(self, connection, classes, host):
+        """Inserts query classes into the review tables and commits"""
+        review = []
+        history = []
+        for cls in classes.values():
+            review.append((cls.checksum, cls.fingerprint, cls.sample,
+                           datetime_of(cls.ts_min),
+                           datetime_of(cls.ts_max)))
+            row = [host, cls.db, cls.checksum, cls.sample,
+                   datetime_of(cls.ts_min), datetime_of(cls.ts_max),
+                   cls.count]
+            for attr in ATTRIBUTES:
+                row.extend(QueryClass.summary(cls.values[attr]))
+            history.append(row)
+
+        columns = ['hostname_max', 'db_max', 'checksum', 'sample',
+                   'ts_min', 'ts_max', 'ts_cnt']
+        for attr in ATTRIBUTES:
+            columns.extend('{0}_{1}'.format(attr, stat) for stat in
+                           ('sum', 'min', 'max', 'pct_95', 'stddev',
+                            'median'))
+        cursor = connection.cursor()
+        # executemany folds rows into multi-row INSERT statements
+        for start in range(0, len(review), BATCH_SIZE):
+            cursor.executemany(
+                "INSERT INTO global_query_review (checksum, "
+                "fingerprint, sample, first_seen, last_seen) "
+                "VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE "
+                "first_seen = LEAST(COALESCE(first_seen, "
+                "VALUES(first_seen)), VALUES(first_seen)), "
+                "last_seen = GREATEST(COALESCE(last_seen, "
+                "VALUES(last_seen)), VALUES(last_seen))",
+                review[start:start + BATCH_SIZE])
+        for start in range(0, len(history), BATCH_SIZE):
+            cursor.executemany(
+                "INSERT INTO global_query_review_history ({0}) "
+                "VALUES ({1}) ON DUPLICATE KEY UPDATE {2}"
+                .format(', '.join(columns),
+                        ', '.join(['%s'] * len(columns)),
+                        ', '.join('{0} = VALUES({0})'.format(col)
+                                  for col in columns[3:])),
+                history[start:start + BATCH_SIZE])
+        connection.commit()
+
+    def import_log(self, logfile, config, hostname=None,
+                   read_size=READ_SIZE):
+        """
+            Imports entries of logfile written since the previous run,
+            read_size bytes at a time with the checkpoint saved after
+            each part, returns number of query classes imported.
+
+            Without a checkpoint entries up to the newest one already in
+            Anemometer are skipped, so they are not imported twice.
+        """
+        host = hostname or config['host']
+        cursor = LogCursor(logfile, EE_SLOW_LOG_CHECKPOINT)
+        connection = None
+        since = None
+        imported = 0
+        try:
+            if not cursor.load():
+                connection = connect(config)
+                since = EESlowLog.last_imported(self, connection, host)
+                Log.debug(self, "No checkpoint for {0}, importing entries "
+                          "after {1}".format(logfile, datetime_of(since)
+                                             if since else "the start"))
+            size = read_size
+            while True:
+                data = cursor.read(size)
+                classes, consumed = EESlowLog.parse(self, data, since)
+                if not consumed:
+                    # nothing, an entry still being written or one larger
+                    # than a read, which would stop every run right here
+                    if not cursor.limited:
+                        break
+                    size *= 2
+                    Log.warn(self, "Entry of {0} larger than {1:.1f} MB, "
+                             "reading {2:.1f} MB at a time"
+                             .format(logfile, size / 2 / 1048576,
+                                     size / 1048576))
+                    continue
+                size = read_size
+                if classes:
+                    if connection is None:
+                        connection = connect(config)
+                    EESlowLog.save(self, connection, classes, host)
+                cursor.commit(consumed)
+                imported += len(classes)
+                Log.debug(self, "{0} query classes in {1} bytes of {2}"
+                          .format(len(classes), consumed, logfile))
+        finally:
+            if connection is not None:
+                connection.close()
+        return imported
@@ -0,0 +1,112 @@
+"""EasyEngine scheduler of tasks with dependencies."""
+from ee.core.logging import Log
+from ee.core.profile import EEProfile
+import collections
+import concurrent.futures
+import time
+
+
+class TaskError(Exception):
+    """Raised by EETaskGraph.run when a task failed"""
+    def __init__(self, task, error):
+        self.task = task
+        self.error = error
+
+    def __str__(self):
+        return "task {0} failed: {1}".format(self.task, self.error)
+
+
+class EETaskGraph():
+    """
+        Tasks with the tasks they require, run on a thread pool as soon
+        as everything they require has finished.
+
+        >>> graph = EETaskGraph()
+        >>> graph.add('nginx', setup_nginx)
+        >>> graph.add('database', setup_database)
+        >>> graph.add('wordpress', setup_wordpress,
+        ...           requires=['nginx', 'database'])
+        >>> graph.run(self)
+
+        When a task fails no further task is started, the running ones
+        are waited for and TaskError is raised, tasks which completed are
+        listed in done so the caller can roll back what they did.
+    """
+
+    def __init__(self):
+        self.tasks = collections.OrderedDict()
+        self.done = []
+        self.timings = collections.OrderedDict()
+
+    def add(self, name, function, requires=()):
+        """function is called without arguments"""
+        if name in self.tasks:
+            raise ValueError("task {0} added twice".format(name))
+        self.tasks[name] = (function, list(requires))
+
+    def check(self):
+        """Raises ValueError for unknown requirements and cycles"""
+        for name, (function, requires) in self.tasks.items():
+            for required in requires:
+                if required not in self.tasks:
+                    raise ValueError("task {0} requires unknown task {1}"
+                                     .format(name, required))
+        done = set()
+        pending = dict(self.tasks)
+        while pending:
+            ready = [name for name, (function, requires) in pending.items()
+                     if done.issuperset(requires)]
+            if not ready:
+                raise ValueError("tasks {0} require each other"
+                                 .format(", ".join(sorted(pending))))
+            for name in ready:
+                done.add(name)
+                del pending[name]
+
+    def run_task(self, name):
+        start = time.time()
+        with EEProfile.span('task', name):
+            self.tasks[name][0]()
+        return time.time() - start
+
+    def run(self, app, workers=4):
+        """
+            Runs all tasks, at most workers at once, app is the controller
+            used for logging. Returns timings, dict of task: seconds.
+        """
+        self.check()
+        pending = collections.OrderedDict(self.tasks)
+        running = {}
+        failed = None
+        with concurrent.futures.ThreadPoolExecutor(max(workers, 1)) as pool:
+            while pending or running:
+                if failed is None:
+                    for name in [name for name, (function, requires)
+                                 in pending.items()
+                                 if set(self.done).issuperset(requires)]:
+                        del pending[name]
+                        Log.debug(app, "Starting task {0}".format(name))
+                        running[pool.submit(self.run_task, name)] = name
+                if not running:
+                    break
+                finished, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        self.timings[name] = future.result()
+                        self.done.append(name)
+                        Log.debug(app, "Task {0} done in {1:.2f}s"
+                                  .format(name, self.timings[name]))
+                    except BaseException as e:
+                        Log.debug(app, "Task {0} failed: {1}"
+                                  .format(name, e))
+                        if failed is None:
+                            failed = (name, e)
+        if failed is not None:
+            name, error = failed
+            if not isinstance(error, Exception):
+                # SystemExit of Log.error() within a task
+                raise error
+            raise TaskError(name, error)
+        return self.timings
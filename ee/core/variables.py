@@ -1,34 +1,63 @@
 """EasyEngine core variable module"""
-import platform
-import socket
 import configparser
+import datetime
+import json
 import os
 import sys
-import psutil
-import datetime
 
 
-class EEVariables():
-    """Intialization of core variables"""
+# Host facts are probed once and kept here, every fact is stored along with
+# the mtimes of the files it was derived from and reprobed when they change
+EE_FACTS_CACHE = '/var/lib/ee/facts.json'
 
-    # EasyEngine version
-    ee_version = "3.2.0"
 
-    # EasyEngine packages versions
-    ee_wp_cli = "0.19.1"
-    ee_adminer = "4.2.1"
-    ee_roundcube = "1.1.1"
-    ee_vimbadmin = "3.0.11"
+def _source_mtimes(paths):
+    """Returns dict of path: mtime (None for missing files)"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime
+        except OSError:
+            mtimes[path] = None
+    return mtimes
 
-    # Current date and time of System
-    ee_date = datetime.datetime.now().strftime('%d%b%Y%H%M%S')
 
-    # EasyEngine core variables
-    ee_platform_distro = platform.linux_distribution()[0].lower()
-    ee_platform_version = platform.linux_distribution()[1]
-    ee_platform_codename = os.popen("lsb_release -sc | tr -d \'\\n\'").read()
+def _read_os_release():
+    """Parses /etc/os-release into a dict"""
+    release = {}
+    try:
+        with open('/etc/os-release', encoding='utf-8', mode='r') as f:
+            for line in f:
+                if '=' not in line:
+                    continue
+                key, value = line.strip().split('=', 1)
+                release[key] = value.strip('"\'')
+    except (IOError, OSError):
+        pass
+    return release
+
+
+def _probe_platform():
+    """Returns (distro, version, codename) of the running system"""
+    release = _read_os_release()
+    distro = release.get('ID', '').lower()
+    version = release.get('VERSION_ID', '')
+    codename = (release.get('VERSION_CODENAME') or
+                release.get('UBUNTU_CODENAME', ''))
+    if not codename and '(' in release.get('VERSION', ''):
+        # Debian writes it as VERSION="7 (wheezy)"
+        codename = release['VERSION'].split('(')[1].split(')')[0].lower()
+    if not distro:
+        import platform
+        distro = platform.linux_distribution()[0].lower()
+        version = platform.linux_distribution()[1]
+    if not codename:
+        codename = os.popen("lsb_release -sc | tr -d \'\\n\'").read()
+    return (distro, version, codename)
 
-    # Get timezone of system
+
+def _probe_timezone():
+    """Returns timezone of system"""
     if os.path.isfile('/etc/timezone'):
         with open("/etc/timezone", "r") as tzfile:
             ee_timezone = tzfile.read().replace('\n', '')
@@ -36,99 +65,131 @@ class EEVariables():
                 ee_timezone = "UTC"
     else:
         ee_timezone = "UTC"
+    return ee_timezone
 
-    # Get FQDN of system
-    ee_fqdn = socket.getfqdn()
 
-    # EasyEngien default webroot path
-    ee_webroot = '/var/www/'
+def _probe_fqdn():
+    """Returns FQDN of system"""
+    import socket
+    return socket.getfqdn()
 
-    # PHP5 user
-    ee_php_user = 'www-data'
 
-    # Get git user name and EMail
-    config = configparser.ConfigParser()
-    config.read(os.path.expanduser("~")+'/.gitconfig')
-    try:
-        ee_user = config['user']['name']
-        ee_email = config['user']['email']
-    except Exception as e:
-        ee_user = input("Enter your name: ")
-        ee_email = input("Enter your email: ")
-        os.system("git config --global user.name {0}".format(ee_user))
-        os.system("git config --global user.email {0}".format(ee_email))
-
-    # Get System RAM and SWAP details
-    ee_ram = psutil.virtual_memory().total / (1024 * 1024)
-    ee_swap = psutil.swap_memory().total / (1024 * 1024)
-
-    # MySQL hostname
-    ee_mysql_host = ""
+def _probe_mysql_host():
+    """Returns MySQL hostname from ~/.my.cnf"""
     config = configparser.RawConfigParser()
     cnfpath = os.path.expanduser("~")+"/.my.cnf"
     if [cnfpath] == config.read(cnfpath):
         try:
-            ee_mysql_host = config.get('client', 'host')
+            return config.get('client', 'host')
         except configparser.NoOptionError as e:
-            ee_mysql_host = "localhost"
-    else:
-        ee_mysql_host = "localhost"
+            return "localhost"
+    return "localhost"
 
-    # EasyEngine stack installation varibales
-    # Nginx repo and packages
-    if ee_platform_codename == 'precise':
-        ee_nginx_repo = ("deb http://download.opensuse.org/repositories/home:"
-                         "/rtCamp:/EasyEngine/xUbuntu_12.04/ /")
-    elif ee_platform_codename == 'trusty':
-        ee_nginx_repo = ("deb http://download.opensuse.org/repositories/home:"
-                         "/rtCamp:/EasyEngine/xUbuntu_14.04/ /")
-    elif ee_platform_codename == 'wheezy':
-        ee_nginx_repo = ("deb http://download.opensuse.org/repositories/home:"
-                         "/rtCamp:/EasyEngine/Debian_7.0/ /")
-    elif ee_platform_codename == 'jessie':
-        ee_nginx_repo = ("deb http://download.opensuse.org/repositories/home:"
-                         "/rtCamp:/EasyEngine/Debian_8.0/ /")
 
+class EEFacts(type):
+    """
+        Resolves host facts of EEVariables on first access instead of
+        probing the system when the module is imported.
+        Probed facts are kept in EE_FACTS_CACHE and reused until one of
+        their source files changes.
+    """
+
+    # fact name: (probe function, source files)
+    facts = {
+        'platform': (_probe_platform, ['/etc/os-release']),
+        'timezone': (_probe_timezone, ['/etc/timezone']),
+        'fqdn': (_probe_fqdn, ['/etc/hostname', '/etc/hosts']),
+        'mysql_host': (_probe_mysql_host,
+                       [os.path.expanduser("~")+"/.my.cnf"]),
+    }
+
+    _cache = None
+
+    def fact(cls, name):
+        """Returns host fact from cache, probes it when stale"""
+        if EEFacts._cache is None:
+            EEFacts._cache = EEFacts.load_cache()
+        probe, sources = EEFacts.facts[name]
+        mtimes = _source_mtimes(sources)
+        entry = EEFacts._cache.get(name)
+        if entry and entry.get('mtimes') == mtimes:
+            return entry['value']
+
+        value = probe()
+        EEFacts._cache[name] = {'value': value, 'mtimes': mtimes}
+        EEFacts.save_cache(EEFacts._cache)
+        return value
+
+    @staticmethod
+    def load_cache():
+        try:
+            with open(EE_FACTS_CACHE, encoding='utf-8', mode='r') as f:
+                cache = json.load(f)
+            if isinstance(cache, dict):
+                return cache
+        except (IOError, OSError, ValueError):
+            pass
+        return {}
+
+    @staticmethod
+    def save_cache(cache):
+        # Cache is an optimisation only, never fail because of it
+        try:
+            tmp = '{0}.{1}'.format(EE_FACTS_CACHE, os.getpid())
+            with open(tmp, encoding='utf-8', mode='w') as f:
+                json.dump(cache, f)
+            os.replace(tmp, EE_FACTS_CACHE)
+        except (IOError, OSError):
+            pass
+
+    def __getattr__(cls, name):
+        resolver = cls.__dict__.get('_resolve_' + name)
+        if resolver is None:
+            raise AttributeError(name)
+        value = resolver(cls)
+        if isinstance(value, str):
+            # Callers compare with `is "localhost"`
+            value = sys.intern(value)
+        setattr(cls, name, value)
+        return value
+
+
+class EEVariables(metaclass=EEFacts):
+    """Intialization of core variables"""
+
+    # EasyEngine version
+    ee_version = "3.2.0"
+
+    # EasyEngine packages versions
+    ee_wp_cli = "0.19.1"
+    ee_adminer = "4.2.1"
+    ee_roundcube = "1.1.1"
+    ee_vimbadmin = "3.0.11"
+
+    # Current date and time of System
+    ee_date = datetime.datetime.now().strftime('%d%b%Y%H%M%S')
+
+    # EasyEngine core variables
+    # ee_platform_distro, ee_platform_version, ee_platform_codename,
+    # ee_timezone, ee_fqdn, ee_user, ee_email, ee_ram, ee_swap and
+    # ee_mysql_host are resolved on first access, see _resolve_* below
+
+    # EasyEngien default webroot path
+    ee_webroot = '/var/www/'
+
+    # PHP5 user
+    ee_php_user = 'www-data'
+
+    # EasyEngine stack installation varibales
     ee_nginx = ["nginx-custom", "nginx-common"]
     ee_nginx_key = '3050AC3CD2AE6F03'
 
-    # PHP repo and packages
-    if ee_platform_distro == 'ubuntu':
-        ee_php_repo = "ppa:ondrej/php5-5.6"
-    elif ee_platform_codename == 'wheezy':
-        ee_php_repo = ("deb http://packages.dotdeb.org {codename}-php56 all"
-                       .format(codename=ee_platform_codename))
-    ee_php = ["php5-fpm", "php5-curl", "php5-gd", "php5-imap",
-              "php5-mcrypt", "php5-common", "php5-readline",
-              "php5-mysql", "php5-cli", "php5-memcache", "php5-imagick",
-              "memcached", "graphviz", "php-pear"]
-
-    if ee_platform_codename == 'wheezy':
-        ee_php = ee_php + ["php5-dev"]
-
-    if ee_platform_distro == 'ubuntu' or ee_platform_codename == 'jessie':
-        ee_php = ee_php + ["php5-xdebug"]
-
-    # MySQL repo and packages
-    if ee_platform_distro == 'ubuntu':
-        ee_mysql_repo = ("deb http://mirror.aarnet.edu.au/pub/MariaDB/repo/"
-                         "10.0/ubuntu {codename} main"
-                         .format(codename=ee_platform_codename))
-    elif ee_platform_distro == 'debian':
-        ee_mysql_repo = ("deb http://mirror.aarnet.edu.au/pub/MariaDB/repo/"
-                         "10.0/debian {codename} main"
-                         .format(codename=ee_platform_codename))
-
     ee_mysql = ["mariadb-server", "percona-toolkit"]
 
     # Postfix repo and packages
     ee_postfix_repo = ""
     ee_postfix = ["postfix"]
 
-    # Mail repo and packages
-    ee_mail_repo = ("deb http://http.debian.net/debian-backports {codename}"
-                    "-backports main".format(codename=ee_platform_codename))
-
     ee_mail = ["dovecot-core", "dovecot-imapd", "dovecot-pop3d",
                "dovecot-lmtpd", "dovecot-mysql", "dovecot-sieve",
                "dovecot-managesieved", "postfix-mysql", "php5-cgi",
@@ -140,18 +201,6 @@ class EEVariables():
                       "arj", "zoo", "nomarch", "lzop", "cabextract", "p7zip",
                       "rpm", "unrar-free"]
 
-    # HHVM repo details
-    # 12.04 requires boot repository
-    if ee_platform_distro == 'ubuntu':
-        if ee_platform_codename == "precise":
-            ee_boost_repo = ("ppa:mapnik/boost")
-
-        ee_hhvm_repo = ("deb http://dl.hhvm.com/ubuntu {codename} main"
-                        .format(codename=ee_platform_codename))
-    else:
-        ee_hhvm_repo = ("deb http://dl.hhvm.com/debian {codename} main"
-                        .format(codename=ee_platform_codename))
-
     ee_hhvm = ["hhvm"]
 
     # Repo path
@@ -160,7 +209,130 @@ class EEVariables():
 
     # Application dabase file path
     basedir = os.path.abspath(os.path.dirname('/var/lib/ee/'))
-    ee_db_uri = 'sqlite:///' + os.path.join(basedir, 'ee.db')
+    ee_db_path = os.path.join(basedir, 'ee.db')
+    ee_db_uri = 'sqlite:///' + ee_db_path
 
     def __init__(self):
         pass
+
+    def _resolve_ee_platform_distro(cls):
+        return cls.fact('platform')[0]
+
+    def _resolve_ee_platform_version(cls):
+        return cls.fact('platform')[1]
+
+    def _resolve_ee_platform_codename(cls):
+        return cls.fact('platform')[2]
+
+    def _resolve_ee_timezone(cls):
+        return cls.fact('timezone')
+
+    def _resolve_ee_fqdn(cls):
+        return cls.fact('fqdn')
+
+    def _resolve_ee_mysql_host(cls):
+        return cls.fact('mysql_host')
+
+    def _resolve_ee_user(cls):
+        cls._resolve_git_user()
+        return cls.__dict__['ee_user']
+
+    def _resolve_ee_email(cls):
+        cls._resolve_git_user()
+        return cls.__dict__['ee_email']
+
+    @classmethod
+    def _resolve_git_user(cls):
+        """Get git user name and EMail"""
+        config = configparser.ConfigParser()
+        config.read(os.path.expanduser("~")+'/.gitconfig')
+        try:
+            cls.ee_user = config['user']['name']
+            cls.ee_email = config['user']['email']
+        except Exception as e:
+            cls.ee_user = input("Enter your name: ")
+            cls.ee_email = input("Enter your email: ")
+            os.system("git config --global user.name {0}".format(cls.ee_user))
+            os.system("git config --global user.email {0}"
+                      .format(cls.ee_email))
+
+    def _resolve_ee_ram(cls):
+        """Get System RAM details"""
+        import psutil
+        return psutil.virtual_memory().total / (1024 * 1024)
+
+    def _resolve_ee_swap(cls):
+        """Get System SWAP details"""
+        import psutil
+        return psutil.swap_memory().total / (1024 * 1024)
+
+    # Nginx repo
+    def _resolve_ee_nginx_repo(cls):
+        if cls.ee_platform_codename == 'precise':
+            return ("deb http://download.opensuse.org/repositories/home:"
+                    "/rtCamp:/EasyEngine/xUbuntu_12.04/ /")
+        elif cls.ee_platform_codename == 'trusty':
+            return ("deb http://download.opensuse.org/repositories/home:"
+                    "/rtCamp:/EasyEngine/xUbuntu_14.04/ /")
+        elif cls.ee_platform_codename == 'wheezy':
+            return ("deb http://download.opensuse.org/repositories/home:"
+                    "/rtCamp:/EasyEngine/Debian_7.0/ /")
+        elif cls.ee_platform_codename == 'jessie':
+            return ("deb http://download.opensuse.org/repositories/home:"
+                    "/rtCamp:/EasyEngine/Debian_8.0/ /")
+        raise AttributeError('ee_nginx_repo')
+
+    # PHP repo and packages
+    def _resolve_ee_php_repo(cls):
+        if cls.ee_platform_distro == 'ubuntu':
+            return "ppa:ondrej/php5-5.6"
+        elif cls.ee_platform_codename == 'wheezy':
+            return ("deb http://packages.dotdeb.org {codename}-php56 all"
+                    .format(codename=cls.ee_platform_codename))
+        raise AttributeError('ee_php_repo')
+
+    def _resolve_ee_php(cls):
+        ee_php = ["php5-fpm", "php5-curl", "php5-gd", "php5-imap",
+                  "php5-mcrypt", "php5-common", "php5-readline",
+                  "php5-mysql", "php5-cli", "php5-memcache", "php5-imagick",
+                  "memcached", "graphviz", "php-pear"]
+
+        if cls.ee_platform_codename == 'wheezy':
+            ee_php = ee_php + ["php5-dev"]
+
+        if (cls.ee_platform_distro == 'ubuntu' or
+           cls.ee_platform_codename == 'jessie'):
+            ee_php = ee_php + ["php5-xdebug"]
+        return ee_php
+
+    # MySQL repo
+    def _resolve_ee_mysql_repo(cls):
+        if cls.ee_platform_distro == 'ubuntu':
+            return ("deb http://mirror.aarnet.edu.au/pub/MariaDB/repo/"
+                    "10.0/ubuntu {codename} main"
+                    .format(codename=cls.ee_platform_codename))
+        elif cls.ee_platform_distro == 'debian':
+            return ("deb http://mirror.aarnet.edu.au/pub/MariaDB/repo/"
+                    "10.0/debian {codename} main"
+                    .format(codename=cls.ee_platform_codename))
+        raise AttributeError('ee_mysql_repo')
+
+    # Mail repo
+    def _resolve_ee_mail_repo(cls):
+        return ("deb http://http.debian.net/debian-backports {codename}"
+                "-backports main".format(codename=cls.ee_platform_codename))
+
+    # HHVM repo details
+    # 12.04 requires boot repository
+    def _resolve_ee_boost_repo(cls):
+        if (cls.ee_platform_distro == 'ubuntu' and
+           cls.ee_platform_codename == "precise"):
+            return ("ppa:mapnik/boost")
+        raise AttributeError('ee_boost_repo')
+
+    def _resolve_ee_hhvm_repo(cls):
+        if cls.ee_platform_distro == 'ubuntu':
+            return ("deb http://dl.hhvm.com/ubuntu {codename} main"
+                    .format(codename=cls.ee_platform_codename))
+        return ("deb http://dl.hhvm.com/debian {codename} main"
+                .format(codename=cls.ee_platform_codename))
@@ -0,0 +1,67 @@
+"""Startup benchmark for EasyEngine plugin loading.
+
+Measures, for every top level command, the time needed to set up the
+application and import the plugin the command is dispatched to, with
+plugins imported eagerly (lazy_plugins = false, the old behaviour) and on
+dispatch (lazy_plugins = true).
+
+Usage: python3 tests/bench_startup.py [runs]
+"""
+import os
+import subprocess
+import sys
+
+CHILD = r'''
+import sys
+import time
+start = time.time()
+from ee.cli.main import EEApp, defaults
+
+defaults['ee']['lazy_plugins'] = {lazy}
+
+
+class EEBenchApp(EEApp):
+    class Meta:
+        argv = [{command!r}]
+        config_defaults = defaults
+
+app = EEBenchApp()
+app.setup()
+# What dispatching to the command imports
+app.plugin.load_plugin({plugin!r})
+print("{{0:.1f}} {{1}}".format((time.time() - start) * 1000,
+                               len(sys.modules)))
+'''
+
+
+def measure(plugin, command, lazy, runs):
+    """Returns best wall time (ms) and module count over runs"""
+    best = None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = CHILD.format(lazy=lazy, command=command, plugin=plugin)
+    for run in range(runs):
+        out = subprocess.check_output([sys.executable, '-c', code], cwd=root,
+                                      universal_newlines=True)
+        took, modules = out.split()[-2:]
+        if best is None or float(took) < best[0]:
+            best = (float(took), int(modules))
+    return best
+
+
+def main():
+    from ee.cli.ext.ee_pluginhandler import EE_PLUGIN_REGISTRY
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print("{0:18} {1:>16} {2:>16}".format("command", "eager ms (mods)",
+                                          "lazy ms (mods)"))
+    for plugin in sorted(EE_PLUGIN_REGISTRY.keys()):
+        meta = EE_PLUGIN_REGISTRY[plugin][0]
+        command = (meta.get('aliases') or [meta['label']])[0]
+        command = command.replace('_', '-')
+        eager = measure(plugin, command, False, runs)
+        lazy = measure(plugin, command, True, runs)
+        print("{0:18} {1:>9.1f} ({2:4}) {3:>9.1f} ({4:4})"
+              .format(command, eager[0], eager[1], lazy[0], lazy[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,23 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+
+
+class CliTestCaseLogQuery(test.EETestCase):
+
+    def test_ee_cli(self):
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_index(self):
+        self.app = get_test_app(argv=['log', 'index'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_query(self):
+        self.app = get_test_app(argv=['log', 'query', '--where',
+                                      'status>=500', '--group-by', 'url'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
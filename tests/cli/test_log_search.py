@@ -0,0 +1,24 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+
+
+class CliTestCaseLogSearch(test.EETestCase):
+
+    def test_ee_cli(self):
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_search(self):
+        self.app = get_test_app(argv=['log', 'search', '--since', '1h'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_search_grep(self):
+        self.app = get_test_app(argv=['log', 'search', '--nginx', '--since',
+                                      '2d', '--until', '1d', '--grep',
+                                      'upstream'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
@@ -0,0 +1,40 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+from ee.cli.plugins.log import log_files
+import os
+import shutil
+import tempfile
+
+
+class CliTestCaseLogStats(test.EETestCase):
+
+    def test_ee_cli(self):
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_stats(self):
+        self.app = get_test_app(argv=['log', 'stats'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_stats_since(self):
+        self.app = get_test_app(argv=['log', 'stats', '--since', '1h'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_log_files_skip_gzip_copy(self):
+        root = tempfile.mkdtemp()
+        try:
+            for name in ('a.access.log', 'a.access.log.gz',
+                         'a.access.log.1', 'a.access.log.2.gz',
+                         'b.access.log.1.gz'):
+                open(os.path.join(root, name), 'w').close()
+            self.eq(sorted(os.path.basename(path) for path in
+                           log_files(os.path.join(root, '*.access.log*'))),
+                    ['a.access.log', 'a.access.log.1', 'a.access.log.2.gz',
+                     'b.access.log.1.gz'])
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,16 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+
+
+class CliTestCaseMetrics(test.EETestCase):
+
+    def test_ee_cli(self):
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_metrics(self):
+        self.app = get_test_app(argv=['metrics'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
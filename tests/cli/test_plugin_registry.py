@@ -0,0 +1,33 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+from ee.cli.ext.ee_pluginhandler import EE_PLUGIN_REGISTRY
+from cement.core import handler
+
+
+class CliTestCasePluginRegistry(test.EETestCase):
+
+    def test_ee_cli_plugins_deferred(self):
+        self.app.setup()
+        for plugin in self.app.plugin.get_enabled_plugins():
+            if plugin in EE_PLUGIN_REGISTRY:
+                self.eq(plugin in self.app.plugin.get_loaded_plugins(),
+                        False)
+        self.app.close()
+
+    def test_ee_cli_plugin_registry_matches_plugins(self):
+        self.app.setup()
+        for plugin, controllers in EE_PLUGIN_REGISTRY.items():
+            self.app.plugin.load_plugin(plugin)
+            for meta in controllers:
+                contr = handler.get('controller', meta['label'])()
+                self.eq(contr._meta.description, meta['description'])
+                self.eq(contr._meta.usage, meta.get('usage'))
+                self.eq(list(contr._meta.aliases), meta.get('aliases', []))
+        self.app.close()
+
+    def test_ee_cli_clean_dispatch(self):
+        self.app = get_test_app(argv=['clean'])
+        self.app.setup()
+        self.app.run()
+        self.eq('clean' in self.app.plugin.get_loaded_plugins(), True)
+        self.app.close()
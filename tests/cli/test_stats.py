@@ -0,0 +1,23 @@
+from ee.utils import test
+from ee.cli.main import get_test_app
+
+
+class CliTestCaseStats(test.EETestCase):
+
+    def test_ee_cli(self):
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_stats_history(self):
+        self.app = get_test_app(argv=['stats', 'history'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
+
+    def test_ee_cli_stats_history_command(self):
+        self.app = get_test_app(argv=['stats', 'history', '--command',
+                                      'site create', '--period', 'day'])
+        self.app.setup()
+        self.app.run()
+        self.app.close()
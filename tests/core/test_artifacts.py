@@ -0,0 +1,108 @@
+from ee.utils import test
+from ee.core.artifacts import ArtifactCache, DownloadError
+import hashlib
+import http.server
+import os
+import shutil
+import tempfile
+import threading
+
+CONTENT = b'wordpress' * 100000
+ETAG = '"v1"'
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class ArtifactHandler(http.server.BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        ArtifactHandler.requests.append(dict(self.headers))
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        if self.headers.get('Range') and \
+           self.headers.get('If-Range') == ETAG:
+            start = int(self.headers['Range'][6:-1])
+            self.send_response(206)
+        else:
+            self.send_response(200)
+        self.send_header('ETag', ETAG)
+        self.send_header('Content-Length', str(len(CONTENT) - start))
+        self.end_headers()
+        self.wfile.write(CONTENT[start:])
+
+    def log_message(self, *args):
+        pass
+
+
+class CoreTestCaseArtifacts(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseArtifacts, self).setUp()
+        self.server = http.server.HTTPServer(('127.0.0.1', 0),
+                                             ArtifactHandler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+        self.url = 'http://127.0.0.1:{0}/latest.tar.gz'.format(
+            self.server.server_port)
+        self.root = tempfile.mkdtemp()
+        ArtifactHandler.requests = []
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.root)
+        super(CoreTestCaseArtifacts, self).tearDown()
+
+    def test_fetch_then_cached(self):
+        cache = ArtifactCache(self.root)
+        path, transferred = cache.get(self.url)
+        self.eq(transferred, len(CONTENT))
+        self.eq(read(path), CONTENT)
+        self.eq(cache.get(self.url), (path, 0))
+        self.eq(len(ArtifactHandler.requests), 1)
+
+    def test_revalidate(self):
+        cache = ArtifactCache(self.root, ttl=0)
+        path, transferred = cache.get(self.url)
+        self.eq(cache.get(self.url, background=False), (path, 0))
+        self.eq(ArtifactHandler.requests[-1].get('If-None-Match'), ETAG)
+
+    def test_resume(self):
+        cache = ArtifactCache(self.root)
+        partial = os.path.join(self.root, 'partial', 'part')
+        os.makedirs(os.path.dirname(partial))
+        with open(partial, 'wb') as f:
+            f.write(CONTENT[:1000])
+        cache.save_partial_validators(partial, ETAG, None)
+        path, transferred = cache.request(self.url, None, partial, None)
+        self.eq(transferred, len(CONTENT) - 1000)
+        self.eq(ArtifactHandler.requests[-1].get('Range'), 'bytes=1000-')
+        self.eq(read(path), CONTENT)
+
+    def test_sha256(self):
+        cache = ArtifactCache(self.root)
+        digest = hashlib.sha256(CONTENT).hexdigest()
+        path, transferred = cache.get(self.url, sha256=digest)
+        self.eq(os.path.basename(path), digest)
+        with self.assertRaises(DownloadError):
+            cache.get(self.url, sha256='0' * 64)
+
+    def test_offline(self):
+        cache = ArtifactCache(self.root, offline=True)
+        with self.assertRaises(DownloadError):
+            cache.get(self.url)
+        self.eq(ArtifactHandler.requests, [])
+
+    def test_current(self):
+        cache = ArtifactCache(self.root)
+        path, transferred = cache.get(self.url)
+        self.eq(cache.get(self.url, current=True), (path, 0))
+        self.eq(len(ArtifactHandler.requests), 2)
+        self.eq(ArtifactHandler.requests[-1].get('If-None-Match'), ETAG)
@@ -0,0 +1,71 @@
+from ee.utils import test
+from ee.core.backupstore import BackupStore
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def chunk_count(root):
+    return sum(len(files) for path, dirs, files
+               in os.walk(os.path.join(root, 'chunks')))
+
+
+class CoreTestCaseBackupStore(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseBackupStore, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.htdocs = os.path.join(self.root, 'htdocs')
+        os.makedirs(os.path.join(self.htdocs, 'wp-content'))
+        with open(os.path.join(self.htdocs, 'index.php'), 'w') as f:
+            f.write('<?php')
+        with open(os.path.join(self.htdocs, 'wp-content', 'a.php'),
+                  'w') as f:
+            f.write('a')
+        self.store = BackupStore(os.path.join(self.root, 'store'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(CoreTestCaseBackupStore, self).tearDown()
+
+    def test_backup_restore(self):
+        self.store.backup('first', [('htdocs', self.htdocs)],
+                          [('db.sql', io.BytesIO(b'insert;\n' * 1000))])
+        target = os.path.join(self.root, 'restored')
+        self.store.restore('first', target)
+        with open(os.path.join(target, 'htdocs', 'wp-content',
+                               'a.php')) as f:
+            self.eq(f.read(), 'a')
+        with open(os.path.join(target, 'db.sql'), 'rb') as f:
+            self.eq(f.read(), b'insert;\n' * 1000)
+
+    def test_deduplicate(self):
+        self.store.backup('first', [('htdocs', self.htdocs)])
+        chunks = chunk_count(self.store.root)
+        self.store.backup('second', [('htdocs', self.htdocs)])
+        self.eq(chunk_count(self.store.root), chunks)
+        self.eq(self.store.names(), ['first', 'second'])
+
+    def test_owner_kept(self):
+        if os.geteuid() != 0:
+            raise unittest.SkipTest("changing owners needs root")
+        path = os.path.join(self.htdocs, 'wp-content', 'a.php')
+        os.lchown(path, 33, 33)
+        os.lchown(self.htdocs, 33, 33)
+        self.store.backup('first', [('htdocs', self.htdocs)])
+        target = os.path.join(self.root, 'restored')
+        self.store.restore('first', target)
+        info = os.lstat(os.path.join(target, 'htdocs', 'wp-content',
+                                     'a.php'))
+        self.eq((info.st_uid, info.st_gid), (33, 33))
+        info = os.lstat(os.path.join(target, 'htdocs'))
+        self.eq((info.st_uid, info.st_gid), (33, 33))
+
+    def test_special_files_skipped(self):
+        os.mkfifo(os.path.join(self.htdocs, 'fifo'))
+        manifest = self.store.backup('first', [('htdocs', self.htdocs)])
+        self.eq(sorted(entry['path'] for entry in manifest['entries']),
+                ['htdocs', 'htdocs/index.php', 'htdocs/wp-content',
+                 'htdocs/wp-content/a.php'])
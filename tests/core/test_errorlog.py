@@ -0,0 +1,183 @@
+from ee.utils import test
+from ee.core import errorlog
+from ee.core.errorlog import Fingerprints, aggregate, analyze
+from ee.core.errorlog import analyze_range, bucket_of, classify
+from ee.core.errorlog import fingerprint, merge, site_of, split_jobs
+import gzip
+import os
+import shutil
+import tempfile
+
+REFUSED = ('2015/08/01 10:{0:02d}:07 [error] 1234#0: *{1} connect() '
+           'failed (111: Connection refused) while connecting to upstream, '
+           'client: 10.0.0.{2}, server: example.com, request: "GET '
+           '/page-{1} HTTP/1.1", upstream: "fastcgi://127.0.0.1:9000", '
+           'host: "example.com"')
+BACKLOG = ('2015/08/01 11:{0:02d}:30 [error] 1234#0: *{1} connect() to '
+           'unix:/var/run/php5-fpm.sock failed (11: Resource temporarily '
+           'unavailable) while connecting to upstream, client: 10.0.0.1, '
+           'server: other.com, request: "GET / HTTP/1.1", '
+           'upstream: "fastcgi://127.0.0.1:9001"')
+OPEN = ('2015/08/01 12:00:{0:02d} [crit] 99#0: *{1} open() '
+        '"/var/www/example.com/htdocs/{1}.html" failed (24: Too many '
+        'open files), client: 10.0.0.1, server: example.com')
+
+
+class CoreTestCaseErrorLog(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseErrorLog, self).setUp()
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(CoreTestCaseErrorLog, self).tearDown()
+
+    def write(self, name, lines, end='\n'):
+        path = os.path.join(self.root, name)
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(path, 'wt') as f:
+            f.write('\n'.join(lines) + end)
+        return path
+
+    def counts(self, classes):
+        return sorted((cls.level, cls.kind, cls.count)
+                      for cls in classes)
+
+    def test_fingerprint(self):
+        self.eq(fingerprint('open() "/var/www/a.com/htdocs/x.html" failed '
+                            '(2: No such file or directory)'),
+                'open() "?" failed (2: No such file or directory)')
+        self.eq(fingerprint('upstream 10.0.0.1:9000 sent 4096 bytes, '
+                            'id deadbeef01'),
+                'upstream ? sent N bytes, id ?')
+        self.eq(fingerprint('cannot read /var/cache/nginx/1/2f'),
+                'cannot read ?')
+
+    def test_fingerprints_cached(self):
+        fingerprints = Fingerprints()
+        for message in ('connect() failed (111: Connection refused) 17',
+                        'connect() failed (111: Connection refused) 42',
+                        'connect() failed (11: Resource temporarily '
+                        'unavailable) 42',
+                        'open() "/a/1" failed (2: No such file)',
+                        'open() "/b/c/2" failed (2: No such file)'):
+            self.eq(fingerprints(message), fingerprint(message))
+        # looked up once for each, errno tells apart messages which are
+        # the same once zeroed
+        self.eq(len(fingerprints), 3)
+        self.eq(len(set(fingerprints.values())), 3)
+
+    def test_classify(self):
+        self.eq(classify('upstream timed out (110: Connection timed out)',
+                         'fastcgi://127.0.0.1:9000'),
+                ('upstream timeout',
+                 'fastcgi_read_timeout / request_terminate_timeout'))
+        self.eq(classify('upstream sent too big header',
+                         'http://127.0.0.1:8080'),
+                ('upstream header too big', 'proxy_buffer_size'))
+        self.eq(classify('connect() failed (111: Connection refused)', ''),
+                ('upstream refused', 'pm.max_children (php5-fpm)'))
+        self.eq(classify('open() "/x" failed (2: No such file)', ''),
+                (None, None))
+
+    def test_bucket_of(self):
+        self.eq(bucket_of('2015/08/01 10:17', 15), '2015/08/01 10:15')
+        self.eq(bucket_of('2015/08/01 10:17', 60), '2015/08/01 10:00')
+        self.eq(bucket_of('2015/08/01 10:17', 360), '2015/08/01 06:00')
+
+    def test_site_of(self):
+        self.eq(site_of('/var/log/nginx/example.com.error.log'),
+                'example.com')
+        self.eq(site_of('/var/log/nginx/example.com.error.log.2.gz'),
+                'example.com')
+        self.eq(site_of('/var/log/nginx/error.log'), '-')
+
+    def test_aggregate(self):
+        lines = ([REFUSED.format(minute, minute, minute)
+                  for minute in (5, 20, 35, 50)] +
+                 [BACKLOG.format(1, 1), OPEN.format(1, 1), OPEN.format(2, 2),
+                  'PHP message: continued line', ''])
+        classes = aggregate(lines, 'default', 30)
+        self.eq(self.counts(classes.values()),
+                [('crit', 'open files exhausted', 2),
+                 ('error', 'upstream backlog full', 1),
+                 ('error', 'upstream refused', 4)])
+        refused = [cls for cls in classes.values()
+                   if cls.kind == 'upstream refused'][0]
+        self.eq(refused.directive, 'pm.max_children (php5-fpm)')
+        self.eq((refused.first, refused.last),
+                ('2015/08/01 10:05', '2015/08/01 10:50'))
+        self.eq(dict(refused.upstreams), {'php': 4})
+        self.eq(dict(refused.sites), {'example.com': 4})
+        self.eq(dict(refused.buckets), {'2015/08/01 10:00': 2,
+                                        '2015/08/01 10:30': 2})
+        backlog = [cls for cls in classes.values()
+                   if cls.kind == 'upstream backlog full'][0]
+        self.eq(dict(backlog.upstreams), {'debug': 1})
+        # no server in the context, the site of the log is used
+        line = ('2015/08/01 10:00:00 [warn] 7#0: *1 an upstream response '
+                'is buffered to a temporary file, client: 10.0.0.1')
+        self.eq(dict(aggregate([line], 'x.com', 60).popitem()[1].sites),
+                {'x.com': 1})
+
+    def test_split_boundary(self):
+        lines = [REFUSED.format(minute % 60, minute, minute % 250)
+                 for minute in range(300)]
+        path = self.write('example.com.error.log', lines)
+        size = os.path.getsize(path)
+        # ranges much smaller than a line, most cuts fall within one
+        jobs = split_jobs([path], 60, split_size=100)
+        self.eq(len(jobs), len(lines))
+        self.eq(jobs[0][1], 0)
+        self.eq(jobs[-1][2], size)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for (_, start, end, _), (_, following, _, _) in zip(jobs, jobs[1:]):
+            self.eq(end, following)
+            self.eq(data[end - 1:end], b'\n')
+
+        merged = merge(analyze_range(job) for job in jobs)
+        self.eq(self.counts(merged.values()),
+                [('error', 'upstream refused', 300)])
+        cls = list(merged.values())[0]
+        self.eq((cls.first, cls.last),
+                ('2015/08/01 10:00', '2015/08/01 10:59'))
+        self.eq(sum(cls.buckets.values()), 300)
+
+        # a range ending far into the log, as a large split_size would
+        jobs = split_jobs([path], 60, split_size=size // 3)
+        self.eq(len(jobs), 3)
+        merged = merge(analyze_range(job) for job in jobs)
+        self.eq(list(merged.values())[0].count, 300)
+
+    def test_lines_across_blocks(self):
+        block_size = errorlog.BLOCK_SIZE
+        errorlog.BLOCK_SIZE = 64
+        try:
+            lines = [OPEN.format(second, second) for second in range(50)]
+            # last line without a newline is still counted
+            path = self.write('example.com.error.log', lines, end='')
+            classes = analyze_range((path, 0, None, 60))
+            self.eq(self.counts(classes.values()),
+                    [('crit', 'open files exhausted', 50)])
+        finally:
+            errorlog.BLOCK_SIZE = block_size
+
+    def test_analyze(self):
+        plain = self.write('example.com.error.log',
+                           [REFUSED.format(minute, minute, 1)
+                            for minute in range(10)] +
+                           [OPEN.format(1, 1)])
+        rotated = self.write('example.com.error.log.2.gz',
+                             [REFUSED.format(minute, minute, 2)
+                              for minute in range(5)] +
+                             [BACKLOG.format(1, 1)])
+        for workers in (1, 2):
+            classes = analyze([plain, rotated], bucket=60, workers=workers)
+            self.eq((classes[0].kind, classes[0].count),
+                    ('upstream refused', 15))
+            self.eq(dict(classes[0].upstreams), {'php': 15})
+            self.eq(sorted((cls.kind, cls.count) for cls in classes[1:]),
+                    [('open files exhausted', 1),
+                     ('upstream backlog full', 1)])
@@ -0,0 +1,93 @@
+from ee.utils import test
+from ee.core.download import EEDownload
+from ee.core.extract import EEExtract
+from ee.core.extract import member_name
+from ee.core.extract import merge_tree
+import http.server
+import io
+import os
+import shutil
+import tarfile
+import tempfile
+import threading
+
+
+def tarball():
+    data = io.BytesIO()
+    with tarfile.open(fileobj=data, mode='w:gz') as tar:
+        content = b'<?php\n'
+        member = tarfile.TarInfo('pkg-master/index.php')
+        member.size = len(content)
+        tar.addfile(member, io.BytesIO(content))
+        member = tarfile.TarInfo('pkg-master/passwd')
+        member.type = tarfile.SYMTYPE
+        member.linkname = '/etc/passwd'
+        tar.addfile(member)
+    return data.getvalue()
+
+
+class TarballHandler(http.server.BaseHTTPRequestHandler):
+    content = tarball()
+    requests = 0
+
+    def do_GET(self):
+        TarballHandler.requests += 1
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+    def log_message(self, *args):
+        pass
+
+
+class CoreTestCaseExtract(test.EETestCase):
+
+    def test_member_name(self):
+        self.eq(member_name('wordpress/index.php', 'wordpress/'),
+                'index.php')
+        self.eq(member_name('other/index.php', 'wordpress/'), None)
+        self.eq(member_name('wordpress/', 'wordpress/'), None)
+        self.eq(member_name('/etc/passwd'), None)
+        self.eq(member_name('wordpress/../../etc/passwd', 'wordpress/'),
+                None)
+
+    def test_merge_tree(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, 'new', 'lib'))
+            os.makedirs(os.path.join(root, 'old'))
+            for path in ('new/index.php', 'new/lib/a.php', 'old/keep'):
+                open(os.path.join(root, path), 'w').close()
+            merge_tree(os.path.join(root, 'new'), os.path.join(root, 'old'))
+            self.eq(sorted(os.listdir(os.path.join(root, 'old'))),
+                    ['index.php', 'keep', 'lib'])
+            self.eq(os.path.exists(os.path.join(root, 'new')), False)
+        finally:
+            shutil.rmtree(root)
+
+    def test_stream_from_cache(self):
+        self.app.setup()
+        root = tempfile.mkdtemp()
+        server = http.server.HTTPServer(('127.0.0.1', 0), TarballHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{0}/master.tar.gz'.format(server.server_port)
+        TarballHandler.requests = 0
+        try:
+            self.app.config.set('cache', 'dir', os.path.join(root, 'cache'))
+            self.app.config.set('cache', 'ttl', '86400')
+            self.app.config.set('cache', 'offline', 'false')
+            tmp = os.path.join(root, 'pkg.tar.gz')
+            EEDownload.download(self, [[url, tmp, 'pkg']], cached=[tmp])
+            self.eq(TarballHandler.requests, 1)
+            # fetched into the cache only
+            self.eq(os.path.exists(tmp), False)
+
+            path = os.path.join(root, 'htdocs', 'pkg')
+            EEExtract.stream(self, url, path, strip='pkg-master')
+            self.eq(TarballHandler.requests, 1)
+            self.eq(os.listdir(path), ['index.php'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            shutil.rmtree(root)
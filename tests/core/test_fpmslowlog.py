@@ -0,0 +1,48 @@
+from ee.utils import test
+from ee.core.fpmslowlog import analyze
+from ee.core.logcursor import LogCursor
+import os
+import shutil
+import tempfile
+
+ENTRY = ("[01-Aug-2015 10:15:{0:02d}]  [pool debug] pid 123{0}\n"
+         "script_filename = /var/www/example.com/htdocs/index.php\n"
+         "[0x00007f3b5c0132d8] curl_exec() /var/www/example.com/htdocs/"
+         "wp-content/plugins/slow/slow.php:15\n"
+         "[0x00007f3b5c013100] run() /var/www/example.com/htdocs/"
+         "wp-includes/plugin.php:496\n"
+         "\n")
+
+
+class CoreTestCaseFpmSlowLog(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseFpmSlowLog, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.log = os.path.join(self.root, 'slow.log')
+        self.cursor = LogCursor(self.log, os.path.join(self.root, 'cursor'))
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+        super(CoreTestCaseFpmSlowLog, self).tearDown()
+
+    def write(self, entries):
+        with open(self.log, 'a') as f:
+            f.write(''.join(ENTRY.format(i) for i in entries))
+
+    def test_analyze_in_parts(self):
+        self.write(range(10))
+        self.cursor.rewind()
+        report = analyze(self.cursor, settle_time=0, read_size=500)
+        self.eq(report.entries, 10)
+        self.eq(report.plugins['slow'].count, 10)
+        self.eq(self.cursor.load()['offset'], os.path.getsize(self.log))
+        self.write(range(10, 12))
+        self.eq(analyze(self.cursor, settle_time=0).entries, 2)
+
+    def test_analyze_holds_back_last_entry(self):
+        self.write(range(3))
+        self.cursor.rewind()
+        report = analyze(self.cursor, settle_time=60, read_size=500)
+        self.eq(report.entries, 2)
+        self.eq(analyze(self.cursor, settle_time=0).entries, 1)
@@ -0,0 +1,66 @@
+from ee.utils import test
+from ee.core.logfollow import LineFilter, LogFollower
+import fcntl
+import io
+import os
+
+
+class CoreTestCaseLogFollow(test.EETestCase):
+
+    def test_line_filter(self):
+        line = ('1.2.3.4 0.500 - [01/Aug/2015:10:15:00 +0000] example.com '
+                '"GET / HTTP/1.1" 502 0 "-" "curl"')
+        self.eq(LineFilter(status=['5xx'])(line), True)
+        self.eq(LineFilter(status=['404'])(line), False)
+        self.eq(LineFilter(min_upstream=1)(line), False)
+
+    def test_flush_without_descriptor(self):
+        out = io.StringIO()
+        follower = LogFollower({}, out=out, err=io.StringIO())
+        follower.callback('/var/log/nginx/a.access.log', ['a\n', 'b\n'])
+        follower.flush()
+        self.eq(out.getvalue(), 'a.access.log| a\na.access.log| b\n')
+
+    def pipe(self):
+        read, write = os.pipe()
+        fcntl.fcntl(write, fcntl.F_SETFL, os.O_NONBLOCK)
+        self.addCleanup(os.close, read)
+        out = os.fdopen(write, 'w')
+        self.addCleanup(out.close)
+        return read, out
+
+    def test_flush_keeps_or_drops_what_output_can_not_take(self):
+        read, out = self.pipe()
+        follower = LogFollower({}, out=out, err=io.StringIO())
+        follower.flush_size = 1024
+        # 100 byte lines, numbered, the pipe fills up in the middle of one
+        lines = ['{0:099d}\n'.format(i) for i in range(2000)]
+        follower.callback('log', lines)
+        follower.flush()
+        written = os.read(read, 1024 * 1024)
+        self.eq(written.endswith(b'\n'), False)
+        pending = follower.pending
+        self.eq(1024 - 105 < len(pending) <= 1024, True)
+        self.eq(pending.endswith(b'\n'), True)
+        # what was written and what is kept join up to whole lines
+        text = (written + pending).decode('utf-8')
+        label = 'log| '
+        kept = [line[len(label):] + '\n'
+                for line in text.split('\n')[:-1]]
+        self.eq(kept, lines[:len(kept)])
+        self.eq(follower.dropped['slow output'], len(lines) - len(kept))
+        # once the reader catches up what was kept is written first
+        follower.flush()
+        self.eq(follower.pending, b'')
+        self.eq(os.read(read, len(pending)), pending)
+
+    def test_flush_keeps_partial_line_longer_than_flush_size(self):
+        read, out = self.pipe()
+        follower = LogFollower({}, out=out, err=io.StringIO())
+        follower.flush_size = 1024
+        follower.callback('log', ['x' * 200000 + '\n', 'y\n'])
+        follower.flush()
+        written = os.read(read, 1024 * 1024)
+        self.eq(len(written) + len(follower.pending), 200000 + 5 + 1)
+        self.eq(follower.pending.endswith(b'x\n'), True)
+        self.eq(follower.dropped['slow output'], 1)
@@ -0,0 +1,29 @@
+from ee.utils import test
+from ee.core.logstore import local_day
+import os
+import time
+
+
+class CoreTestCaseLogStore(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseLogStore, self).setUp()
+        self.tz = os.environ.get('TZ')
+
+    def tearDown(self):
+        if self.tz is None:
+            os.environ.pop('TZ', None)
+        else:
+            os.environ['TZ'] = self.tz
+        time.tzset()
+        super(CoreTestCaseLogStore, self).tearDown()
+
+    def test_local_day_half_hour_zone(self):
+        os.environ['TZ'] = 'Asia/Kolkata'
+        time.tzset()
+        # 2015-08-01 18:15 and 18:45 UTC, midnight in Kolkata is 18:30
+        day, begin, end = local_day(1438452900)
+        self.eq(day, '20150801')
+        self.eq(end, 1438453800)
+        self.eq(end - begin, 86400)
+        self.eq(local_day(1438454700)[0], '20150802')
@@ -0,0 +1,295 @@
+from ee.utils import test
+from ee.core import mysql
+from ee.core.mysql import BackupError, EEMysql, StatementExcecutionError
+from ee.core.mysql import dump_database
+from ee.core.variables import EEVariables
+from pymysql import OperationalError
+import gzip
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+
+# mysqldump writing the name of the database and lines of data, failing
+# for a database named broken
+MYSQLDUMP = '''#!{0}
+import os, sys
+database = sys.argv[1]
+with open(os.environ['DUMPED'], 'a') as f:
+    f.write(database + '\\n')
+if database == 'broken':
+    sys.stderr.write("Got error: 1049: Unknown database")
+    sys.exit(2)
+for line in range(int(os.environ.get('DUMP_LINES', '100'))):
+    sys.stdout.write('INSERT INTO {{0}} VALUES ({{1}}, {{2!r}});\\n'
+                     .format(database, line, os.urandom(8)))
+'''
+
+PIGZ = '''#!{0}
+import gzip, os, shutil, sys
+with open(os.environ['PIGZ_ARGS'], 'w') as f:
+    f.write(' '.join(sys.argv[1:]))
+with gzip.GzipFile(fileobj=sys.stdout.buffer, mode='wb',
+                   compresslevel=int(sys.argv[1][1:])) as out:
+    shutil.copyfileobj(sys.stdin.buffer, out)
+'''
+
+
+class Cursor():
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement):
+        if 'fail' in statement:
+            raise OperationalError(1064, 'syntax error')
+        self.connection.executed.append(statement)
+        self.rows = [row for start, rows in self.connection.results
+                     for row in rows if statement.startswith(start)]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+class Connection():
+    results = []
+
+    def __init__(self):
+        self.executed = []
+        self.commits = self.rollbacks = self.pings = 0
+        self.closed = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def ping(self):
+        self.pings += 1
+        if self.closed:
+            raise OperationalError(2006, 'MySQL server has gone away')
+
+    def close(self):
+        self.closed = True
+
+
+class MysqlTestCase(test.EETestCase):
+    """Connections of EEMysql are Connection objects, in connections"""
+
+    def setUp(self):
+        super(MysqlTestCase, self).setUp()
+        self.app.setup()
+        self.connections = []
+        self.connect = EEMysql.connect
+
+        def connect(app):
+            self.connections.append(Connection())
+            return self.connections[-1]
+        EEMysql.connect = connect
+        EEMysql.discard(self)
+        EEMysql.forget(self)
+
+    def tearDown(self):
+        EEMysql.discard(self)
+        EEMysql.forget(self)
+        EEMysql.connect = self.connect
+        super(MysqlTestCase, self).tearDown()
+
+
+class CoreTestCaseMysql(MysqlTestCase):
+
+    def test_failed_statement_forgets(self):
+        EEMysql.known['databases'] = frozenset(['old'])
+        with self.assertRaises(StatementExcecutionError):
+            EEMysql.execute(self, "create database fail")
+        self.eq('databases' in EEMysql.known, False)
+
+        EEMysql.known['users'] = frozenset([('old', 'localhost')])
+        with self.assertRaises(StatementExcecutionError):
+            EEMysql.execute_many(self, ["create user 'wp'@'localhost'",
+                                        "grant all on fail.* to 'wp'"])
+        self.eq('users' in EEMysql.known, False)
+
+    def test_connection_reused(self):
+        EEMysql.execute(self, "create database wp")
+        EEMysql.execute_many(self, ["create user 'wp'@'localhost'",
+                                    "grant all on wp.* to 'wp'"])
+        self.eq(len(self.connections), 1)
+        connection = self.connections[0]
+        self.eq(connection.executed,
+                ["create database wp", "create user 'wp'@'localhost'",
+                 "grant all on wp.* to 'wp'"])
+        # one commit per execute, once for all of execute_many
+        self.eq(connection.commits, 2)
+
+        # other threads connect on their own
+        thread = threading.Thread(target=EEMysql.execute,
+                                  args=(self, "select 1"))
+        thread.start()
+        thread.join()
+        self.eq(len(self.connections), 2)
+        EEMysql.execute(self, "select 2")
+        self.eq(len(self.connections), 2)
+
+    def test_idle_connection_checked(self):
+        EEMysql.execute(self, "select 1")
+        connection = self.connections[0]
+        EEMysql.local.used -= mysql.PING_AFTER + 1
+        EEMysql.execute(self, "select 2")
+        self.eq(connection.pings, 1)
+        self.eq(len(self.connections), 1)
+
+        # server went away while idle, connects again
+        connection.closed = True
+        EEMysql.local.used -= mysql.PING_AFTER + 1
+        EEMysql.execute(self, "select 3")
+        self.eq(len(self.connections), 2)
+        self.eq(self.connections[1].executed, ["select 3"])
+
+    def test_session(self):
+        with EEMysql.session(self) as cursor:
+            cursor.execute("select 1")
+        connection = self.connections[0]
+        self.eq((connection.commits, connection.rollbacks), (1, 0))
+
+        with self.assertRaises(StatementExcecutionError):
+            with EEMysql.session(self) as cursor:
+                cursor.execute("select fail")
+        self.eq((connection.commits, connection.rollbacks), (1, 1))
+
+        with self.assertRaises(KeyError):
+            with EEMysql.session(self) as cursor:
+                raise KeyError('not a MySQL error')
+        self.eq((connection.commits, connection.rollbacks), (1, 2))
+        self.eq(len(self.connections), 1)
+
+    def test_execute_many_stops_at_failure(self):
+        with self.assertRaises(StatementExcecutionError):
+            EEMysql.execute_many(self, ["create database wp",
+                                        "select fail", "drop database wp"])
+        connection = self.connections[0]
+        self.eq(connection.executed, ["create database wp"])
+        self.eq((connection.commits, connection.rollbacks), (0, 1))
+
+
+class CoreTestCaseMysqlBackup(MysqlTestCase):
+
+    def setUp(self):
+        super(CoreTestCaseMysqlBackup, self).setUp()
+        self.root = tempfile.mkdtemp()
+        self.bin = os.path.join(self.root, 'bin')
+        os.mkdir(self.bin)
+        self.script('mysqldump', MYSQLDUMP)
+        self.environ = dict((key, os.environ.get(key))
+                            for key in ('PATH', 'DUMPED', 'PIGZ_ARGS'))
+        # nothing but the fakes, no pigz, nice or ionice of the system
+        os.environ['PATH'] = self.bin
+        os.environ['DUMPED'] = os.path.join(self.root, 'dumped')
+        os.environ['PIGZ_ARGS'] = os.path.join(self.root, 'pigz')
+
+    def tearDown(self):
+        for key, value in self.environ.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        Connection.results = []
+        shutil.rmtree(self.root)
+        super(CoreTestCaseMysqlBackup, self).tearDown()
+
+    def script(self, name, text):
+        path = os.path.join(self.bin, name)
+        with open(path, 'w') as f:
+            f.write(text.format(sys.executable))
+        os.chmod(path, 0o755)
+
+    def dumped(self):
+        with open(os.environ['DUMPED']) as f:
+            return f.read().split()
+
+    def check_dump(self, path, database):
+        with gzip.open(path, 'rt') as f:
+            lines = f.read().splitlines()
+        self.eq(len(lines), 100)
+        self.eq(lines[0].startswith('INSERT INTO {0} VALUES (0, '
+                                    .format(database)), True)
+
+    def test_dump_zlib(self):
+        path = os.path.join(self.root, 'wp.sql.gz')
+        result = dump_database('wp', path, level=1)
+        self.check_dump(path, 'wp')
+        self.eq(os.path.exists(os.environ['PIGZ_ARGS']), False)
+        self.eq(result['size'], os.path.getsize(path))
+        self.eq(result['dumped'] > result['size'], True)
+        self.eq(os.path.exists(path + '.part'), False)
+
+    def test_dump_pigz(self):
+        self.script('pigz', PIGZ)
+        path = os.path.join(self.root, 'wp.sql.gz')
+        result = dump_database('wp', path, level=3, threads=2)
+        self.check_dump(path, 'wp')
+        with open(os.environ['PIGZ_ARGS']) as f:
+            self.eq(f.read(), '-3 -p 2 -c')
+        self.eq(result['size'], os.path.getsize(path))
+        # pigz compressed it, how much was dumped is not known
+        self.eq(result['dumped'], None)
+
+    def test_dump_failed(self):
+        path = os.path.join(self.root, 'broken.sql.gz')
+        with self.assertRaises(BackupError) as raised:
+            dump_database('broken', path)
+        self.eq('Unknown database' in str(raised.exception), True)
+        self.eq(sorted(os.listdir(self.root)), ['bin', 'dumped'])
+
+    def test_dump_write_failed(self):
+        os.environ['DUMP_LINES'] = '100000'
+        path = os.path.join(self.root, 'wp.sql.gz')
+        limit = resource.getrlimit(resource.RLIMIT_FSIZE)
+        resource.setrlimit(resource.RLIMIT_FSIZE, (65536, limit[1]))
+        try:
+            with self.assertRaises(OSError):
+                dump_database('wp', path)
+        finally:
+            resource.setrlimit(resource.RLIMIT_FSIZE, limit)
+            del os.environ['DUMP_LINES']
+        self.eq(sorted(os.listdir(self.root)), ['bin', 'dumped'])
+
+    def test_backup_all(self):
+        if not self.app.config.has_section('mysql'):
+            self.app.config.add_section('mysql')
+        self.app.config.set('mysql', 'backup-workers', '1')
+        Connection.results = [
+            ("show databases", [('information_schema',), ('small',),
+                                ('large',), ('broken',), ('medium',)]),
+            ("select table_schema", [('information_schema', 0),
+                                     ('small', 10), ('large', 3000),
+                                     ('broken', 2000), ('medium', None)])]
+        directory = os.path.join(self.root, 'backup')
+        with self.assertRaises(SystemExit):
+            EEMysql.backupAll(self, directory)
+        # largest first, generated schemas left out
+        self.eq(self.dumped(), ['large', 'broken', 'small', 'medium'])
+        with open(os.path.join(directory, 'manifest{0}.json'
+                               .format(EEVariables.ee_date))) as f:
+            manifest = json.load(f)
+        self.eq(manifest['workers'], 1)
+        self.eq(manifest['failed'], ['broken'])
+        self.eq([(result['database'], result['estimated_size'])
+                 for result in manifest['databases']],
+                [('large', 3000), ('small', 10), ('medium', 0)])
+        for result in manifest['databases']:
+            self.eq(os.path.basename(result['file']),
+                    '{0}{1}.sql.gz'.format(result['database'],
+                                           EEVariables.ee_date))
+            self.check_dump(result['file'], result['database'])
+        self.eq(sorted(name for name in os.listdir(directory)
+                       if name.endswith('.part')), [])
@@ -0,0 +1,114 @@
+from ee.utils import test
+from ee.core.shellexec import CommandExecutionError, CommandResult
+from ee.core.shellexec import EEShellExec, TAIL_LINES
+from ee.core.shellexec import command_argv, command_text
+import os
+import shutil
+import tempfile
+import time
+
+
+def running(pid):
+    """Whether pid is alive, killed ones nobody reaped yet are not"""
+    try:
+        with open('/proc/{0}/stat'.format(pid)) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except IOError:
+        return False
+
+
+class CoreTestCaseShellExec(test.EETestCase):
+
+    def test_command_argv_split(self):
+        self.eq(command_argv('nginx -t'), ['nginx', '-t'])
+        self.eq(command_argv('service  php5-fpm reload'),
+                ['service', 'php5-fpm', 'reload'])
+        self.eq(command_argv(['wp', '--path=/var/www', 1]),
+                ['wp', '--path=/var/www', '1'])
+
+    def test_command_argv_quoting(self):
+        self.eq(command_argv('echo "a b"'), None)
+        self.eq(command_argv("mysql -e 'show databases'"), None)
+        self.eq(command_argv('ls *.conf'), None)
+        self.eq(command_argv('echo $HOME'), None)
+
+    def test_command_argv_pipe_redirect(self):
+        self.eq(command_argv('ps aux | grep nginx'), None)
+        self.eq(command_argv('nginx -t 2>/dev/null'), None)
+        self.eq(command_argv('echo ok > /tmp/ee'), None)
+        self.eq(command_argv('apt-get update && apt-get upgrade'), None)
+        self.eq(command_argv('cd /var/www'), None)
+        self.eq(command_argv('HOME=/root wp'), None)
+        self.eq(command_argv(''), None)
+
+    def test_command_text(self):
+        self.eq(command_text('nginx -t'), 'nginx -t')
+        self.eq(command_text(['echo', 'a b']), "echo 'a b'")
+
+    def test_command_result(self):
+        ok = CommandResult('nginx -t', 0, 0.5, '')
+        failed = CommandResult('nginx -t', 1, 0.25, 'failed')
+        self.eq(bool(ok), True)
+        self.eq(bool(failed), False)
+        self.eq(str(ok), "<CommandResult 'nginx -t' rc=0 0.50s>")
+        self.eq(repr(failed), "<CommandResult 'nginx -t' rc=1 0.25s>")
+
+
+class CoreTestCaseShellExecRun(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseShellExecRun, self).setUp()
+        self.app.setup()
+
+    def test_env_and_cwd(self):
+        root = tempfile.mkdtemp()
+        try:
+            result = EEShellExec.cmd_exec(self, ['sh', '-c',
+                                                 'echo $EE_TEST; pwd'],
+                                          env={'EE_TEST': 'override'},
+                                          cwd=root)
+            self.eq(result.output.split('\n'),
+                    ['override', os.path.realpath(root)])
+            self.eq(os.getcwd() != root, True)
+        finally:
+            shutil.rmtree(root)
+
+    def test_missing_binary(self):
+        result = EEShellExec.cmd_exec(self, 'ee-test-missing-binary --x')
+        self.eq(result.returncode, 127)
+        self.eq(bool(result), False)
+        with self.assertRaises(CommandExecutionError):
+            EEShellExec.cmd_exec(self, ['ee-test-missing-binary'])
+
+    def test_output_tail(self):
+        result = EEShellExec.cmd_exec(self, 'seq 1 200')
+        lines = result.output.split('\n')
+        self.eq(len(lines), TAIL_LINES)
+        self.eq(lines[0], str(201 - TAIL_LINES))
+        self.eq(lines[-1], '200')
+
+    def test_timeout_kills_process_group(self):
+        start = time.time()
+        result = EEShellExec.cmd_exec(self, ['sh', '-c',
+                                             'sleep 30 & echo $!; wait'],
+                                      timeout=0.5)
+        self.eq(result.timed_out, True)
+        self.eq(bool(result), False)
+        self.eq(time.time() - start < 10, True)
+        # the background child went with the rest of the group
+        pid = int(result.output.split('\n')[0])
+        time.sleep(0.1)
+        self.eq(running(pid), False)
+
+    def test_cmd_exec_many(self):
+        start = time.time()
+        results = EEShellExec.cmd_exec_many(
+            self, ['sleep 0.6; echo a', 'echo b', 'sleep 0.3; echo c',
+                   ['sh', '-c', 'exit 3']])
+        self.eq([result.output for result in results], ['a', 'b', 'c', ''])
+        self.eq([result.returncode for result in results], [0, 0, 0, 3])
+        self.eq(time.time() - start < 1.5, True)
+        self.eq(EEShellExec.cmd_exec_many(self, []), [])
+        with self.assertRaises(CommandExecutionError):
+            EEShellExec.cmd_exec_many(self, ['true',
+                                             ['ee-test-missing-binary']])
@@ -0,0 +1,84 @@
+from ee.utils import test
+from ee.core import slowlog
+from ee.core.logcursor import LogCursor
+from ee.core.slowlog import EESlowLog, fingerprint
+import os
+import shutil
+import tempfile
+
+ENTRY = ("# Time: 150801 10:15:{0:02d}\n"
+         "# User@Host: root[root] @ localhost []\n"
+         "# Query_time: 1.5  Lock_time: 0.0 Rows_sent: 1  Rows_examined: 9\n"
+         "SET timestamp={1};\n"
+         "select * from wp_posts where ID = {0};\n")
+
+
+class Connection():
+    """Records rows import_log would send to Anemometer"""
+
+    def __init__(self):
+        self.rows = []
+
+    def cursor(self):
+        return self
+
+    def executemany(self, statement, rows):
+        if 'global_query_review_history' in statement:
+            self.rows.extend(rows)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CoreTestCaseSlowLog(test.EETestCase):
+
+    def test_fingerprint(self):
+        self.eq(fingerprint("SELECT * FROM t WHERE id IN (1, 2, 'a')"),
+                'select * from t where id in(?+)')
+        self.eq(fingerprint("insert into t values (1, 'x'), (2, 'y')"),
+                'insert into t values(?+)')
+
+    def test_parse_since(self):
+        data = ''.join(ENTRY.format(i, 1438424100 + i)
+                       for i in range(4)).encode('utf-8')
+        classes, consumed = EESlowLog.parse(self, data)
+        self.eq(consumed, len(data))
+        self.eq([cls.count for cls in classes.values()], [4])
+        classes, consumed = EESlowLog.parse(self, data, since=1438424101)
+        self.eq(consumed, len(data))
+        self.eq([cls.count for cls in classes.values()], [2])
+
+    def test_parse_holds_back_unfinished_entry(self):
+        data = (ENTRY.format(0, 1438424100) +
+                ENTRY.format(1, 1438424101)[:-20]).encode('utf-8')
+        classes, consumed = EESlowLog.parse(self, data)
+        self.eq(consumed, len(ENTRY.format(0, 1438424100)))
+
+    def test_import_entry_larger_than_read(self):
+        self.app.setup()
+        root = tempfile.mkdtemp()
+        checkpoint = slowlog.EE_SLOW_LOG_CHECKPOINT
+        connect = slowlog.connect
+        connection = Connection()
+        try:
+            slowlog.EE_SLOW_LOG_CHECKPOINT = os.path.join(root, 'checkpoint')
+            slowlog.connect = lambda config: connection
+            log = os.path.join(root, 'slow.log')
+            bulk = ENTRY.format(1, 1438424101).replace(
+                'ID = 1', 'ID in ({0})'.format(', '.join(['1'] * 2000)))
+            with open(log, 'w') as f:
+                f.write(ENTRY.format(0, 1438424100) + bulk +
+                        ENTRY.format(2, 1438424102))
+            LogCursor(log, slowlog.EE_SLOW_LOG_CHECKPOINT).rewind()
+            EESlowLog.import_log(self, log, dict(host='localhost'),
+                                 read_size=1024)
+            self.eq(sorted(row[6] for row in connection.rows), [1, 1, 1])
+            self.eq(LogCursor(log, slowlog.EE_SLOW_LOG_CHECKPOINT)
+                    .load()['offset'], os.path.getsize(log))
+        finally:
+            slowlog.EE_SLOW_LOG_CHECKPOINT = checkpoint
+            slowlog.connect = connect
+            shutil.rmtree(root)
@@ -0,0 +1,71 @@
+from ee.utils import test
+from ee.core.taskgraph import EETaskGraph, TaskError
+import threading
+import time
+
+
+class CoreTestCaseTaskGraph(test.EETestCase):
+
+    def setUp(self):
+        super(CoreTestCaseTaskGraph, self).setUp()
+        self.app.setup()
+        self.order = []
+        self.lock = threading.Lock()
+
+    def task(self, name, delay=0, error=None):
+        def run():
+            time.sleep(delay)
+            if error is not None:
+                raise error
+            with self.lock:
+                self.order.append(name)
+        return run
+
+    def test_order(self):
+        graph = EETaskGraph()
+        graph.add('wordpress', self.task('wordpress'),
+                  requires=['nginx', 'database'])
+        graph.add('nginx', self.task('nginx', delay=0.1))
+        graph.add('database', self.task('database'))
+        graph.add('plugins', self.task('plugins'), requires=['wordpress'])
+        timings = graph.run(self)
+        self.eq(self.order, ['database', 'nginx', 'wordpress', 'plugins'])
+        self.eq(sorted(timings), ['database', 'nginx', 'plugins',
+                                  'wordpress'])
+
+    def test_check(self):
+        graph = EETaskGraph()
+        graph.add('a', self.task('a'), requires=['b'])
+        graph.add('b', self.task('b'), requires=['a'])
+        with self.assertRaises(ValueError):
+            graph.check()
+        graph = EETaskGraph()
+        graph.add('a', self.task('a'), requires=['missing'])
+        with self.assertRaises(ValueError):
+            graph.run(self)
+        self.eq(self.order, [])
+        with self.assertRaises(ValueError):
+            graph.add('a', self.task('a'))
+
+    def test_failure(self):
+        graph = EETaskGraph()
+        graph.add('nginx', self.task('nginx', delay=0.1))
+        graph.add('database', self.task('database',
+                                        error=OSError('disk full')))
+        graph.add('wordpress', self.task('wordpress'),
+                  requires=['nginx', 'database'])
+        with self.assertRaises(TaskError) as raised:
+            graph.run(self)
+        self.eq(raised.exception.task, 'database')
+        self.eq(str(raised.exception.error), 'disk full')
+        # running tasks are waited for, dependent ones never start
+        self.eq(graph.done, ['nginx'])
+        self.eq(self.order, ['nginx'])
+
+    def test_system_exit(self):
+        graph = EETaskGraph()
+        graph.add('nginx', self.task('nginx', error=SystemExit(1)))
+        graph.add('wordpress', self.task('wordpress'), requires=['nginx'])
+        with self.assertRaises(SystemExit):
+            graph.run(self)
+        self.eq(graph.done, [])